@@ -0,0 +1,391 @@
+# app/llm_agent/client.py
+import os
+import copy
+import json
+import time
+import hashlib
+import random
+import asyncio
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.services import deadline, metrics
+from app.llm_agent.streaming import JSONObjectScanner, matches_schema
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30"))   # max wait for a free slot
+MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("OLLAMA_BACKOFF", "0.5"))
+BREAKER_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+LLM_RETRIES = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_llm_retries_total", "LLM request attempts that were retried.", ("source",)))
+LLM_BREAKER_OPEN = metrics.REGISTRY.register(metrics.Gauge(
+    "excel_ai_llm_breaker_open", "1 while the LLM circuit breaker is open."))
+LLM_EARLY_STOPS = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_llm_early_stops_total", "Streamed generations cut off once a valid JSON object arrived.", ("source",)))
+
+
+class LLMError(RuntimeError):
+    """The LLM call failed (after retries)."""
+
+
+class LLMUnavailable(LLMError):
+    """The LLM was not called: circuit open or no free slot. Callers should use their heuristic path."""
+
+
+class LLMBadOutput(LLMError):
+    """The model answered, but not with the expected JSON. Does not count against the breaker."""
+
+    def __init__(self, message: str, raw: str = ""):
+        super().__init__(message)
+        self.raw = raw   # what the model generated, for callers that show it
+
+
+class _Retryable(Exception):
+    pass
+
+
+class _Flight:
+    """One in-flight LLM request that identical concurrent prompts wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+def _own_copy(error: BaseException) -> BaseException:
+    """A fresh exception of the same type (and attributes) for one coalesced waiter to raise."""
+    try:
+        return copy.copy(error)
+    except Exception:
+        return LLMError(str(error))
+
+
+def flight_key(payload: Dict[str, Any]) -> str:
+    """Identity of a request: model, prompt hash and options."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and fails fast for `cooldown`
+    seconds; then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def cancel_trial(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+        LLM_BREAKER_OPEN.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+                LLM_BREAKER_OPEN.set(1)
+
+
+class LLMClient:
+    """
+    Shared Ollama client: pooled keep-alive session, global concurrency limit,
+    retries with exponential backoff and a circuit breaker. Identical concurrent
+    requests are coalesced into a single call (single-flight).
+    """
+
+    def __init__(self, url: str = OLLAMA_URL, model: str = OLLAMA_MODEL, timeout: float = READ_TIMEOUT,
+                 max_concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=256)
+        self._inflight: Dict[str, _Flight] = {}
+        self._inflight_lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.rejected = 0
+
+    @property
+    def session(self):
+        # requests is imported on first call to keep app start-up fast
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    s = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(self.max_concurrency, 1) * 2)
+                    s.mount("http://", adapter)
+                    s.mount("https://", adapter)
+                    self._session = s
+        return self._session
+
+    def _post(self, payload: Dict[str, Any], timeout: float, source: str = "llm") -> Dict[str, Any]:
+        import requests
+        stream = bool(payload.get("stream"))
+        # under a request deadline plain calls are streamed too, so an abandoned
+        # request can drop the connection (and Ollama stop generating) between tokens
+        collect = not stream and deadline.current() is not None
+        if collect:
+            payload = {**payload, "stream": True}
+        try:
+            resp = self.session.post(self.url, json=payload, timeout=(CONNECT_TIMEOUT, deadline.timeout(timeout)),
+                                     stream=stream or collect)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _Retryable(str(e)) from e
+        if resp.status_code in RETRYABLE_STATUS:
+            resp.close()
+            raise _Retryable(f"HTTP {resp.status_code} from {self.url}")
+        resp.raise_for_status()
+        if not stream and not collect:
+            return resp.json()
+        try:
+            if collect:
+                return self._read_text(resp)
+            return self._read_stream(resp, payload.get("format"), source)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _Retryable(str(e)) from e
+        finally:
+            # closing mid-stream drops the connection, which makes Ollama stop generating
+            resp.close()
+
+    def _read_stream(self, resp, fmt: Any, source: str) -> Dict[str, Any]:
+        """Consume NDJSON chunks until the first schema-valid JSON object is complete."""
+        schema = fmt if isinstance(fmt, dict) else None
+        scanner = JSONObjectScanner()
+        text = []
+        for line in resp.iter_lines():
+            deadline.check()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise LLMBadOutput(chunk["error"], "".join(text))
+            piece = chunk.get("response", "")
+            text.append(piece)
+            for candidate in scanner.feed(piece):
+                try:
+                    obj = json.loads(candidate)
+                except ValueError:
+                    continue
+                if matches_schema(obj, schema):
+                    if not chunk.get("done"):
+                        LLM_EARLY_STOPS.inc(source=source)
+                    return {"response": "".join(text), "parsed": obj}
+            if chunk.get("done"):
+                break
+        raise LLMBadOutput("no schema-valid JSON object in LLM response", "".join(text))
+
+    def _read_text(self, resp) -> Dict[str, Any]:
+        """Join a streamed plain generation into the shape of a non-streaming answer."""
+        text = []
+        for line in resp.iter_lines():
+            deadline.check()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise LLMBadOutput(chunk["error"], "".join(text))
+            text.append(chunk.get("response", ""))
+            if chunk.get("done"):
+                break
+        return {"response": "".join(text), "done": True}
+
+    def generate(self, prompt: str, source: str = "llm", model: Optional[str] = None,
+                 timeout: Optional[float] = None, options: Optional[Dict[str, Any]] = None) -> str:
+        """Run a non-streaming /api/generate call and return the response text."""
+        payload = {"model": model or self.model, "prompt": prompt, "stream": False}
+        if options:
+            payload.update(options)
+        data = self._single_flight(payload, source, timeout or self.timeout)
+        return data.get("response", "").strip()
+
+    def generate_json(self, prompt: str, schema: Optional[Dict[str, Any]] = None, source: str = "llm",
+                      model: Optional[str] = None, timeout: Optional[float] = None,
+                      options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Stream a /api/generate call constrained to `schema` (Ollama structured
+        output; plain JSON mode when None) and return the first object that
+        matches it. Generation is cut off as soon as that object is complete.
+        Raises LLMBadOutput if the stream ends without one.
+        """
+        payload = {"model": model or self.model, "prompt": prompt, "stream": True, "format": schema or "json"}
+        if options:
+            payload.update(options)
+        data = self._single_flight(payload, source, timeout or self.timeout)
+        # coalesced callers share the result; hand each its own copy
+        return copy.deepcopy(data["parsed"])
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Async wrapper; the global concurrency limit is shared with sync callers."""
+        return await asyncio.to_thread(self.generate, prompt, **kwargs)
+
+    async def agenerate_json(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.generate_json, prompt, **kwargs)
+
+    def _single_flight(self, payload: Dict[str, Any], source: str, timeout: float) -> Dict[str, Any]:
+        """
+        Share one upstream call between concurrent identical requests; errors reach
+        every waiter, except a cancelled leader's, whose waiters start a new call.
+        """
+        key = flight_key(payload)
+        while True:
+            with self._inflight_lock:
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self._inflight[key] = flight
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            metrics.LLM_CALLS.inc(source=source, cache="coalesced", outcome="ok")
+            while not flight.done.wait(deadline.POLL):
+                deadline.check()
+            if isinstance(flight.error, deadline.Cancelled):
+                continue
+            if flight.error is not None:
+                # each waiter raises its own copy; sharing one object would mix their tracebacks
+                raise _own_copy(flight.error) from flight.error
+            return flight.result
+        try:
+            flight.result = self._call(payload, source, timeout)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _call(self, payload: Dict[str, Any], source: str, timeout: float) -> Dict[str, Any]:
+        if not self.breaker.allow():
+            self.rejected += 1
+            metrics.LLM_CALLS.inc(source=source, cache="miss", outcome="breaker_open")
+            raise LLMUnavailable("LLM circuit breaker is open")
+        try:
+            acquired = deadline.wait_until(self._slots.acquire, QUEUE_TIMEOUT)
+        except deadline.Cancelled:
+            self.breaker.cancel_trial()
+            raise
+        if not acquired:
+            self.rejected += 1
+            # not a model failure; just give back a half-open trial if we held it
+            self.breaker.cancel_trial()
+            metrics.LLM_CALLS.inc(source=source, cache="miss", outcome="queue_timeout")
+            raise LLMUnavailable("no free LLM slot")
+        start = time.perf_counter()
+        try:
+            data = self._call_with_retries(payload, source, timeout)
+        except LLMBadOutput:
+            # the server is healthy; the answer just wasn't usable
+            self.breaker.record_success()
+            metrics.record_llm_call(source, time.perf_counter() - start, outcome="bad_output")
+            raise
+        except deadline.Cancelled:
+            # the caller went away; says nothing about the server
+            self.breaker.cancel_trial()
+            metrics.record_llm_call(source, time.perf_counter() - start, outcome="cancelled")
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.breaker.record_failure()
+            metrics.record_llm_call(source, time.perf_counter() - start, outcome="error")
+            raise LLMError(f"ollama call failed: {e}") from e
+        finally:
+            self._slots.release()
+        elapsed = time.perf_counter() - start
+        self.calls += 1
+        self._latencies.append(elapsed)
+        self.breaker.record_success()
+        metrics.record_llm_call(source, elapsed)
+        return data
+
+    def _call_with_retries(self, payload: Dict[str, Any], source: str, timeout: float) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            deadline.check()
+            try:
+                return self._post(payload, timeout, source)
+            except _Retryable:
+                # a read cut short by the request's deadline is not the server's fault
+                deadline.check()
+                if attempt >= self.max_retries:
+                    raise
+                LLM_RETRIES.inc(source=source)
+                deadline.sleep(BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random()))
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lat = sorted(self._latencies)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 1) if lat else None
+
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "breaker": self.breaker.state,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+
+@lru_cache(maxsize=1)
+def get_client() -> LLMClient:
+    """Process-wide client shared by every LLM call site."""
+    return LLMClient()
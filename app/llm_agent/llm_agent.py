@@ -1,22 +1,11 @@
 # app/llm_agent.py
-import requests
-import os
 import json
 from typing import Dict, Any
-
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
-MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+from app.llm_agent.client import get_client
 
 def call_ollama(prompt: str, timeout: int = 30) -> str:
-    payload = {"model": MODEL, "prompt": prompt, "stream": False}
-    try:
-        r = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
-        r.raise_for_status()
-        data = r.json()
-        return data.get("response", "").strip()
-    except Exception as e:
-        # Ollama down or unreachable
-        raise RuntimeError(f"ollama call failed: {e}")
+    # raises LLMError (a RuntimeError) when Ollama is down, unreachable or the breaker is open
+    return get_client().generate(prompt, source="llm_agent", timeout=timeout)
 
 def interpret_nl_to_command(nl: str, schema: Dict[str, Any] = None) -> Dict[str, Any]:
     """
@@ -28,17 +17,8 @@ Schema: {json.dumps(schema or {})}
 User query: {nl}
 """
     try:
-        out = call_ollama(prompt)
-        # some models wrap payloads in text. Try to parse JSON
-        try:
-            return json.loads(out)
-        except Exception:
-            # fallback: attempt to extract {...}
-            import re
-            m = re.search(r"(\{.*\})", out, flags=re.DOTALL)
-            if m:
-                return json.loads(m.group(1))
-            raise
+        # JSON mode, streamed: returns as soon as the first complete object arrives
+        return get_client().generate_json(prompt, source="llm_agent", timeout=30)
     except Exception:
         # fallback heuristic
         nl2 = nl.lower()
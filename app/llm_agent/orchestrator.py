@@ -3,7 +3,7 @@ import json
 import time
 import threading
 import requests
-from app.services.orchestrator import orchestrate_user_query
+from app.llm_agent.client import get_client, LLMBadOutput
 
 
 class ExcelAIOrchestrator:
@@ -17,8 +17,8 @@ class ExcelAIOrchestrator:
     def __init__(self, backend_url="http://127.0.0.1:8000"):
         print("🚀 Initializing ExcelAIOrchestrator (Ollama + LLaMA3)...")
         self.backend_url = backend_url
-        self.ollama_url = "http://localhost:11434/api/generate"
-        self.model_name = "llama3"
+        self.client = get_client()
+        self.model_name = self.client.model
         print("✅ Orchestrator ready.")
 
     # Loading Spinner (Async)
@@ -45,32 +45,23 @@ class ExcelAIOrchestrator:
         User Query: "{user_query}"
         """
 
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": False
-        }
-
         stop_event = threading.Event()
         spinner = threading.Thread(target=self._spinner, args=(stop_event,))
         spinner.start()
 
         try:
-            response = requests.post(self.ollama_url, json=payload, timeout=30)
+            parsed = self.client.generate_json(prompt, source="cli", model=self.model_name, timeout=30)
             stop_event.set()
             spinner.join()
             print("\r✅ AI interpretation complete")
+            print("🧠 Parsed Query:", parsed)
+            return parsed
 
-            result = response.json()
-            raw = result.get("response", "").strip()
-
-            try:
-                parsed = json.loads(raw)
-                print("🧠 Parsed Query:", parsed)
-                return parsed
-            except json.JSONDecodeError:
-                print("⚠️ Couldn't parse proper JSON — Returning text")
-                return {"raw_text": raw}
+        except LLMBadOutput as e:
+            stop_event.set()
+            spinner.join()
+            print("⚠️ Couldn't parse proper JSON — Returning text")
+            return {"raw_text": e.raw or str(e)}
 
         except Exception as e:
             stop_event.set()
@@ -0,0 +1,82 @@
+# app/llm_agent/streaming.py
+from typing import Any, Dict, List
+
+
+class JSONObjectScanner:
+    """
+    Incrementally finds complete top-level JSON objects in streamed text.
+    Text outside objects (preamble, chatter) is skipped; braces inside
+    strings are ignored.
+    """
+
+    def __init__(self):
+        self._buf: List[str] = []
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consume a chunk; return the source text of every object completed by it."""
+        done = []
+        for ch in chunk:
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._buf = ["{"]
+                continue
+            self._buf.append(ch)
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+            if ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    done.append("".join(self._buf))
+                    self._buf = []
+        return done
+
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def matches_schema(value: Any, schema: Dict[str, Any]) -> bool:
+    """
+    Minimal JSON-schema check (type, enum, required, properties, items),
+    enough to accept or reject an LLM plan without extra dependencies.
+    """
+    if not schema:
+        return True
+    t = schema.get("type")
+    if t:
+        types = t if isinstance(t, list) else [t]
+        if not any(isinstance(value, _TYPES[x]) and not (x in ("number", "integer") and isinstance(value, bool))
+                   for x in types):
+            return False
+    if "enum" in schema and value not in schema["enum"]:
+        return False
+    if isinstance(value, dict):
+        if any(k not in value for k in schema.get("required", [])):
+            return False
+        for k, sub in schema.get("properties", {}).items():
+            if k in value and not matches_schema(value[k], sub):
+                return False
+    if isinstance(value, list) and "items" in schema:
+        return all(matches_schema(v, schema["items"]) for v in value)
+    return True
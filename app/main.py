@@ -1,7 +1,27 @@
-from fastapi import FastAPI
+import time
+_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.routes.upload import router as upload_router
 from app.routes.query import router as query_router
+from app.routes.results import router as results_router
+from app.services import deadline, metrics, parallel_ingest, result_store, scheduler, startup
+
+# ----------------------------------------------------
+# 🔥 Startup: optional cache warm-up before readiness
+# ----------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start_warmup()
+    yield
+    # finish result workbooks still queued for the background writer
+    result_store.flush()
+    # let queued queries finish before the worker pools go away
+    scheduler.shutdown()
+    parallel_ingest.shutdown()
 
 # ----------------------------------------------------
 # 🚀 Excel AI Engine - Main FastAPI Application
@@ -11,6 +31,7 @@ app = FastAPI(
     title="Excel AI Engine",
     description="Upload, query, and analyze Excel data using natural and structured queries.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ----------------------------------------------------
@@ -24,11 +45,36 @@ app.add_middleware(
     allow_headers=["*"],       # Allow all headers
 )
 
+# ----------------------------------------------------
+# ⏱️ Per-stage timing (Server-Timing header + /metrics)
+# ----------------------------------------------------
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    timer, token = metrics.start_request()
+    try:
+        response = await call_next(request)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
+    finally:
+        metrics.end_request(token)
+
+# ----------------------------------------------------
+# ⌛ Request deadlines: X-Request-Deadline (seconds) or EXCEL_AI_REQUEST_DEADLINE;
+#    past it, or once the client is gone, work stops (504 / 499)
+# ----------------------------------------------------
+app.add_middleware(deadline.DeadlineMiddleware)   # added last: outermost
+
+@app.exception_handler(deadline.Cancelled)
+async def request_cancelled(request: Request, exc: deadline.Cancelled):
+    status = 499 if exc.reason == deadline.DISCONNECTED else 504
+    return JSONResponse({"detail": str(exc)}, status_code=status)
+
 # ----------------------------------------------------
 # 🔌 Include Routers
 # ----------------------------------------------------
 app.include_router(upload_router, prefix="/upload", tags=["Upload"])
 app.include_router(query_router, prefix="/query", tags=["Query"])
+app.include_router(results_router, prefix="/results", tags=["Results"])
 
 # ----------------------------------------------------
 # 🏠 Root Endpoint
@@ -46,3 +92,20 @@ def root():
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+# ----------------------------------------------------
+# 🚦 Readiness Probe (passes once warm-up is done)
+# ----------------------------------------------------
+@app.get("/ready")
+def ready():
+    status = startup.state.as_dict()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# ----------------------------------------------------
+# 📈 Prometheus Metrics Endpoint
+# ----------------------------------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
+
+startup.mark_imported(_STARTED)
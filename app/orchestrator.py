@@ -1,57 +1,79 @@
 # app/llm_agent/orchestrator.py
-import json
-import requests
+import copy
 import time
 from typing import Dict, Any, Optional
+from app.services import deadline, metrics
+from app.services.nl_parser import parse_query, MIN_CONFIDENCE
+from app.llm_agent.client import LLMClient, get_client, OLLAMA_URL, OLLAMA_MODEL, READ_TIMEOUT
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-DEFAULT_MODEL = "llama3"   # change to smaller model if you pulled one e.g. "llama3:3b"
-DEFAULT_TIMEOUT = 600      # seconds (long for slow laptops)
+DEFAULT_MODEL = OLLAMA_MODEL   # set OLLAMA_MODEL to a smaller model if you pulled one e.g. "llama3:3b"
+DEFAULT_TIMEOUT = READ_TIMEOUT # seconds per attempt; OLLAMA_TIMEOUT for slow laptops
 
 # small in-memory cache for repeated prompts
 _llm_cache = {}
 
+# Operations /query/run can execute; the LLM is constrained to this schema
+PLAN_OPERATIONS = ["aggregate", "filter", "math", "join", "pivot", "unpivot",
+                   "date_extract", "date_diff", "text_analyze", "text_search", "describe", "unknown"]
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "operation": {"type": "string", "enum": PLAN_OPERATIONS},
+        "parameters": {"type": "object"},
+    },
+    "required": ["operation", "parameters"],
+}
+
 class ExcelAIOrchestrator:
     def __init__(self, model: str = DEFAULT_MODEL, ollama_url: str = OLLAMA_URL, timeout: int = DEFAULT_TIMEOUT, fast_mode: bool = False):
         self.model = model
         self.ollama_url = ollama_url
         self.timeout = timeout
         self.fast_mode = fast_mode
+        self.client = get_client() if ollama_url == OLLAMA_URL else LLMClient(url=ollama_url)
 
-    def _call_llm(self, prompt: str) -> str:
+    def _call_llm(self, prompt: str) -> Dict[str, Any]:
         # caching to speed up repeated prompts
         if prompt in _llm_cache:
-            return _llm_cache[prompt]
-        payload = {"model": self.model, "prompt": prompt, "stream": False}
-        resp = requests.post(self.ollama_url, json=payload, timeout=self.timeout)
-        resp.raise_for_status()
-        text = resp.json().get("response", "").strip()
-        _llm_cache[prompt] = text
-        return text
+            metrics.record_llm_call("orchestrator", 0.0, cache="hit")
+            return copy.deepcopy(_llm_cache[prompt])
+        # streamed + schema-constrained: generation stops at the first valid plan
+        plan = self.client.generate_json(prompt, schema=PLAN_SCHEMA, source="orchestrator",
+                                         model=self.model, timeout=self.timeout)
+        _llm_cache[prompt] = plan
+        return copy.deepcopy(plan)
 
-    def interpret_query(self, user_query: str, columns: Optional[list] = None) -> Dict[str, Any]:
+    def interpret_query(self, user_query: str, columns: Optional[list] = None, dtypes: Optional[dict] = None,
+                        schema: Optional[str] = None, values: Optional[dict] = None,
+                        plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Returns a dict with keys:
-          - operation: aggregate|filter|math|join|pivot|unpivot|date|text|unknown
+          - operation: one of PLAN_OPERATIONS
           - parameters: dict
         The JSON returned follows QueryPayload.params structure used by /query/run.
+        `schema` is the sheet catalog's one-line-per-column summary (types, ranges,
+        top values); when given it replaces the bare column list in the prompt.
+        `values` (category column -> known values) lets the parser turn "for IT"
+        into a filter instead of ignoring it. `plan` is a parse_query result the
+        caller already has for this query (e.g. from scheduling it); it is used
+        instead of parsing again.
         """
-        # Fast-mode heuristics: avoid LLM for simple common queries
-        q = user_query.strip().lower()
+        # Fast mode: the schema-aware parser answers unambiguous queries without the LLM
+        parsed_plan = plan
         if self.fast_mode:
-            if q.startswith("sum ") or q.startswith("total ") or "sum of" in q or "total" in q:
-                return {"operation": "aggregate", "parameters": {"agg": "sum", "column": None}}
-            if q.startswith("average") or "average" in q or "mean" in q:
-                return {"operation": "aggregate", "parameters": {"agg": "mean", "column": None}}
-            if q.startswith("filter") or "where" in q:
-                return {"operation": "filter", "parameters": {"condition": user_query}}
-            # add more heuristics as needed
+            if parsed_plan is None and columns:
+                parsed_plan = parse_query(user_query, columns, dtypes, values)
+            if parsed_plan and parsed_plan["confidence"] >= MIN_CONFIDENCE:
+                return parsed_plan
 
         # Construct strict prompt to return JSON only
-        cols_line = f"Columns: {columns}" if columns else ""
+        if schema:
+            cols_line = f"Columns (name: type, values or range, distinct count):\n{schema}"
+        else:
+            cols_line = f"Columns: {columns}" if columns else ""
         system_prompt = f"""
 You are a JSON-only translator. Convert the user's natural language spreadsheet query into a JSON object with keys:
-- operation: one of aggregate|filter|math|join|pivot|unpivot|date|text|unknown
+- operation: one of {'|'.join(PLAN_OPERATIONS)}
 - parameters: an object containing operation-specific keys
 
 Return ONLY valid JSON (no explanation). Example:
@@ -61,23 +83,14 @@ Return ONLY valid JSON (no explanation). Example:
 User Query: {user_query}
 """
         try:
-            raw = self._call_llm(system_prompt)
-            # try to parse JSON direct
-            try:
-                parsed = json.loads(raw)
-                return parsed
-            except json.JSONDecodeError:
-                # try to extract JSON substring
-                start = raw.find("{")
-                end = raw.rfind("}")
-                if start != -1 and end != -1:
-                    candidate = raw[start:end+1]
-                    try:
-                        return json.loads(candidate)
-                    except Exception:
-                        pass
-            # fallback: return unknown
-            return {"operation": "unknown", "parameters": {"raw": user_query}}
+            return self._call_llm(system_prompt)
+        except deadline.Cancelled:
+            raise
         except Exception as e:
-            # LLM failure fallback
+            # LLM failure fallback: a parser plan only when it is confident on its own
+            # (the query is parsed at most once per call)
+            if parsed_plan is None and columns:
+                parsed_plan = parse_query(user_query, columns, dtypes, values)
+            if parsed_plan and parsed_plan["confidence"] >= MIN_CONFIDENCE:
+                return parsed_plan
             return {"operation": "unknown", "parameters": {"raw": user_query, "error": str(e)}}
@@ -1,59 +1,452 @@
 # app/routes/query.py
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Optional, Any, Dict
-from app.services.data_engine import read_sheet, write_sheet, summarize_df
-from app.services.math_operations import apply_math, aggregate
+from typing import Optional, Any, Dict, List
+from app.services.data_engine import read_sheet, summarize_df
+from app.services.math_operations import apply_math
 from app.services.join_engine import perform_join
-from app.services.pivot_engine import create_pivot, unpivot
+from app.services.pivot_engine import unpivot
 from app.services.date_engine import extract_date_parts, date_diff
-from app.services.unstructured_text import analyze_text_column
-from app.llm_agent.orchestrator import ExcelAIOrchestrator
-import os, json
+from app.services import metrics, profiling, result_cache, result_store, upload_store, incremental_agg, multi_query, approx, topk, sheet_index, text_index, scheduler, deadline
+from app.services.math_operations import aggregate as full_aggregate
+from app.services.data_engine import sheet_digest, sheet_stats
+from app.services import sheet_catalog
+from app.services.nl_parser import parse_query, MIN_CONFIDENCE
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import os, json, asyncio, contextvars
+import numpy as np
+import pandas as pd
 
 router = APIRouter()
-orchestrator = ExcelAIOrchestrator(fast_mode=True)  # fast_mode avoids LLM for simple queries
+
+@lru_cache(maxsize=1)
+def get_orchestrator():
+    # created on first NL query so importing the router stays cheap
+    from app.orchestrator import ExcelAIOrchestrator
+    return ExcelAIOrchestrator(fast_mode=True)  # fast_mode avoids LLM for simple queries
 
 class QueryPayload(BaseModel):
     file_path: str
     sheet_name: Optional[str] = None
     operation: str
     params: Optional[Dict[str, Any]] = {}
+    use_cache: bool = True
+    output: Optional[str] = None   # background | lazy | sync; defaults to EXCEL_AI_OUTPUT_MODE
 
 class NaturalQuery(BaseModel):
     file_path: str
     sheet_name: Optional[str] = None
     query: str
 
+class BatchItem(BaseModel):
+    # either `query` (natural language) or `operation` + `params`
+    query: Optional[str] = None
+    operation: Optional[str] = None
+    params: Optional[Dict[str, Any]] = {}
+    use_cache: bool = True
+    output: Optional[str] = None
+
+class BatchPayload(BaseModel):
+    file_path: str
+    sheet_name: Optional[str] = None
+    queries: List[BatchItem]
+
+class IndexPayload(BaseModel):
+    file_path: str
+    sheet_name: Optional[str] = None
+    columns: List[str]
+
+class RangeFilter(BaseModel):
+    column: str
+    min: Optional[Any] = None
+    max: Optional[Any] = None
+
+class MultiPayload(BaseModel):
+    pattern: str                       # workbook glob, e.g. "data/sales_*.xlsx"
+    sheet_name: Optional[str] = None   # sheet name or glob; first sheet when omitted
+    operation: str
+    params: Optional[Dict[str, Any]] = {}
+    range: Optional[RangeFilter] = None
+    output: Optional[str] = None
+
+BATCH_WORKERS = int(os.getenv("EXCEL_AI_BATCH_WORKERS", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("EXCEL_AI_BATCH_MAX_ITEMS", "100"))
+
 def ensure_exists(file_path: str):
+    if upload_store.is_handle(file_path):
+        resolved = upload_store.resolve(file_path)
+        if resolved is None:
+            raise HTTPException(status_code=404, detail=f"Unknown upload handle: {file_path}")
+        file_path = resolved
     if not os.path.isabs(file_path):
         file_path = os.path.join(os.getcwd(), file_path)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
     return file_path
 
+# pandas reductions return numpy scalars (e.g. df[col].sum())
+NUMPY_ENCODERS = {np.generic: lambda v: v.item()}
+
+def respond(result: Dict[str, Any]) -> JSONResponse:
+    with metrics.stage("serialize"):
+        return JSONResponse(content=jsonable_encoder(result, custom_encoder=NUMPY_ENCODERS))
+
+def client_id(request: Request) -> str:
+    # fair-share identity: the API key when one is sent, else the caller's address
+    return request.headers.get("x-api-key") or (request.client.host if request.client else "anonymous")
+
+def work_class(operation: Optional[str], query: Optional[str], columns, dtypes, rows: Optional[int], values=None,
+               plan=None):
+    """
+    (scheduler pool, estimated cost) of one query; NL queries the parser cannot
+    answer need the LLM. `plan` is the query's parse_query result when the
+    caller already has it.
+    """
+    llm = False
+    if query:
+        if plan is None and columns:
+            plan = parse_query(query, columns, dtypes, values)
+        llm = not plan or plan["confidence"] < MIN_CONFIDENCE
+        operation = "unknown" if llm else plan["operation"]
+    operation = (operation or "").lower()
+    return ("llm" if llm or operation == "text_analyze" else "cpu"), scheduler.estimate(operation, rows, llm=llm)
+
+def plan_work(data: Dict[str, Any]):
+    """work_class of a /query/run body from the ingest catalog (no sheet is parsed)."""
+    stats = None
+    try:
+        file_path = ensure_exists(str(data.get("file_path") or ""))
+        stats = sheet_catalog.stats_for(sheet_digest(file_path, data.get("sheet_name")))
+    except Exception:
+        pass   # the request itself reports a bad path or sheet
+    columns = list(stats["columns"]) if stats else None
+    dtypes = sheet_catalog.planner_dtypes(stats) if stats else None
+    values = sheet_catalog.planner_values(stats) if stats else None
+    return work_class(data.get("operation"), data.get("query"), columns, dtypes, stats.get("rows") if stats else None,
+                      values)
+
+def overloaded(e: scheduler.Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+
+async def watched(job):
+    """
+    Await a scheduler job, but answer as soon as the request's deadline passes
+    or its client disconnects: a queued job is then dropped and a running one
+    stops at its next check, without the response waiting for it.
+    """
+    d = deadline.current()
+    task = asyncio.ensure_future(job)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=deadline.POLL if d is not None else None)
+        if done:
+            return task.result()
+        if d.cancelled:
+            task.cancel()
+            raise deadline.Cancelled(d.reason)
+
+def _run_profiled(data: Dict[str, Any], mode: Optional[str]) -> Dict[str, Any]:
+    if not mode:
+        return dispatch_query(data)
+    # profiles the worker thread the query runs on
+    with profiling.RequestProfiler(mode) as prof:
+        result = dispatch_query(data)
+    result["profile"] = prof.report("query_run")
+    return result
+
 @router.post("/run")
 async def run_query(request: Request):
     data = await request.json()
+    # opt-in (X-Profile header or ?profile=), only when EXCEL_AI_PROFILING is on
+    mode = profiling.requested_mode(request)
+    pool, cost = await asyncio.to_thread(plan_work, data)
+    try:
+        # queued by kind of work and shared fairly between clients; the event loop stays free
+        result = await watched(scheduler.pool(pool).run(_run_profiled, data, mode, client=client_id(request), cost=cost))
+    except scheduler.Overloaded as e:
+        raise overloaded(e)
+    return respond(result)
+
+def interpret(query: str, file_path: str, sheet_name: Optional[str], df, plan=None) -> QueryPayload:
+    """
+    Turn a natural-language query into the structured payload handle_structured
+    runs. `plan` is a parse_query result already computed for it, if any.
+    """
+    with metrics.stage("interpret"):
+        # schema context comes from the catalog recorded at ingest, not from the frame
+        stats = sheet_stats(file_path, sheet_name)
+        parsed = get_orchestrator().interpret_query(query, columns=list(df.columns),
+                                                    dtypes=sheet_catalog.planner_dtypes(stats),
+                                                    values=sheet_catalog.planner_values(stats),
+                                                    schema=sheet_catalog.prompt_schema(stats), plan=plan)
+    # normalize parsed -> QueryPayload-like
+    op = parsed.get("operation") or "unknown"
+    params = parsed.get("parameters") or parsed.get("params") or {}
+    if op == "unknown":
+        # no confident plan: say why rather than run a guess
+        raise HTTPException(status_code=422, detail=f"Could not interpret query: {params.get('error') or query}")
+    return QueryPayload(file_path=file_path, sheet_name=sheet_name, operation=op, params=params)
+
+@router.post("/batch")
+def run_batch(batch: BatchPayload, request: Request):
+    """
+    Run many queries against one sheet: the sheet is read once (as a job on
+    the cpu pool), NL items are interpreted and all items executed concurrently
+    on a small thread pool. Each item is queued on the scheduler pool for its
+    kind of work, and NL items are parsed once for both scheduling and
+    interpreting. A failing item reports its error without failing the others.
+    """
+    if len(batch.queries) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"at most {BATCH_MAX_ITEMS} queries per batch")
+    file_path = ensure_exists(batch.file_path)
+    client = client_id(request)
+    df = read_scheduled(file_path, batch.sheet_name, client)
+
+    stats = sheet_stats(file_path, batch.sheet_name)
+    columns = list(df.columns)
+    dtypes = sheet_catalog.planner_dtypes(stats)
+    values = sheet_catalog.planner_values(stats)
+
+    def run_item(item: BatchItem) -> Dict[str, Any]:
+        plan = parse_query(item.query, columns, dtypes, values) if item.query else None
+        pool, cost = work_class(item.operation, item.query, columns, dtypes, len(df), values, plan)
+        try:
+            return scheduler.pool(pool).call(execute_item, item, plan, client=client, cost=cost)
+        except scheduler.Overloaded as e:
+            return {"status": 429, "error": str(e)}
+
+    def execute_item(item: BatchItem, plan) -> Dict[str, Any]:
+        try:
+            if item.query:
+                payload = interpret(item.query, file_path, batch.sheet_name, df, plan)
+                payload.use_cache, payload.output = item.use_cache, item.output
+            elif item.operation:
+                payload = QueryPayload(file_path=file_path, sheet_name=batch.sheet_name, operation=item.operation,
+                                       params=item.params or {}, use_cache=item.use_cache, output=item.output)
+            else:
+                raise HTTPException(status_code=400, detail="each item needs 'query' or 'operation'")
+            return {"status": 200, **handle_structured(payload, df.copy(deep=False))}
+        except HTTPException as e:
+            return {"status": e.status_code, "error": e.detail}
+        except deadline.Cancelled:
+            # the whole batch is past its deadline or abandoned
+            raise
+        except Exception as e:
+            return {"status": 500, "error": str(e)}
+
+    workers = max(1, min(BATCH_WORKERS, len(batch.queries)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="excel-ai-batch") as pool:
+        # each item runs in a copy of this request's context so its stages land in Server-Timing
+        futures = [pool.submit(contextvars.copy_context().run, run_item, item) for item in batch.queries]
+        results = [f.result() for f in futures]
+    metrics.set_operation("batch")
+    return respond({
+        "file_path": file_path,
+        "sheet_name": batch.sheet_name,
+        "count": len(results),
+        "errors": sum(1 for r in results if r["status"] != 200),
+        "results": results,
+    })
+
+@router.post("/multi")
+def run_multi(multi: MultiPayload, request: Request):
+    """
+    Run one structured operation over every workbook/sheet matching a glob.
+    Sheets whose recorded min/max for `range.column` cannot overlap the range
+    are skipped without being opened; the rest are parsed in parallel and
+    each row is tagged with its source_file (and source_sheet for sheet globs).
+    Aggregates and pivots merge per-file partials; other operations are run
+    per file and their result rows unioned.
+    """
+    pool, cost = work_class(multi.operation, None, None, None, None)
+    try:
+        return scheduler.pool(pool).call(_run_multi, multi, client=client_id(request), cost=cost)
+    except scheduler.Overloaded as e:
+        raise overloaded(e)
+
+def _run_multi(multi: MultiPayload):
+    op = multi.operation.lower()
+    metrics.set_operation(f"multi_{op}")
+    if multi.output and multi.output not in result_store.MODES:
+        raise HTTPException(status_code=400, detail=f"output must be one of {list(result_store.MODES)}")
+    rng = multi.range
+    try:
+        sources = multi_query.expand(multi.pattern, multi.sheet_name)
+        kept, pruned = multi_query.prune(sources, rng.column if rng else None,
+                                         rng.min if rng else None, rng.max if rng else None)
+        with metrics.stage("read"):
+            frames = multi_query.load(kept, tag_sheet=multi_query.is_glob(multi.sheet_name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if rng:
+        # pruning is per file; rows inside kept files still need the range applied
+        frames = [_in_range(f, rng) for f in frames]
+    params = multi.params or {}
+    scan = {"operation": op, "sources": len(sources), "scanned": len(kept), "pruned": len(pruned),
+            "files": sorted({os.path.basename(p) for p, _ in kept})}
+    try:
+        with metrics.stage("execute"):
+            if op == "aggregate":
+                column, agg = params.get("column"), params.get("agg")
+                if not column or not agg:
+                    raise HTTPException(status_code=400, detail="aggregate requires 'column' and 'agg'")
+                result = multi_query.aggregate(frames, column, agg, params.get("group_by"), params.get("filter"))
+                group_by = params.get("group_by")
+                result = _ordered(result, [group_by] if isinstance(group_by, str) else list(group_by or []),
+                                  column, params)
+                return respond({**scan, "column": column, "agg": agg, "result": result})
+            if op == "pivot":
+                if not params.get("index") or not params.get("columns") or not params.get("values"):
+                    raise HTTPException(status_code=400, detail="pivot requires index, columns, and values")
+                res_df = multi_query.pivot(frames, params["index"], params["columns"], params["values"],
+                                           params.get("aggfunc", "sum"))
+            else:
+                parts = []
+                for (path, sheet), df in zip(kept, frames):
+                    deadline.check()
+                    payload = QueryPayload(file_path=path, sheet_name=sheet, operation=op, params=params)
+                    _, part = execute_structured(payload, op, df)
+                    if part is not None:
+                        parts.append(part)
+                res_df = multi_query.union(parts)
+            # each file was already cut to its own top-k; this picks the overall one
+            res_df = topk.top(res_df, params.get("order_by"), params.get("limit"))
+    except (HTTPException, deadline.Cancelled):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    result = {**scan, "rows": int(res_df.shape[0]), "summary": summarize_df(res_df)}
+    return respond({**result, **result_store.publish(res_df, mode=multi.output)})
+
+def read_scheduled(file_path: str, sheet_name: Optional[str], client: str):
+    """read_sheet as a job on the cpu pool, so parsing shares its workers and queue budget."""
+    try:
+        rows = sheet_catalog.stats_for(sheet_digest(file_path, sheet_name))["rows"]
+    except Exception:
+        rows = None   # not catalogued yet: read_sheet reports a bad sheet itself
+    try:
+        with metrics.stage("read"):
+            return scheduler.pool("cpu").call(read_sheet, file_path, sheet_name, client=client,
+                                              cost=scheduler.estimate("read", rows))
+    except scheduler.Overloaded as e:
+        raise overloaded(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/index")
+def build_index(payload: IndexPayload, request: Request):
+    """
+    Build secondary indexes on columns of a sheet so `filter` answers ==, in
+    and range terms on them by lookup. Columns are otherwise indexed on their
+    own after EXCEL_AI_INDEX_AUTO_AFTER filters use them. The sheet is read as
+    a job on the cpu pool.
+    """
+    metrics.set_operation("index")
+    file_path = ensure_exists(payload.file_path)
+    df = read_scheduled(file_path, payload.sheet_name, client_id(request))
+    missing = [c for c in payload.columns if c not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Columns not found: {missing}")
+    digest = sheet_digest(file_path, payload.sheet_name)
+    with metrics.stage("execute"):
+        for col in payload.columns:
+            sheet_index.build(df, digest, col)
+    return respond({"file_path": file_path, "sheet_name": payload.sheet_name, "indexed": sheet_index.indexed(digest)})
+
+def _in_range(df, rng: RangeFilter):
+    if rng.column not in df.columns:
+        return df
+    s = df[rng.column]
+    conv = (lambda v: v) if not pd.api.types.is_datetime64_any_dtype(s) else pd.Timestamp
+    mask = pd.Series(True, index=df.index)
+    if rng.min is not None:
+        mask &= s >= conv(rng.min)
+    if rng.max is not None:
+        mask &= s <= conv(rng.max)
+    return df[mask]
+
+def dispatch_query(data: Dict[str, Any]) -> Dict[str, Any]:
     # Natural-language path
     if "query" in data:
         nat = NaturalQuery(**data)
         file_path = ensure_exists(nat.file_path)
-        df = read_sheet(file_path, nat.sheet_name)
-        parsed = orchestrator.interpret_query(nat.query, columns=list(df.columns))
-        # normalize parsed -> QueryPayload-like
-        op = parsed.get("operation") or "unknown"
-        params = parsed.get("parameters") or parsed.get("params") or {}
-        payload = QueryPayload(file_path=file_path, sheet_name=nat.sheet_name, operation=op, params=params)
-        return handle_structured(payload)
+        with metrics.stage("read"):
+            df = read_sheet(file_path, nat.sheet_name)
+        return handle_structured(interpret(nat.query, file_path, nat.sheet_name, df), df)
     # Structured path
     payload = QueryPayload(**data)
     payload.file_path = ensure_exists(payload.file_path)
     return handle_structured(payload)
 
-def handle_structured(payload: QueryPayload):
-    df = read_sheet(payload.file_path, payload.sheet_name)
+def handle_structured(payload: QueryPayload, df=None):
     op = payload.operation.lower()
+    metrics.set_operation(op)
+    if payload.output and payload.output not in result_store.MODES:
+        raise HTTPException(status_code=400, detail=f"output must be one of {list(result_store.MODES)}")
+    key = None
+    if payload.use_cache:
+        try:
+            key = result_cache.make_key(payload.file_path, payload.sheet_name, op, payload.params)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        cached = result_cache.cache.get(key)
+        if cached is not None:
+            metrics.set_cache("hit")
+            return _with_output(payload, *cached, key, "hit")
+    result, frame = execute_structured(payload, op, df)
+    if key is not None:
+        result_cache.cache.put(key, result, frame)
+    return _with_output(payload, result, frame, key, "miss")
+
+def _with_output(payload: QueryPayload, result: Dict[str, Any], frame, key: Optional[str], cache: str) -> Dict[str, Any]:
+    if frame is not None:
+        # respond with the summary now; the workbook is written off the request path
+        # and served from /results/{result_id}
+        result = {**result, **result_store.publish(frame, key[:32] if key else None, mode=payload.output)}
+    return {**result, "cache": cache}
+
+def execute_structured(payload: QueryPayload, op: str, df=None):
+    """
+    Run one structured operation; returns (response dict, result frame or None).
+    `df` is the already-loaded sheet when the caller has it (NL path, batches).
+    Result frames are cut to params order_by/limit (top-k, not a full sort)
+    before they are summarized.
+    """
+    result, frame = _execute(payload, op, df)
+    if frame is not None:
+        order_by, limit = payload.params.get("order_by"), payload.params.get("limit")
+        if order_by or limit is not None:
+            try:
+                with metrics.stage("execute"):
+                    frame = topk.top(frame, order_by, limit)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        result["summary"] = summarize_df(frame)
+    return result, frame
+
+def _ordered(result, keys: list, column: str, params: Dict[str, Any]):
+    """order_by/limit for a grouped aggregate result ({group: value})."""
+    if not keys or not (params.get("order_by") or params.get("limit") is not None):
+        return result
+    try:
+        return topk.top_mapping(result, keys, column, params.get("order_by"), params.get("limit"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _execute(payload: QueryPayload, op: str, df=None):
+    if op == "describe":
+        # answered from the ingest catalog without touching the data
+        try:
+            stats = sheet_stats(payload.file_path, payload.sheet_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"operation":"describe","sheet_name":payload.sheet_name,**stats}, None
+    if df is None:
+        with metrics.stage("read"):
+            df = read_sheet(payload.file_path, payload.sheet_name)
+    deadline.check()
     try:
         if op == "aggregate":
             column = payload.params.get("column")
@@ -61,17 +454,38 @@ def handle_structured(payload: QueryPayload):
             group_by = payload.params.get("group_by")
             if not column or not agg:
                 raise HTTPException(status_code=400, detail="aggregate requires 'column' and 'agg'")
-            result = aggregate(df, column, agg, group_by)
-            return {"operation":"aggregate","column":column,"agg":agg,"result":result}
+            keys = [group_by] if isinstance(group_by, str) else list(group_by or [])
+            condition = payload.params.get("filter")
+            if payload.params.get("approximate") and approx.worthwhile(df):
+                with metrics.stage("execute"):
+                    est = approx.aggregate(df, column, agg, group_by, condition=condition,
+                                           digest=sheet_digest(payload.file_path, payload.sheet_name))
+                    if keys:
+                        est["result"] = _ordered(est["result"], keys, column, payload.params)
+                        est["bounds"] = {k: est["bounds"][k] for k in est["result"]}
+                return {"operation":"aggregate","column":column,"agg":agg,**est}, None
+            with metrics.stage("execute"):
+                # ordered by a group key with a limit: only those groups' rows are aggregated
+                pushed = topk.top_keys(df, payload.params.get("order_by"), keys, payload.params.get("limit"),
+                                       condition=condition)
+                if pushed is not None:
+                    result = full_aggregate(pushed, column, agg, group_by)
+                else:
+                    # append-only sheets only aggregate the new rows
+                    result = incremental_agg.aggregate(df, column, agg, group_by, condition=condition,
+                                                       sheet=payload.sheet_name or "",
+                                                       source=upload_store.lineage(payload.file_path))
+                result = _ordered(result, keys, column, payload.params)
+            return {"operation":"aggregate","column":column,"agg":agg,"result":result}, None
 
         if op == "math":
             operation = payload.params.get("math_op") or payload.params.get("operation")
             target_cols = payload.params.get("target_cols", [])
             new_col = payload.params.get("new_col")
             operand = payload.params.get("operand")
-            res_df = apply_math(df, operation, target_cols, new_col=new_col, operand=operand)
-            out = write_sheet(res_df, payload.file_path)
-            return {"operation":"math","math_op":operation,"output_file":out,"summary":summarize_df(res_df)}
+            with metrics.stage("execute"):
+                res_df = apply_math(df, operation, target_cols, new_col=new_col, operand=operand)
+            return {"operation":"math","math_op":operation}, res_df
 
         if op == "join":
             other_file = payload.params.get("other_file")
@@ -80,10 +494,11 @@ def handle_structured(payload: QueryPayload):
             how = payload.params.get("how","inner")
             if not other_file or not on:
                 raise HTTPException(status_code=400, detail="join requires other_file and on columns list")
-            right = read_sheet(other_file, other_sheet)
-            result_df = perform_join(df, right, on=on, how=how)
-            out = write_sheet(result_df, payload.file_path)
-            return {"operation":"join","how":how,"output_file":out,"summary":summarize_df(result_df)}
+            with metrics.stage("read"):
+                right = read_sheet(other_file, other_sheet)
+            with metrics.stage("execute"):
+                result_df = perform_join(df, right, on=on, how=how)
+            return {"operation":"join","how":how}, result_df
 
         if op == "pivot":
             index = payload.params.get("index")
@@ -92,27 +507,34 @@ def handle_structured(payload: QueryPayload):
             aggfunc = payload.params.get("aggfunc","sum")
             if not index or not columns or not values:
                 raise HTTPException(status_code=400, detail="pivot requires index, columns, and values")
-            pivot_df = create_pivot(df, index=index, columns=columns, values=values, aggfunc=aggfunc)
-            out = write_sheet(pivot_df, payload.file_path)
-            return {"operation":"pivot","output_file":out,"summary":summarize_df(pivot_df)}
+            if payload.params.get("approximate") and approx.worthwhile(df):
+                with metrics.stage("execute"):
+                    pivot_df, est = approx.pivot(df, index, columns, values, aggfunc,
+                                                 digest=sheet_digest(payload.file_path, payload.sheet_name))
+                return {"operation":"pivot",**est}, pivot_df
+            with metrics.stage("execute"):
+                pivot_df = incremental_agg.pivot(df, index=index, columns=columns, values=values, aggfunc=aggfunc,
+                                                 sheet=payload.sheet_name or "",
+                                                 source=upload_store.lineage(payload.file_path))
+            return {"operation":"pivot"}, pivot_df
 
         if op == "unpivot":
             id_vars = payload.params.get("id_vars")
             value_vars = payload.params.get("value_vars")
             if not id_vars or not value_vars:
                 raise HTTPException(status_code=400, detail="unpivot requires id_vars and value_vars")
-            unp = unpivot(df, id_vars=id_vars, value_vars=value_vars)
-            out = write_sheet(unp, payload.file_path)
-            return {"operation":"unpivot","output_file":out,"summary":summarize_df(unp)}
+            with metrics.stage("execute"):
+                unp = unpivot(df, id_vars=id_vars, value_vars=value_vars)
+            return {"operation":"unpivot"}, unp
 
         if op == "date_extract":
             col = payload.params.get("column")
             parts = payload.params.get("parts", ["year","month","day"])
             if not col:
                 raise HTTPException(status_code=400, detail="date_extract requires column")
-            res_df = extract_date_parts(df, col, parts)
-            out = write_sheet(res_df, payload.file_path)
-            return {"operation":"date_extract","output_file":out,"summary":summarize_df(res_df)}
+            with metrics.stage("execute"):
+                res_df = extract_date_parts(df, col, parts)
+            return {"operation":"date_extract"}, res_df
 
         if op == "date_diff":
             start = payload.params.get("start_col")
@@ -120,17 +542,18 @@ def handle_structured(payload: QueryPayload):
             new_col = payload.params.get("new_col","date_diff_days")
             if not start or not end:
                 raise HTTPException(status_code=400, detail="date_diff requires start_col and end_col")
-            res_df = date_diff(df, start, end, new_col)
-            out = write_sheet(res_df, payload.file_path)
-            return {"operation":"date_diff","output_file":out,"summary":summarize_df(res_df)}
+            with metrics.stage("execute"):
+                res_df = date_diff(df, start, end, new_col)
+            return {"operation":"date_diff"}, res_df
 
         if op == "filter":
             condition = payload.params.get("condition")
             if not condition:
                 raise HTTPException(status_code=400, detail="filter requires condition")
-            res_df = df.query(condition)
-            out = write_sheet(res_df, payload.file_path)
-            return {"operation":"filter","rows":int(res_df.shape[0]),"output_file":out,"summary":summarize_df(res_df)}
+            with metrics.stage("execute"):
+                # indexed columns are looked up; otherwise row blocks whose min/max rule out the condition are skipped
+                res_df = sheet_index.query(df, condition, sheet_digest(payload.file_path, payload.sheet_name))
+            return {"operation":"filter","rows":int(res_df.shape[0])}, res_df
 
         if op == "text_analyze":
             text_col = payload.params.get("text_col")
@@ -138,11 +561,36 @@ def handle_structured(payload: QueryPayload):
                 raise HTTPException(status_code=400, detail="text_analyze requires text_col")
             add_summary = payload.params.get("add_summary", True)
             add_sentiment = payload.params.get("add_sentiment", True)
-            res_df = analyze_text_column(df, text_col, add_summary=add_summary, add_sentiment=add_sentiment)
-            out = write_sheet(res_df, payload.file_path)
-            return {"operation":"text_analyze","output_file":out,"summary":summarize_df(res_df)}
+            from app.services.unstructured_text import analyze_text_column
+            with metrics.stage("execute"):
+                res_df = analyze_text_column(df, text_col, add_summary=add_summary, add_sentiment=add_sentiment)
+            return {"operation":"text_analyze"}, res_df
+
+        if op == "text_search":
+            text_query = payload.params.get("query")
+            text_cols = payload.params.get("text_cols") or payload.params.get("text_col")
+            if not text_query or not text_cols:
+                raise HTTPException(status_code=400, detail="text_search requires query and text_col(s)")
+            with metrics.stage("execute"):
+                try:
+                    # inverted index per text column, kept for the sheet's content digest
+                    res_df = text_index.search(df, text_cols, text_query,
+                                               digest=sheet_digest(payload.file_path, payload.sheet_name))
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            join_sheet = payload.params.get("join_sheet")
+            if join_sheet:
+                # e.g. the Structured rows behind matching Unstructured notes, best match first
+                on = payload.params.get("on", "ID")
+                with metrics.stage("read"):
+                    right = read_sheet(payload.file_path, join_sheet)
+                with metrics.stage("execute"):
+                    res_df = perform_join(res_df, right, on=[on] if isinstance(on, str) else on, how="left")
+            return {"operation":"text_search","query":text_query,"rows":int(res_df.shape[0])}, res_df
 
         raise HTTPException(status_code=400, detail=f"Unsupported operation: {op}")
 
+    except (HTTPException, deadline.Cancelled):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
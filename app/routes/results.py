@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from app.services import result_store
+
+router = APIRouter()
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+@router.get("/{result_id}")
+def download_result(result_id: str):
+    """
+    Download the workbook of a query result. Results produced in lazy mode,
+    or still queued for the background writer, are written on this request.
+    """
+    try:
+        path = result_store.materialize(result_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown result: {result_id}")
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, filename=f"{result_id}.xlsx")
+
+@router.get("/{result_id}/status")
+def result_status(result_id: str):
+    entry = result_store.get(result_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Unknown result: {result_id}")
+    return entry.as_dict()
@@ -1,45 +1,73 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Request
 from pathlib import Path
-import uuid
-from app.services.excel_ops import read_excel_sheets
+from app.services.data_engine import warm_cache, changed_sheets, sheet_stats
+from app.services import upload_store, scheduler, deadline
+from app.routes.query import client_id
 
 router = APIRouter()
 
 # Directory to store uploaded files
-UPLOAD_DIR = Path('./data')
+UPLOAD_DIR = Path(upload_store.STORE_DIR)
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Parsing a new workbook is queued on the cpu pool like query work, but never
+# refused: the upload is already stored by then.
+INGEST_COST = scheduler.estimate("read", None)
+
 @router.post("/file")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request, file: UploadFile = File(...)):
     """
     Upload an Excel file. Only .xls or .xlsx are allowed.
-    Returns the saved file path and available sheets.
+    Content is stored once per sha256; re-uploading the same bytes returns the
+    existing copy. Returns the handle, saved file path and available sheets.
+    The workbook is parsed as a job on the cpu pool.
     """
     if not file.filename.lower().endswith(('.xls', '.xlsx')):
         raise HTTPException(status_code=400, detail="File must be an Excel file (.xls or .xlsx)")
 
-    filename = f"{uuid.uuid4().hex}_{file.filename}"
-    dest = UPLOAD_DIR / filename
-
     try:
-        contents = await file.read()
-        dest.write_bytes(contents)
+        stored = await upload_store.store_upload(file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save uploaded file: {e}")
+    # parsing (possibly on the process pool) blocks; keep it off the event loop
+    return await scheduler.pool("cpu").run(_ingest, stored, file.filename, client=client_id(request),
+                                           cost=INGEST_COST, admit=False)
+
 
+def _ingest(stored, filename: str):
+    previous = upload_store.previous_version(stored["handle"], filename)
+    previous_path = upload_store.resolve(previous) if previous else None
     try:
-        sheets = read_excel_sheets(str(dest))
+        # parses into the frame cache; sheets whose content was seen before
+        # (including unchanged sheets of a previous version) are not reparsed
+        sheets = warm_cache(stored["file_path"])
+        diff = changed_sheets(previous_path, stored["file_path"]) if previous_path else None
+    except deadline.Cancelled:
+        raise
     except Exception as e:
+        if not stored["deduplicated"]:
+            upload_store.discard(stored["handle"])
         raise HTTPException(status_code=400, detail=f"Failed to parse Excel: {e}")
 
-    return {"file_path": str(dest), "sheets": list(sheets.keys())}
+    return {**stored, "sheets": sheets, "previous_handle": previous, "sheet_changes": diff,
+            "schema": _schema(stored["file_path"], sheets)}
+
+
+def _schema(file_path: str, sheets):
+    # rows and semantic column types per sheet, from the catalog written while parsing
+    out = {}
+    for name in sheets:
+        stats = sheet_stats(file_path, name)
+        out[name] = {"rows": stats["rows"], "types": {c: v["semantic"] for c, v in stats["columns"].items()}}
+    return out
 
 
 @router.post("/path")
-async def use_path(file_path: str = Form(...)):
+def use_path(request: Request, file_path: str = Form(...)):
     """
     Use an existing Excel file path instead of uploading.
-    Returns the file path and available sheets.
+    Returns the file path and available sheets; the workbook is parsed as a
+    job on the cpu pool.
     """
     p = Path(file_path)
 
@@ -50,8 +78,11 @@ async def use_path(file_path: str = Form(...)):
         raise HTTPException(status_code=400, detail="File must be an Excel file (.xls or .xlsx)")
 
     try:
-        sheets = read_excel_sheets(str(p))
+        sheets = scheduler.pool("cpu").call(warm_cache, str(p), client=client_id(request),
+                                            cost=INGEST_COST, admit=False)
+    except deadline.Cancelled:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to parse Excel: {e}")
 
-    return {"file_path": str(p), "sheets": list(sheets.keys())}
+    return {"file_path": str(p), "sheets": sheets}
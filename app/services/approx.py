@@ -0,0 +1,258 @@
+# app/services/approx.py
+import os
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services import metrics
+from app.services.pivot_engine import create_pivot
+from app.services.result_cache import DigestLRU
+
+# Approximate answers for exploratory questions on large sheets:
+#   sum / count / mean   stratified sample (one stratum per group), 95% normal bounds
+#   median / pNN         the same sample as a quantile sketch, bounds from the DKW inequality
+#   nunique              HyperLogLog registers per group, built from one pass over the column
+#   min / max            sample extremes, bounded on one side only
+# Follow-up questions on the same sheet and grouping reuse the sample or sketch.
+APPROX_SAMPLE_ROWS = int(os.getenv("EXCEL_AI_APPROX_SAMPLE_ROWS", "100000"))
+APPROX_MIN_PER_GROUP = int(os.getenv("EXCEL_AI_APPROX_MIN_PER_GROUP", "200"))
+APPROX_SKETCHES = int(os.getenv("EXCEL_AI_APPROX_SKETCHES", "32"))
+HLL_PRECISION = int(os.getenv("EXCEL_AI_HLL_PRECISION", "12"))
+CONFIDENCE = 0.95
+Z = 1.959964
+
+APPROX_QUERIES = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_approx_total", "Approximate answers by method.", ("method",)))
+
+_cache = DigestLRU(APPROX_SKETCHES)
+
+
+def clear():
+    _cache.clear()
+
+
+def parse_agg(agg: str) -> Tuple[str, Optional[float]]:
+    """(function, quantile) for an aggregation name: sum, count, mean/avg, min, max, median, p90, nunique."""
+    a = str(agg).lower()
+    if a in ("avg", "mean", "average"):
+        return "mean", None
+    if a in ("sum", "count", "min", "max"):
+        return a, None
+    if a in ("nunique", "distinct", "count_distinct"):
+        return "nunique", None
+    if a == "median":
+        return "quantile", 0.5
+    m = re.fullmatch(r"p(\d{1,2}(?:\.\d+)?)", a)
+    if m:
+        return "quantile", float(m.group(1)) / 100
+    raise ValueError(f"Unsupported aggregation for approximate mode: {agg}")
+
+
+def worthwhile(df: pd.DataFrame) -> bool:
+    """Frames that fit in one sample are answered exactly instead."""
+    return len(df) > APPROX_SAMPLE_ROWS
+
+
+class _Groups:
+    """Group id per row (-1 where a key is missing), group labels and sizes."""
+    __slots__ = ("ids", "labels", "sizes")
+
+    def __init__(self, df: pd.DataFrame, keys: List[str]):
+        if keys:
+            grouper = df.groupby(keys, sort=True)
+            self.ids = grouper.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+            counts = grouper.size()
+            self.labels, self.sizes = counts.index, counts.to_numpy()
+        else:
+            self.ids = np.zeros(len(df), dtype=np.int64)
+            self.labels, self.sizes = None, np.array([len(df)])
+
+
+class _Sample:
+    """
+    Stratified sample of a whole sheet, one stratum per group. It is drawn
+    without regard to any `filter`: the filter is applied to the sampled rows
+    afterwards, so a selective filter leaves few of them and wide bounds.
+    """
+    __slots__ = ("rows", "groups", "taken")
+
+    def __init__(self, df: pd.DataFrame, groups: _Groups):
+        # Bernoulli sampling per group: proportional share of APPROX_SAMPLE_ROWS,
+        # but at least APPROX_MIN_PER_GROUP rows so small groups get usable estimates
+        n = len(df)
+        quota = np.maximum(APPROX_MIN_PER_GROUP, groups.sizes * APPROX_SAMPLE_ROWS / max(n, 1))
+        prob = np.minimum(1.0, quota / np.maximum(groups.sizes, 1))
+        ids = groups.ids
+        rng = np.random.default_rng(n)
+        keep = (ids >= 0) & (rng.random(n) < prob[np.maximum(ids, 0)])
+        self.rows = df[keep].assign(__group=ids[keep])
+        self.groups = groups
+        self.taken = np.bincount(ids[keep], minlength=len(groups.sizes))
+
+
+def _sample(df: pd.DataFrame, digest: str, keys: List[str]) -> _Sample:
+    return _cache.get_or_build(("sample", digest, tuple(keys)), lambda: _Sample(df, _Groups(df, keys)))
+
+
+def _hll_registers(values: pd.Series, ids: np.ndarray, n_groups: int, p: int) -> np.ndarray:
+    present = values.notna().to_numpy() & (ids >= 0)
+    h = pd.util.hash_pandas_object(values[present], index=False).to_numpy()
+    ids = ids[present]
+    bucket = (h >> np.uint64(64 - p)).astype(np.int64)
+    rest = h & np.uint64((1 << (64 - p)) - 1)
+    # rank = position of the leftmost 1-bit in the remaining 64 - p bits;
+    # frexp's exponent is the bit length (exact, since 64 - p < 53 bits)
+    bits = np.frexp(rest.astype(np.float64))[1]
+    rank = (64 - p - bits + 1).astype(np.uint8)
+    registers = np.zeros((n_groups, 1 << p), dtype=np.uint8)
+    np.maximum.at(registers, (ids, bucket), rank)
+    return registers
+
+
+def hll_estimate(registers: np.ndarray) -> np.ndarray:
+    """Distinct-count estimate per row of HyperLogLog registers."""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    # linear counting is more accurate while many registers are still empty
+    return np.where(small, m * np.log(m / np.maximum(zeros, 1)), raw)
+
+
+def distinct_estimate(values: pd.Series, p: int = HLL_PRECISION) -> int:
+    """HyperLogLog estimate of the number of distinct non-missing values."""
+    regs = _hll_registers(values, np.zeros(len(values), dtype=np.int64), 1, p)
+    return int(round(hll_estimate(regs)[0]))
+
+
+def _distinct(df: pd.DataFrame, digest: str, keys: List[str], column: str, condition: Optional[str]):
+    def build():
+        frame = df.query(condition) if condition else df
+        groups = _Groups(frame, keys)
+        regs = _hll_registers(frame[column], groups.ids, len(groups.sizes), HLL_PRECISION)
+        return groups, regs
+    groups, regs = _cache.get_or_build(("hll", digest, tuple(keys), column, condition or ""), build)
+    est = np.round(hll_estimate(regs))
+    rel = Z * 1.04 / math.sqrt(regs.shape[-1])
+    return groups, est, np.floor(est * (1 - rel)), np.ceil(est * (1 + rel))
+
+
+def _from_sample(sample: _Sample, column: str, fn: str, q: Optional[float], condition: Optional[str]):
+    rows = sample.rows
+    y = rows[column]
+    if condition:
+        # rows outside the filter count as missing; their stratum sizes stay the same
+        y = y.where(rows.index.isin(rows.query(condition).index))
+    N = sample.groups.sizes.astype(np.float64)
+    n = sample.taken.astype(np.float64)
+    fpc = np.clip(1 - n / np.maximum(N, 1), 0, 1)
+    g = rows["__group"]
+    n_groups = len(N)
+    if fn in ("sum", "count", "mean"):
+        # counting only needs presence, so any column type works
+        y = y.notna().astype(np.float64).where(y.notna()) if fn == "count" else y.astype(np.float64)
+        stats = pd.DataFrame({"g": g, "y": y, "y0": y.fillna(0), "d": y.notna().astype(np.float64)}) \
+            .groupby("g").agg(y_mean=("y", "mean"), y_std=("y", "std"), y0_mean=("y0", "mean"),
+                              y0_std=("y0", "std"), d_mean=("d", "mean"), d_std=("d", "std"), nd=("y", "count")) \
+            .reindex(range(n_groups)).fillna({"y0_std": 0, "d_std": 0, "y_std": 0}).to_numpy().T
+        y_mean, y_std, y0_mean, y0_std, d_mean, d_std, nd = stats
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if fn == "sum":
+                est, se = N * y0_mean, N * y0_std / np.sqrt(n) * np.sqrt(fpc)
+            elif fn == "count":
+                est, se = N * d_mean, N * d_std / np.sqrt(n) * np.sqrt(fpc)
+            else:
+                est, se = y_mean, y_std / np.sqrt(nd) * np.sqrt(fpc)
+        return est, est - Z * se, est + Z * se
+    grouped = pd.DataFrame({"g": g, "y": y}).dropna().groupby("g")["y"]
+    if fn in ("min", "max"):
+        est = getattr(grouped, fn)().reindex(range(n_groups)).to_numpy()
+        # the true minimum can only be lower than the sample's (and the maximum higher)
+        none = np.full(n_groups, np.nan)
+        return (est, none, est) if fn == "min" else (est, est, none)
+    # sample quantile; the DKW inequality bounds its rank error by eps with 95% confidence
+    nd = grouped.count().reindex(range(n_groups)).fillna(0).to_numpy()
+    eps = np.sqrt(np.log(2 / (1 - CONFIDENCE)) / (2 * np.maximum(nd, 1)))
+    est, lo, hi = (np.full(n_groups, np.nan) for _ in range(3))
+    for gid, vals in grouped:
+        i = int(gid)
+        est[i] = vals.quantile(q)
+        lo[i] = vals.quantile(max(q - eps[i], 0.0)) if n[i] < N[i] else est[i]
+        hi[i] = vals.quantile(min(q + eps[i], 1.0)) if n[i] < N[i] else est[i]
+    return est, lo, hi
+
+
+def _estimate(df: pd.DataFrame, digest: str, keys: List[str], column: str, agg: str,
+              condition: Optional[str]) -> Tuple[_Groups, np.ndarray, np.ndarray, np.ndarray, str, int]:
+    fn, q = parse_agg(agg)
+    if column not in df.columns:
+        raise ValueError(f"Column {column} not found")
+    if fn == "nunique":
+        groups, est, lo, hi = _distinct(df, digest, keys, column, condition)
+        method, used = "hyperloglog", len(df)
+    else:
+        sample = _sample(df, digest, keys)
+        if fn != "count" and not pd.api.types.is_numeric_dtype(sample.rows[column]) and fn not in ("min", "max"):
+            raise ValueError(f"{agg} needs a numeric column; {column} is {sample.rows[column].dtype}")
+        est, lo, hi = _from_sample(sample, column, fn, q, condition)
+        groups, used = sample.groups, len(sample.rows)
+        method = "quantile_sketch" if fn == "quantile" else "stratified_sample"
+    APPROX_QUERIES.inc(method=method)
+    return groups, est, lo, hi, method, used
+
+
+def _value(v):
+    return None if v is None or pd.isna(v) else v
+
+
+def aggregate(df: pd.DataFrame, column: str, agg: str, group_by: list = None,
+              condition: Optional[str] = None, digest: str = "") -> Dict[str, Any]:
+    """
+    Approximate counterpart of math_operations.aggregate. Returns the estimate
+    as "result" (a value, or {group: value}) and its 95% interval as "bounds"
+    ([low, high]; None where a side is unbounded).
+    """
+    keys = [group_by] if isinstance(group_by, str) else list(group_by or [])
+    groups, est, lo, hi, method, used = _estimate(df, digest, keys, column, agg, condition)
+    bounds = [[_value(a), _value(b)] for a, b in zip(lo, hi)]
+    if keys:
+        labels = list(groups.labels)
+        result = {k: _value(v) for k, v in zip(labels, est)}
+        bounds = dict(zip(labels, bounds))
+    else:
+        result, bounds = _value(est[0]), bounds[0]
+    return {"result": result, "bounds": bounds, "approximate": True, "method": method,
+            "confidence": CONFIDENCE, "rows": int(len(df)), "rows_used": int(used)}
+
+
+def pivot(df: pd.DataFrame, index: list, columns: list, values, aggfunc: str = "sum",
+          digest: str = "") -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Approximate create_pivot; returns the pivot and, laid out the same way, its low/high bounds."""
+    idx = [index] if isinstance(index, str) else list(index)
+    cols = [columns] if isinstance(columns, str) else list(columns)
+    vals = [values] if isinstance(values, str) else list(values)
+    if parse_agg(aggfunc)[0] in ("min", "max"):
+        raise ValueError("approximate pivots support sum, count, mean, median, pNN and nunique")
+    layouts = {"estimate": {}, "low": {}, "high": {}}
+    labels, method, used = None, None, 0
+    for v in vals:
+        groups, est, lo, hi, method, used = _estimate(df, digest, idx + cols, v, aggfunc, None)
+        labels = groups.labels
+        for name, arr in (("estimate", est), ("low", lo), ("high", hi)):
+            layouts[name][v] = arr
+    tables = {}
+    for name, cells in layouts.items():
+        # one row per cell; a "sum" pivot of it reproduces create_pivot's layout
+        frame = pd.DataFrame(cells, index=labels).reset_index()
+        frame.columns = idx + cols + vals
+        tables[name] = create_pivot(frame.dropna(subset=vals, how="all"), index=index, columns=columns,
+                                    values=values, aggfunc="sum")
+    info = {"approximate": True, "method": method, "confidence": CONFIDENCE, "rows": int(len(df)),
+            "rows_used": int(used),
+            "bounds": {"low": tables["low"].to_dict(orient="records"),
+                       "high": tables["high"].to_dict(orient="records")}}
+    return tables["estimate"], info
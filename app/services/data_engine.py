@@ -1,31 +1,201 @@
 # app/services/data_engine.py
 import os
+import hashlib
+import zipfile
+import threading
 import pandas as pd
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+from app.services import deadline, metrics, upload_store, parallel_ingest, sheet_catalog
+from app.services.sheet_digest import xlsx_sheet_digests
 
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
 def get_excel_path(file_path: str) -> str:
+    if upload_store.is_handle(file_path):
+        resolved = upload_store.resolve(file_path)
+        if resolved is None:
+            raise FileNotFoundError(f"Unknown upload handle: {file_path}")
+        file_path = resolved
     if not os.path.isabs(file_path):
         file_path = os.path.join(os.getcwd(), file_path)
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Excel file not found: {file_path}")
     return file_path
 
+# Parsed-sheet cache: per-sheet content digest -> DataFrame, LRU-evicted.
+# Keyed by sheet content rather than file, so unchanged sheets of a new
+# workbook version reuse the frames parsed from the previous one.
+FRAME_CACHE_SIZE = int(os.getenv("EXCEL_AI_FRAME_CACHE_SIZE", "32"))
+_frame_cache: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Per-file metadata (sheet names, hashes, digests) keyed by (path, mtime, size);
+# LRU-bounded like the frames, so replaced and deleted files do not pile up.
+_sheet_names: "OrderedDict[Tuple, List[str]]" = OrderedDict()
+_content_hashes: "OrderedDict[Tuple, str]" = OrderedDict()
+_sheet_digests: "OrderedDict[Tuple, Dict[str, str]]" = OrderedDict()
+
+def _file_key(path: str) -> Tuple:
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+def _memo_get(memo: OrderedDict, key: Tuple):
+    with _cache_lock:
+        value = memo.get(key)
+        if value is not None:
+            memo.move_to_end(key)
+        return value
+
+def _memo_put(memo: OrderedDict, key: Tuple, value):
+    with _cache_lock:
+        memo[key] = value
+        while len(memo) > FRAME_CACHE_SIZE:
+            memo.popitem(last=False)
+
+def content_hash(file_path: str) -> str:
+    """sha256 of the file bytes, re-hashed only when mtime or size change."""
+    path = get_excel_path(file_path)
+    key = _file_key(path)
+    digest = _memo_get(_content_hashes, key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _memo_put(_content_hashes, key, digest)
+    return digest
+
+def sheet_digests(file_path: str) -> Dict[str, str]:
+    """Sheet name -> content digest; per zip part for .xlsx, whole-file hash otherwise."""
+    path = get_excel_path(file_path)
+    key = _file_key(path)
+    digests = _memo_get(_sheet_digests, key)
+    if digests is None:
+        if zipfile.is_zipfile(path):
+            try:
+                digests = xlsx_sheet_digests(path)
+            except Exception:
+                digests = None
+            if digests is not None and set(digests) != set(sheet_names(path)):
+                digests = None
+        if digests is None:
+            whole = content_hash(path)
+            digests = {n: hashlib.sha256(f"{whole}:{n}".encode()).hexdigest() for n in sheet_names(path)}
+        _memo_put(_sheet_digests, key, digests)
+    return digests
+
+def sheet_digest(file_path: str, sheet_name: str = None) -> str:
+    names = sheet_names(file_path)
+    digests = sheet_digests(file_path)
+    name = names[0] if sheet_name is None else sheet_name
+    if name not in digests:
+        raise ValueError(f"Sheet {name} not found in {file_path}. Available: {names}")
+    return digests[name]
+
+def changed_sheets(old_path: str, new_path: str) -> Dict[str, List[str]]:
+    """Compare two versions of a workbook sheet by sheet."""
+    old, new = sheet_digests(old_path), sheet_digests(new_path)
+    return {
+        "changed": [n for n in new if n in old and old[n] != new[n]],
+        "added": [n for n in new if n not in old],
+        "removed": [n for n in old if n not in new],
+        "unchanged": [n for n in new if old.get(n) == new[n]],
+    }
+
+def sheet_names(file_path: str) -> List[str]:
+    path = get_excel_path(file_path)
+    key = _file_key(path)
+    names = _memo_get(_sheet_names, key)
+    if names is None:
+        with pd.ExcelFile(path) as xls:
+            names = list(xls.sheet_names)
+        _memo_put(_sheet_names, key, names)
+    return names
+
+def _cache_put(key: Tuple, df: pd.DataFrame):
+    with _cache_lock:
+        _frame_cache[key] = df
+        while len(_frame_cache) > FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+
 def read_sheet(file_path: str, sheet_name: str = None) -> pd.DataFrame:
     path = get_excel_path(file_path)
-    xls = pd.ExcelFile(path)
+    names = sheet_names(path)
     if sheet_name is None:
-        sheet_name = xls.sheet_names[0]
-    if sheet_name not in xls.sheet_names:
-        raise ValueError(f"Sheet {sheet_name} not found in {file_path}. Available: {xls.sheet_names}")
-    df = pd.read_excel(path, sheet_name=sheet_name)
-    return df
+        sheet_name = names[0]
+    if sheet_name not in names:
+        raise ValueError(f"Sheet {sheet_name} not found in {file_path}. Available: {names}")
+    digests = sheet_digests(path)
+    sheet_catalog.register_file(path, digests)
+    key = (digests[sheet_name],)
+    with _cache_lock:
+        df = _frame_cache.get(key)
+        if df is not None:
+            _frame_cache.move_to_end(key)
+    metrics.FRAME_CACHE.inc(result="hit" if df is not None else "miss")
+    if df is None:
+        # a parse cannot be interrupted; don't start one for a cancelled request
+        deadline.check()
+        df = pd.read_excel(path, sheet_name=sheet_name)
+        _cache_put(key, df)
+        sheet_catalog.record_stats(key[0], df)
+    # shallow copy: callers add columns freely without touching the cached frame
+    return df.copy(deep=False)
+
+def sheet_stats(file_path: str, sheet_name: str = None) -> Dict[str, Any]:
+    """Catalog stats of a sheet (recorded when it was parsed); parses it only if none are recorded."""
+    digest = sheet_digest(file_path, sheet_name)
+    stats = sheet_catalog.stats_for(digest)
+    if stats is None:
+        sheet_catalog.record_stats(digest, read_sheet(file_path, sheet_name))
+        stats = sheet_catalog.stats_for(digest)
+    return stats
+
+def warm_cache(file_path: str) -> List[str]:
+    """
+    Parse every sheet of a workbook into the frame cache; returns the sheet names.
+    Sheets not cached yet are parsed together, across processes for large files.
+    """
+    names = sheet_names(file_path)
+    read_many([(file_path, n) for n in names])
+    return names
+
+def read_many(items: List[Tuple[str, str]]) -> List[pd.DataFrame]:
+    """
+    Frames for (file, sheet) pairs, possibly across many workbooks. Sheets
+    not cached yet are parsed together on the ingest process pool.
+    """
+    keys = []
+    for file_path, sheet in items:
+        path = get_excel_path(file_path)
+        digests = sheet_digests(path)
+        sheet_catalog.register_file(path, digests)
+        keys.append((path, sheet, digests[sheet]))
+    with _cache_lock:
+        found = {k[2]: _frame_cache[(k[2],)] for k in keys if (k[2],) in _frame_cache}
+    missing = {}
+    for path, sheet, digest in keys:
+        if digest not in found and digest not in missing:
+            missing[digest] = (path, sheet)
+    metrics.FRAME_CACHE.inc(len(keys) - len(missing), result="hit")
+    metrics.FRAME_CACHE.inc(len(missing), result="miss")
+    if missing:
+        parsed = parallel_ingest.read_pairs(list(missing.values()))
+        for digest, pair in missing.items():
+            found[digest] = parsed[pair]
+            _cache_put((digest,), parsed[pair])
+            sheet_catalog.record_stats(digest, parsed[pair])
+    return [found[d].copy(deep=False) for _, _, d in keys]
+
+def output_path(file_path: str) -> str:
+    return os.path.splitext(get_excel_path(file_path))[0] + "_out.xlsx"
 
 def write_sheet(df: pd.DataFrame, file_path: str, sheet_name: str = "Result", overwrite: bool = False) -> str:
     path = get_excel_path(file_path)
-    out_path = os.path.splitext(path)[0] + f"_out.xlsx"
+    out_path = output_path(path)
     if overwrite:
         out_path = path
     with pd.ExcelWriter(out_path, engine="openpyxl", mode="w") as writer:
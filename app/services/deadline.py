@@ -0,0 +1,221 @@
+# app/services/deadline.py
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import FIRST_EXCEPTION, Future, wait
+from typing import Callable, Iterable, List, Mapping, Optional
+
+from app.services import metrics
+
+# Per-request deadline and cancellation. DeadlineMiddleware starts one per request
+# (X-Request-Deadline header in seconds, else EXCEL_AI_REQUEST_DEADLINE) and
+# cancels it when the client goes away; it travels in a context variable, so
+# scheduler jobs and batch items see it too. Long-running code calls check()
+# between rows, chunks, files and retries, clamps blocking timeouts with
+# timeout(), and waits through sleep()/wait_futures(), which wake up within
+# POLL seconds of a cancellation.
+DEFAULT_DEADLINE = float(os.getenv("EXCEL_AI_REQUEST_DEADLINE", "0"))   # seconds; 0 = none
+HEADER = "x-request-deadline"
+POLL = 0.2
+
+REQUESTS_CANCELLED = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_requests_cancelled_total", "Requests whose work was stopped early.", ("reason",)))
+
+DEADLINE_EXCEEDED = "deadline exceeded"
+DISCONNECTED = "client disconnected"
+
+
+class Cancelled(Exception):
+    """The request this work belongs to is past its deadline or was abandoned."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"request cancelled: {reason}")
+        self.reason = reason
+
+
+class Deadline:
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires = time.monotonic() + seconds if seconds and seconds > 0 else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+            REQUESTS_CANCELLED.inc(reason=reason)
+
+    def remaining(self) -> Optional[float]:
+        return None if self.expires is None else self.expires - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.expires is not None and time.monotonic() >= self.expires:
+            self.cancel(DEADLINE_EXCEEDED)
+        return self._event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+    def wait(self, seconds: float) -> bool:
+        """Block up to `seconds`; True as soon as the deadline is cancelled or passes."""
+        rem = self.remaining()
+        if rem is not None and rem < seconds:
+            self._event.wait(max(rem, 0))
+            return self.cancelled
+        return self._event.wait(seconds)
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("excel_ai_deadline", default=None)
+
+
+def from_headers(headers: Mapping[str, str]) -> Deadline:
+    """The request's deadline: the header when sent (never beyond the configured one), else the config."""
+    seconds = DEFAULT_DEADLINE or None
+    try:
+        asked = float(headers.get(HEADER) or 0)
+    except ValueError:
+        asked = 0
+    if asked > 0:
+        seconds = min(asked, seconds) if seconds else asked
+    return Deadline(seconds)
+
+
+def start(d: Deadline) -> contextvars.Token:
+    return _current.set(d)
+
+
+def end(token: contextvars.Token):
+    _current.reset(token)
+
+
+@contextmanager
+def scope(d: Optional[Deadline]):
+    token = start(d)
+    try:
+        yield d
+    finally:
+        end(token)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def check():
+    """Raise Cancelled if the current request is past its deadline or abandoned."""
+    d = _current.get()
+    if d is not None:
+        d.check()
+
+
+def timeout(seconds: Optional[float]) -> Optional[float]:
+    """A blocking call's timeout, cut to what is left of the current deadline (at least POLL)."""
+    d = _current.get()
+    rem = d.remaining() if d is not None else None
+    if rem is None:
+        return seconds
+    return max(min(seconds, rem) if seconds is not None else rem, POLL)
+
+
+def sleep(seconds: float):
+    """time.sleep that ends early, with Cancelled, when the request is cancelled."""
+    d = _current.get()
+    if d is None:
+        time.sleep(seconds)
+    elif d.wait(seconds):
+        d.check()
+
+
+def wait_until(acquire: Callable[[float], bool], seconds: float) -> bool:
+    """Call acquire(timeout) in POLL slices until it succeeds or `seconds` pass, checking for cancellation."""
+    d = _current.get()
+    if d is None:
+        return acquire(seconds)
+    end_at = time.monotonic() + seconds
+    while True:
+        d.check()
+        left = end_at - time.monotonic()
+        if acquire(max(min(POLL, left), 0)):
+            return True
+        if left <= POLL:
+            return False
+
+
+def wait_futures(futures: Iterable[Future], on_cancel: Optional[Callable[[], None]] = None) -> List:
+    """
+    Results of `futures` in order. If the request is cancelled meanwhile, futures
+    not started yet are cancelled, `on_cancel` runs (e.g. to stop pool workers)
+    and Cancelled is raised.
+    """
+    futures = list(futures)
+    d = _current.get()
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=POLL if d is not None else None, return_when=FIRST_EXCEPTION)
+        if any(f.exception() is not None for f in done if not f.cancelled()):
+            break
+        if d is not None and pending and d.cancelled:
+            for f in pending:
+                f.cancel()
+            if on_cancel is not None:
+                on_cancel()
+            d.check()
+    return [f.result() for f in futures]
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware giving each HTTP request a Deadline. Once the request body
+    is read it keeps listening on the connection, so a client that disconnects
+    before its response is sent cancels the request's work straight away. Must
+    be the outermost middleware: the @app.middleware("http") kind hides the
+    disconnect from the app below it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        d = from_headers(headers)
+        responded = False
+        listener: Optional[asyncio.Future] = None
+
+        async def listen():
+            message = await receive()
+            if message["type"] == "http.disconnect" and not responded:
+                d.cancel(DISCONNECTED)
+            return message
+
+        async def receive_body():
+            nonlocal listener
+            if listener is not None:
+                # the app asks again only to learn about a disconnect
+                return await asyncio.shield(listener)
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                d.cancel(DISCONNECTED)
+            elif not message.get("more_body"):
+                listener = asyncio.ensure_future(listen())
+            return message
+
+        async def send_response(message):
+            nonlocal responded
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                responded = True
+            await send(message)
+
+        token = start(d)
+        try:
+            await self.app(scope, receive_body, send_response)
+        finally:
+            end(token)
+            if listener is not None:
+                listener.cancel()
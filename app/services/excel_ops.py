@@ -1,5 +1,6 @@
 import pandas as pd
 from typing import Dict, Any
+from app.services import parallel_ingest
 
 
 def read_excel_sheets(path: str) -> Dict[str, pd.DataFrame]:
@@ -7,9 +8,12 @@ def read_excel_sheets(path: str) -> Dict[str, pd.DataFrame]:
     Read all sheets from an Excel file into a dictionary.
     - Keys: sheet names
     - Values: corresponding pandas DataFrames
+    Large workbooks are parsed one sheet per worker process.
     """
     try:
-        sheets = pd.read_excel(path, sheet_name=None, engine="openpyxl")
+        with pd.ExcelFile(path, engine="openpyxl") as xls:
+            names = list(xls.sheet_names)
+        sheets = parallel_ingest.read_sheets(path, names)
         return sheets
     except FileNotFoundError:
         raise FileNotFoundError(f"Excel file not found: {path}")
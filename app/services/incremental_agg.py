@@ -0,0 +1,168 @@
+# app/services/incremental_agg.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import pandas as pd
+
+from app.services import metrics, parallel_agg
+from app.services.math_operations import aggregate as full_aggregate
+from app.services.pivot_engine import create_pivot
+
+# Partial aggregates (sum, count, min, max per group) remembered per workbook
+# lineage (upload_store.lineage), sheet and spec. When a sheet comes back as a strict append of a remembered version, only
+# the new rows are aggregated and merged in. Each state holds the columns it
+# read (shared with the frame cache under copy-on-write) to verify the prefix.
+INCREMENTAL_STATES = int(os.getenv("EXCEL_AI_INCREMENTAL_STATES", "16"))
+
+INCREMENTAL_AGG = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_incremental_agg_total", "Aggregations by how they were computed.", ("result",)))
+
+PARTIALS = ["sum", "count", "min", "max"]
+MERGE = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+AGG_ALIASES = {"sum": "sum", "count": "count", "min": "min", "max": "max", "avg": "mean", "mean": "mean"}
+
+
+class _State:
+    __slots__ = ("n_rows", "rows", "partials")
+
+    def __init__(self, rows: pd.DataFrame, partials: pd.DataFrame):
+        self.n_rows = len(rows)
+        self.rows = rows
+        self.partials = partials
+
+    def is_prefix_of(self, rows: pd.DataFrame) -> bool:
+        """True when `rows` starts with exactly the rows this state was built from."""
+        n = self.n_rows
+        if len(rows) < n or list(rows.columns) != list(self.rows.columns):
+            return False
+        if n == 0:
+            return True
+        # cheap rejects on the boundary rows before comparing whole columns
+        for i in (n - 1, 0):
+            if not rows.iloc[[i]].reset_index(drop=True).equals(self.rows.iloc[[i]].reset_index(drop=True)):
+                return False
+        head = rows.iloc[:n].reset_index(drop=True)
+        return all(head[c].equals(self.rows[c]) for c in rows.columns)
+
+
+_states: "OrderedDict[Tuple, List[_State]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def clear():
+    with _lock:
+        _states.clear()
+
+
+def _row_local(condition: Optional[str]) -> bool:
+    # a filter that calls functions (e.g. "x > x.mean()") may depend on every row
+    return not condition or ("(" not in condition and "@" not in condition)
+
+
+def partial_aggregates(df: pd.DataFrame, keys: List[str], values: List[str]) -> pd.DataFrame:
+    # large frames are split over worker processes; the result is the same either way
+    return parallel_agg.group_aggregate(df, keys, {v: PARTIALS for v in values})
+
+
+def merge_partials(parts: List[pd.DataFrame], keyed: bool) -> pd.DataFrame:
+    """Combine partial tables computed over disjoint row sets into one."""
+    both = pd.concat(parts)
+    grouped = both.groupby(level=list(range(both.index.nlevels))) if keyed else both.groupby(lambda _: 0)
+    return grouped.agg({c: MERGE[c[1]] for c in both.columns})
+
+
+def finalize(partials: pd.DataFrame, value: str, agg: str) -> pd.Series:
+    if agg == "mean":
+        return partials[(value, "sum")] / partials[(value, "count")]
+    return partials[(value, agg)]
+
+
+def _update(key: Tuple, df: pd.DataFrame, read_cols: List[str], keys: List[str], values: List[str]) -> pd.DataFrame:
+    """Partials for df, reusing the longest remembered version that df strictly extends."""
+    rows = df[read_cols].reset_index(drop=True)
+    n = len(rows)
+    with _lock:
+        candidates = list(_states.get(key, []))
+    base = None
+    for st in sorted(candidates, key=lambda s: s.n_rows, reverse=True):
+        if st.is_prefix_of(rows):
+            base = st
+            break
+    if base is not None and base.n_rows == n:
+        partials = base.partials
+        INCREMENTAL_AGG.inc(result="unchanged")
+    elif base is not None:
+        delta = df.iloc[base.n_rows:]
+        partials = merge_partials([base.partials, partial_aggregates(delta, keys, values)], bool(keys))
+        INCREMENTAL_AGG.inc(result="delta")
+    else:
+        partials = partial_aggregates(df, keys, values)
+        INCREMENTAL_AGG.inc(result="full")
+    state = _State(rows, partials)
+    with _lock:
+        kept = [s for s in _states.pop(key, []) if s is not base and s.n_rows != n]
+        # the extended state supersedes the one it grew from
+        _states[key] = kept + [state]
+        while sum(len(v) for v in _states.values()) > INCREMENTAL_STATES:
+            oldest = next(iter(_states))
+            _states[oldest].pop(0)
+            if not _states[oldest]:
+                del _states[oldest]
+    return partials
+
+
+def usable(df: pd.DataFrame, values: List[str], agg: Optional[str], condition: Optional[str]) -> bool:
+    return (agg is not None and _row_local(condition)
+            and all(v in df.columns and pd.api.types.is_numeric_dtype(df[v])
+                    and not pd.api.types.is_bool_dtype(df[v]) for v in values))
+
+
+def aggregate(df: pd.DataFrame, column: str, agg: str, group_by: list = None,
+              condition: Optional[str] = None, sheet: str = "", source: str = "") -> Any:
+    """
+    Same result as math_operations.aggregate over df filtered by `condition`,
+    computed from remembered partials plus the appended rows when df extends
+    a version seen before of the same `source` workbook and `sheet`.
+    Non-numeric columns fall back to a full compute.
+    """
+    fn = AGG_ALIASES.get(str(agg).lower())
+    keys = [group_by] if isinstance(group_by, str) else list(group_by or [])
+    if not usable(df, [column], fn, condition):
+        INCREMENTAL_AGG.inc(result="fallback")
+        return full_aggregate(df.query(condition) if condition else df, column, agg, group_by)
+    filtered = df.query(condition) if condition else df
+    key = ("aggregate", source, sheet, column, tuple(keys), condition or "")
+    partials = _update(key, filtered, keys + [column], keys, [column])
+    result = finalize(partials, column, fn)
+    if keys:
+        return result.to_dict()
+    return result.iloc[0]
+
+
+def pivot(df: pd.DataFrame, index: list, columns: list, values, aggfunc: str = "sum", sheet: str = "",
+          source: str = "") -> pd.DataFrame:
+    """create_pivot with sum/count/min/max/mean maintained incrementally for appended rows."""
+    fn = AGG_ALIASES.get(str(aggfunc).lower()) if isinstance(aggfunc, str) else None
+    idx = [index] if isinstance(index, str) else list(index)
+    cols = [columns] if isinstance(columns, str) else list(columns)
+    vals = [values] if isinstance(values, str) else list(values)
+    if not usable(df, vals, fn, None):
+        INCREMENTAL_AGG.inc(result="fallback")
+        return create_pivot(df, index=index, columns=columns, values=values, aggfunc=aggfunc)
+    keys = idx + cols
+    key = ("pivot", source, sheet, tuple(keys), tuple(vals))
+    partials = _update(key, df, keys + vals, keys, vals)
+    return pivot_from_partials(partials, index, columns, values, fn)
+
+
+def pivot_from_partials(partials: pd.DataFrame, index: list, columns: list, values, fn: str) -> pd.DataFrame:
+    """Lay out partials keyed by index + columns exactly like create_pivot would."""
+    idx = [index] if isinstance(index, str) else list(index)
+    cols = [columns] if isinstance(columns, str) else list(columns)
+    vals = [values] if isinstance(values, str) else list(values)
+    # one row per cell; pivoting it with "sum" reproduces create_pivot's shape
+    cells = pd.DataFrame({v: finalize(partials, v, fn) for v in vals}).reset_index()
+    cells.columns = idx + cols + vals
+    return create_pivot(cells, index=index, columns=columns, values=values, aggfunc="sum")
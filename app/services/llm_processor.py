@@ -1,72 +1,45 @@
 import os
-import re
 import json
+from app.services.nl_parser import parse_query, to_sheet_op, MIN_CONFIDENCE
 
-# Check and load OpenAI API key
+# Check OpenAI API key; the (slow to import) client is loaded on first use
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 USE_OPENAI = bool(OPENAI_API_KEY)
+_openai = None
 
-if USE_OPENAI:
-    try:
-        import openai
-        openai.api_key = OPENAI_API_KEY
-    except Exception:
-        USE_OPENAI = False
+# without a schema every free word may be a column, so parser readings are less certain
+SCHEMALESS_MIN_CONFIDENCE = 0.5
+
+
+def _get_openai():
+    """Import and configure openai lazily. Returns None when unavailable."""
+    global _openai, USE_OPENAI
+    if _openai is None and USE_OPENAI:
+        try:
+            import openai
+            openai.api_key = OPENAI_API_KEY
+            _openai = openai
+        except Exception:
+            USE_OPENAI = False
+    return _openai
 
 
-def interpret_query(query: str) -> dict:
+def interpret_query(query: str, columns: list = None) -> dict:
     """
     Interpret a natural language query into a structured JSON operation
     for Pandas DataFrame processing.
     """
-    q = query.strip().lower()
-
-    # --- Math Operations ---
-    if 'add' in q or '+' in q:
-        m = re.search(r"add\s+(\w+)\s+(?:and|&)\s+(\w+)(?:\s+as\s+(\w+))?", q)
-        if m:
-            a, b, new = m.group(1), m.group(2), m.group(3) or f"{m.group(1)}_plus_{m.group(2)}"
-            return {"type": "math", "op": "+", "columns": [a, b], "new_column": new}
-
-    # --- Average / Mean ---
-    if 'average' in q or 'mean' in q:
-        m = re.search(r"average\s+(\w+)\s+by\s+(\w+)", q)
-        if m:
-            val, grp = m.group(1), m.group(2)
-            return {"type": "aggregation", "method": "groupby_agg", "groupby": [grp], "agg": {val: 'mean'}}
-
-    # --- Sum / Total ---
-    if 'sum' in q or 'total' in q:
-        m = re.search(r"(sum|total)\s+of\s+(\w+)\s+by\s+(\w+)", q)
-        if m:
-            val, grp = m.group(2), m.group(3)
-            return {"type": "aggregation", "method": "groupby_agg", "groupby": [grp], "agg": {val: 'sum'}}
-
-    # --- Filter Queries ---
-    if 'filter' in q or 'where' in q or 'greater' in q or 'less' in q:
-        m = re.search(r"where\s+(.+)", q)
-        if m:
-            expr = m.group(1)
-            expr = expr.replace('greater than', '>').replace('less than', '<').replace('equals', '==')
-            expr = expr.replace(' and ', ' & ').replace(' or ', ' | ')
-            return {"type": "filter", "expr": expr}
-
-    # --- Pivot Table ---
-    if 'pivot' in q:
-        m = re.search(r"pivot\s+(\w+)\s+by\s+(\w+)\s+and\s+(\w+)", q)
-        if m:
-            values, idx, cols = m.group(1), m.group(2), m.group(3)
-            return {"type": "pivot", "index": [idx], "columns": [cols], "values": values, "aggfunc": "sum"}
-
-    # --- Date Extraction ---
-    if 'month' in q or 'year' in q or 'day' in q:
-        m = re.search(r"extract\s+(month|year|day)\s+from\s+(\w+)(?:\s+as\s+(\w+))?", q)
-        if m:
-            part, col, new = m.group(1), m.group(2), m.group(3) or f"{col}_{part}"
-            return {"type": "date_extract", "column": col, "part": part, "new_column": new}
+    # --- Grammar-based parser (schema-aware when columns are given) ---
+    plan = parse_query(query, columns)
+    min_confidence = MIN_CONFIDENCE if columns else SCHEMALESS_MIN_CONFIDENCE
+    if plan and plan["confidence"] >= min_confidence:
+        op = to_sheet_op(plan)
+        if op:
+            return op
 
     # --- Fallback to OpenAI LLM ---
-    if USE_OPENAI:
+    openai = _get_openai()
+    if openai is not None:
         prompt = (
             "You are an assistant that converts natural language requests about a pandas DataFrame "
             "into a JSON operation. Respond ONLY with JSON describing one operation such as "
@@ -91,13 +64,13 @@ def interpret_query(query: str) -> dict:
 
 
 # ✅ Wrapper for orchestration usage
-def run_llm_interpretation(user_query: str) -> dict:
+def run_llm_interpretation(user_query: str, columns: list = None) -> dict:
     """
     Wrapper for orchestration or API routes to safely interpret a user query.
     Returns a JSON-like dict with 'status' and 'parsed' or 'error'.
     """
     try:
-        result = interpret_query(user_query)
+        result = interpret_query(user_query, columns)
         return {"status": "ok", "parsed": result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -34,8 +34,21 @@ def apply_math(df: pd.DataFrame, operation: str, target_cols: list, new_col: str
         raise ValueError("Unsupported math operation")
     return result_df
 
+def _quantile(agg: str):
+    # "median" or a percentile such as "p90"
+    if agg == "median":
+        return 0.5
+    if agg.startswith("p") and agg[1:].replace(".", "", 1).isdigit() and float(agg[1:]) <= 100:
+        return float(agg[1:]) / 100
+    return None
+
 def aggregate(df: pd.DataFrame, column: str, agg: str, group_by: list = None):
     agg = agg.lower()
+    if agg in {"nunique", "distinct", "count_distinct"}:
+        return df.groupby(group_by)[column].nunique().to_dict() if group_by else df[column].nunique()
+    q = _quantile(agg)
+    if q is not None:
+        return df.groupby(group_by)[column].quantile(q).to_dict() if group_by else df[column].quantile(q)
     if group_by:
         grouped = df.groupby(group_by)[column]
         if agg in {"sum"}:
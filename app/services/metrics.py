@@ -0,0 +1,209 @@
+# app/services/metrics.py
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Prometheus' default buckets, extended for slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = row
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, row in sorted(self._values.items()):
+                for i, upper in enumerate(self.buckets):
+                    le = 'le="%s"' % upper
+                    lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {row[i]}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, inf)} {row[-1]}")
+                lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {row[-2]}")
+                lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "excel_ai_stage_seconds", "Time spent per request stage.", ("stage", "operation", "cache")))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "excel_ai_request_seconds", "End-to-end query request latency.", ("operation", "cache")))
+LLM_CALLS = REGISTRY.register(Counter(
+    "excel_ai_llm_calls_total", "LLM calls by call site, cache state and outcome.", ("source", "cache", "outcome")))
+LLM_SECONDS = REGISTRY.register(Histogram(
+    "excel_ai_llm_seconds", "LLM call latency by call site.", ("source",)))
+FRAME_CACHE = REGISTRY.register(Counter(
+    "excel_ai_frame_cache_total", "Parsed-sheet cache lookups.", ("result",)))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "excel_ai_startup_seconds", "Time from app import to ready, by phase.", ("phase",)))
+
+
+class RequestTimer:
+    """
+    Collects per-stage durations for a single request.
+    Repeated stages (e.g. two reads for a join) are summed.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.operation: Optional[str] = None
+        self.cache = "miss"
+        # batch items run on worker threads against the same timer
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={secs * 1000:.1f}" for name, secs in list(self.stages.items())]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def finish(self):
+        # only query requests set an operation; skip /health, /metrics, etc.
+        if self.operation is None:
+            return
+        for name, secs in self.stages.items():
+            STAGE_SECONDS.observe(secs, stage=name, operation=self.operation, cache=self.cache)
+        REQUEST_SECONDS.observe(time.perf_counter() - self.started, operation=self.operation, cache=self.cache)
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("excel_ai_request_timer", default=None)
+
+
+def start_request() -> Tuple[RequestTimer, contextvars.Token]:
+    timer = RequestTimer()
+    return timer, _current.set(timer)
+
+
+def end_request(token: contextvars.Token):
+    timer = _current.get()
+    _current.reset(token)
+    if timer is not None:
+        timer.finish()
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return _current.get()
+
+
+def set_operation(operation: str):
+    timer = _current.get()
+    if timer is not None:
+        timer.operation = operation
+
+
+def set_cache(state: str):
+    timer = _current.get()
+    if timer is not None:
+        timer.cache = state
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block and attribute it to the current request (no-op outside a request)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer = _current.get()
+        if timer is not None:
+            timer.add(name, time.perf_counter() - start)
+
+
+def record_llm_call(source: str, seconds: float, cache: str = "miss", outcome: str = "ok"):
+    LLM_CALLS.inc(source=source, cache=cache, outcome=outcome)
+    if cache != "hit":
+        LLM_SECONDS.observe(seconds, source=source)
+        timer = _current.get()
+        if timer is not None:
+            timer.add("llm", seconds)
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
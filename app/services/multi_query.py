@@ -0,0 +1,105 @@
+# app/services/multi_query.py
+import os
+import glob
+import fnmatch
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.services import sheet_catalog
+from app.services.data_engine import get_excel_path, sheet_names, read_many
+from app.services.math_operations import aggregate as full_aggregate
+from app.services.pivot_engine import create_pivot
+from app.services.incremental_agg import (AGG_ALIASES, partial_aggregates, merge_partials, finalize,
+                                          pivot_from_partials, usable)
+
+# One query over many workbooks (or sheets) sharing a schema.
+MULTI_MAX_SOURCES = int(os.getenv("EXCEL_AI_MULTI_MAX_SOURCES", "1000"))
+SOURCE_FILE, SOURCE_SHEET = "source_file", "source_sheet"
+
+Source = Tuple[str, str]
+
+
+def _sheets_of(path: str) -> List[str]:
+    # recorded names avoid opening the file at all
+    recorded = sheet_catalog.file_sheets(path)
+    return list(recorded) if recorded else sheet_names(path)
+
+
+def is_glob(name: Optional[str]) -> bool:
+    return bool(name) and any(c in name for c in "*?[")
+
+
+def expand(pattern: str, sheet: Optional[str] = None) -> List[Source]:
+    """(path, sheet) pairs for a workbook glob and an optional sheet name or sheet glob."""
+    paths = sorted(p for p in glob.glob(pattern)
+                   if p.lower().endswith((".xls", ".xlsx")) and not p.endswith("_out.xlsx"))
+    sources = []
+    for p in paths:
+        path = get_excel_path(p)
+        names = _sheets_of(path)
+        if sheet is None:
+            sources.append((path, names[0]))
+        else:
+            sources.extend((path, n) for n in names if fnmatch.fnmatchcase(n, sheet))
+    if len(sources) > MULTI_MAX_SOURCES:
+        raise ValueError(f"{len(sources)} sheets match; the limit is {MULTI_MAX_SOURCES}")
+    return sources
+
+
+def prune(sources: List[Source], column: Optional[str], lo: Any = None, hi: Any = None) -> Tuple[List[Source], List[Source]]:
+    """
+    Split sources into (kept, pruned) using min/max recorded in the catalog.
+    Sheets with no record (never parsed, or changed since) are always kept.
+    """
+    if not column or (lo is None and hi is None):
+        return list(sources), []
+    kept, pruned = [], []
+    for path, sheet in sources:
+        digest = (sheet_catalog.file_sheets(path) or {}).get(sheet)
+        stats = sheet_catalog.stats_for(digest) if digest else None
+        (kept if sheet_catalog.may_overlap(stats, column, lo, hi) else pruned).append((path, sheet))
+    return kept, pruned
+
+
+def load(sources: List[Source], tag_sheet: bool = False) -> List[pd.DataFrame]:
+    """Frames for all sources (parsed in parallel), each tagged with its source_file column."""
+    frames = read_many(sources)
+    tagged = []
+    for (path, sheet), df in zip(sources, frames):
+        extra = {SOURCE_FILE: os.path.basename(path)}
+        if tag_sheet:
+            extra[SOURCE_SHEET] = sheet
+        tagged.append(df.assign(**extra))
+    return tagged
+
+
+def union(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def aggregate(frames: List[pd.DataFrame], column: str, agg: str, group_by: list = None,
+              condition: Optional[str] = None) -> Any:
+    """aggregate over the union of frames, merged from per-frame partials where possible."""
+    frames = [f.query(condition) if condition else f for f in frames]
+    fn = AGG_ALIASES.get(str(agg).lower())
+    keys = [group_by] if isinstance(group_by, str) else list(group_by or [])
+    if not frames:
+        return {} if keys else None
+    if not all(usable(f, [column], fn, None) for f in frames):
+        return full_aggregate(union([f[keys + [column]] for f in frames]), column, agg, group_by)
+    partials = merge_partials([partial_aggregates(f, keys, [column]) for f in frames], bool(keys))
+    result = finalize(partials, column, fn)
+    return result.to_dict() if keys else result.iloc[0]
+
+
+def pivot(frames: List[pd.DataFrame], index: list, columns: list, values, aggfunc: str = "sum") -> pd.DataFrame:
+    fn = AGG_ALIASES.get(str(aggfunc).lower()) if isinstance(aggfunc, str) else None
+    idx = [index] if isinstance(index, str) else list(index)
+    cols = [columns] if isinstance(columns, str) else list(columns)
+    vals = [values] if isinstance(values, str) else list(values)
+    if not frames or not all(usable(f, vals, fn, None) for f in frames):
+        return create_pivot(union([f[idx + cols + vals] for f in frames]), index=index, columns=columns,
+                            values=values, aggfunc=aggfunc)
+    partials = merge_partials([partial_aggregates(f, idx + cols, vals) for f in frames], True)
+    return pivot_from_partials(partials, index, columns, values, fn)
@@ -0,0 +1,658 @@
+# app/services/nl_parser.py
+"""
+Deterministic natural-language -> operation parser.
+
+Tokens are tagged against a small lexicon, the sheet's real column names
+(case-insensitive, whitespace/underscore-insensitive, fuzzy) and, when the
+catalog knows them, the top values of its category columns; then matched
+against one grammar per operation. Values become equality filters; words
+the grammar cannot place keep the confidence below the LLM threshold. The result uses the same
+{"operation", "parameters"} shape as the LLM planner plus a "confidence" in
+[0, 1]; callers only fall back to the LLM below a threshold.
+"""
+import os
+import re
+import difflib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+MIN_CONFIDENCE = float(os.getenv("EXCEL_AI_PARSER_MIN_CONFIDENCE", "0.75"))
+FUZZY_CUTOFF = 0.8
+
+TOKEN_RE = re.compile(r"""
+    "(?P<dq>[^"]*)" | '(?P<sq>[^']*)' | `(?P<bq>[^`]*)`
+  | (?P<date>\d{4}-\d{2}-\d{2})
+  | (?P<num>-?\d[\d,]*(?:\.\d+)?[kKmM]?)(?![A-Za-z0-9_])
+  | (?P<op>>=|<=|!=|==|=|>|<|\+|-|\*|/|&|\|)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+""", re.X)
+
+# multi-word phrases, longest first when matched
+PHRASES: Dict[Tuple[str, ...], Tuple[str, Any]] = {
+    ("greater", "than", "or", "equal", "to"): ("CMP", ">="),
+    ("less", "than", "or", "equal", "to"): ("CMP", "<="),
+    ("greater", "than"): ("CMP", ">"),
+    ("more", "than"): ("CMP", ">"),
+    ("higher", "than"): ("CMP", ">"),
+    ("less", "than"): ("CMP", "<"),
+    ("fewer", "than"): ("CMP", "<"),
+    ("lower", "than"): ("CMP", "<"),
+    ("at", "least"): ("CMP", ">="),
+    ("at", "most"): ("CMP", "<="),
+    ("not", "equal", "to"): ("CMP", "!="),
+    ("equal", "to"): ("CMP", "=="),
+    ("is", "not"): ("CMP", "!="),
+    ("group", "by"): ("BY", None),
+    ("grouped", "by"): ("BY", None),
+    ("broken", "down", "by"): ("BY", None),
+    ("for", "each"): ("BY", None),
+    ("number", "of"): ("AGG", "count"),
+    ("how", "many"): ("AGG", "count"),
+    ("divided", "by"): ("MATH", "div"),
+    ("multiplied", "by"): ("MATH", "mul"),
+    ("ratio", "of"): ("MATH", "div"),
+    ("days", "between"): ("DIFF", None),
+    ("difference", "between"): ("DIFF", None),
+    ("pivot", "table"): ("PIVOT", None),
+    ("cross", "tab"): ("PIVOT", None),
+}
+
+WORDS: Dict[str, Tuple[str, Any]] = {
+    "sum": ("AGG", "sum"), "total": ("AGG", "sum"),
+    "average": ("AGG", "mean"), "avg": ("AGG", "mean"), "mean": ("AGG", "mean"),
+    "min": ("AGG", "min"), "minimum": ("AGG", "min"), "lowest": ("AGG", "min"), "smallest": ("AGG", "min"),
+    "max": ("AGG", "max"), "maximum": ("AGG", "max"), "highest": ("AGG", "max"), "largest": ("AGG", "max"),
+    "biggest": ("AGG", "max"), "count": ("AGG", "count"),
+    "by": ("BY", None), "per": ("BY", None), "across": ("BY", None),
+    "and": ("CONJ", "and"), "or": ("CONJ", "or"), "&": ("CONJ", "and"), "|": ("CONJ", "or"),
+    "where": ("WHERE", None), "filter": ("WHERE", None), "having": ("WHERE", None), "whose": ("WHERE", None),
+    "with": ("WHERE", None),
+    ">": ("CMP", ">"), "<": ("CMP", "<"), ">=": ("CMP", ">="), "<=": ("CMP", "<="),
+    "=": ("CMP", "=="), "==": ("CMP", "=="), "!=": ("CMP", "!="),
+    "above": ("CMP", ">"), "over": ("CMP", ">"), "exceeds": ("CMP", ">"), "after": ("CMP", ">"), "since": ("CMP", ">="),
+    "below": ("CMP", "<"), "under": ("CMP", "<"), "before": ("CMP", "<"), "until": ("CMP", "<="),
+    "equals": ("CMP", "=="), "is": ("CMP", "=="), "are": ("CMP", "=="),
+    "between": ("BETWEEN", None),
+    "add": ("MATH", "add"), "plus": ("MATH", "add"), "+": ("MATH", "add"),
+    "subtract": ("MATH", "sub"), "minus": ("MATH", "sub"), "-": ("MATH", "sub"),
+    "multiply": ("MATH", "mul"), "times": ("MATH", "mul"), "*": ("MATH", "mul"),
+    "divide": ("MATH", "div"), "/": ("MATH", "div"),
+    "pivot": ("PIVOT", None), "crosstab": ("PIVOT", None),
+    "rows": ("ROWS", None), "index": ("ROWS", None), "columns": ("COLS", None),
+    "extract": ("EXTRACT", None),
+    "year": ("PART", "year"), "years": ("PART", "year"), "month": ("PART", "month"), "months": ("PART", "month"),
+    "day": ("PART", "day"), "days": ("PART", "day"), "weekday": ("PART", "weekday"), "weekdays": ("PART", "weekday"),
+    "as": ("AS", None), "called": ("AS", None), "named": ("AS", None),
+    "from": ("FROM", None), "to": ("TO", None), "of": ("OF", None), "in": ("OF", None), "for": ("OF", None),
+}
+
+STOPWORDS = {
+    "the", "a", "an", "what", "whats", "show", "me", "give", "list", "get", "find", "compute", "calculate",
+    "please", "all", "rows", "records", "entries", "values", "value", "column", "each", "table", "data",
+    "sheet", "employees", "employee", "people", "there", "do", "does", "we", "have", "on", "it", "that",
+    "which", "who", "this", "new", "into", "than", "then", "only", "number",
+}
+
+DATE_PARTS = ("year", "month", "day", "weekday")
+
+
+class Token:
+    __slots__ = ("kind", "value", "text", "score")
+
+    def __init__(self, kind: str, value: Any, text: str, score: float = 1.0):
+        self.kind = kind
+        self.value = value
+        self.text = text
+        self.score = score
+
+    def __repr__(self):
+        return f"{self.kind}({self.value!r})"
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", s.lower())
+
+
+def _singular(s: str) -> str:
+    if s.endswith("ies") and len(s) > 4:
+        return s[:-3] + "y"
+    if s.endswith("s") and not s.endswith("ss") and len(s) > 3:
+        return s[:-1]
+    return s
+
+
+def _number(text: str) -> float:
+    t = text.replace(",", "")
+    mult = 1
+    if t[-1] in "kK":
+        mult, t = 1_000, t[:-1]
+    elif t[-1] in "mM":
+        mult, t = 1_000_000, t[:-1]
+    v = float(t) * mult
+    return int(v) if v.is_integer() else v
+
+
+class ColumnMatcher:
+    """Resolve phrases to real column names: exact (normalized), singular/plural, then fuzzy."""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = [str(c) for c in columns]
+        self.by_norm: Dict[str, str] = {}
+        for c in self.columns:
+            self.by_norm.setdefault(_norm(c), c)
+            self.by_norm.setdefault(_singular(_norm(c)), c)
+
+    def exact(self, phrase: str) -> Optional[str]:
+        n = _norm(phrase)
+        return self.by_norm.get(n) or self.by_norm.get(_singular(n))
+
+    def fuzzy(self, phrase: str) -> Optional[Tuple[str, float]]:
+        n = _singular(_norm(phrase))
+        if len(n) < 3:
+            return None
+        best = difflib.get_close_matches(n, list(self.by_norm), n=1, cutoff=FUZZY_CUTOFF)
+        if not best or not _covers(phrase.split(), best[0]):
+            return None
+        return self.by_norm[best[0]], difflib.SequenceMatcher(None, n, best[0]).ratio()
+
+
+def _covers(words: Sequence[str], name: str) -> bool:
+    """Every word of a phrase is (nearly) spelled out in the column name; "sales department" is not Department."""
+    for w in words:
+        w = _norm(w)
+        m = difflib.SequenceMatcher(None, w, name).find_longest_match(0, len(w), 0, len(name))
+        if m.size < max(1, int(0.75 * len(w))):
+            return False
+    return True
+
+
+class ValueMatcher:
+    """Resolve words to known values of category columns (the catalog's top values)."""
+
+    def __init__(self, values: Dict[str, Sequence[Any]]):
+        self.by_norm: Dict[str, Tuple[str, str]] = {}
+        for col, vals in values.items():
+            for v in vals:
+                if isinstance(v, str) and _norm(v):
+                    self.by_norm.setdefault(_norm(v), (col, v))
+
+    def match(self, words: Sequence[str]) -> Optional[Tuple[int, Tuple[str, str]]]:
+        """(words used, (column, value)) for the longest leading phrase naming a value."""
+        for n in range(min(3, len(words)), 0, -1):
+            hit = self.by_norm.get(_norm(" ".join(words[:n])))
+            if hit is None:
+                continue
+            # a stopword ("it", "on") only counts when written like the value ("IT")
+            if n == 1 and words[0].lower() in STOPWORDS and words[0] != hit[1]:
+                continue
+            return n, hit
+        return None
+
+
+def tokenize(query: str, columns: Optional[Sequence[str]] = None,
+             values: Optional[Dict[str, Sequence[Any]]] = None) -> List[Token]:
+    raw: List[Tuple[str, str]] = []
+    for m in TOKEN_RE.finditer(query):
+        kind = m.lastgroup
+        raw.append((kind, m.group(kind)))
+
+    matcher = ColumnMatcher(columns) if columns else None
+    value_matcher = ValueMatcher(values) if values else None
+    tokens: List[Token] = []
+    i = 0
+    while i < len(raw):
+        kind, text = raw[i]
+        if kind == "bq":
+            col = matcher.exact(text) if matcher else text
+            tokens.append(Token("COL", col or text, text, 1.0 if col else 0.5))
+            i += 1
+            continue
+        if kind in ("dq", "sq"):
+            col = matcher.exact(text) if matcher else None
+            tokens.append(Token("COL", col, text) if col else Token("STR", text, text))
+            i += 1
+            continue
+        if kind == "date":
+            tokens.append(Token("DATE", text, text))
+            i += 1
+            continue
+        if kind == "num":
+            tokens.append(Token("NUM", _number(text), text))
+            i += 1
+            continue
+        if kind == "op":
+            k, v = WORDS[text]
+            tokens.append(Token(k, v, text))
+            i += 1
+            continue
+
+        words = [w.lower() for w in _leading_words(raw, i)]
+        # 1. multi-word keyword phrases
+        hit = _match_phrase(words)
+        if hit:
+            n, (k, v) = hit
+            tokens.append(Token(k, v, " ".join(words[:n])))
+            i += n
+            continue
+        # 2. exact column names, longest n-gram first ("join date" -> JoinDate)
+        if matcher:
+            found = None
+            for n in range(min(4, len(words)), 0, -1):
+                col = matcher.exact(" ".join(words[:n]))
+                if col and not (n == 1 and words[0] in WORDS and _norm(col) != words[0]):
+                    found = (n, col)
+                    break
+            if found:
+                n, col = found
+                tokens.append(Token("COL", col, " ".join(_orig_words(raw, i, n))))
+                i += n
+                continue
+        # 3. single-word keywords
+        w = words[0]
+        if w in WORDS:
+            k, v = WORDS[w]
+            tokens.append(Token(k, v, text))
+            i += 1
+            continue
+        # 4. known category values ("IT", "Sales"), before stopwords and fuzzy columns can swallow them
+        if value_matcher:
+            hit = value_matcher.match(_orig_words(raw, i, len(words)))
+            if hit:
+                n, (col, value) = hit
+                tokens.append(Token("VAL", (col, value), " ".join(_orig_words(raw, i, n))))
+                i += n
+                continue
+        # 5. fuzzy column names
+        if matcher:
+            found = None
+            for n in range(min(3, len(words)), 0, -1):
+                fz = matcher.fuzzy(" ".join(words[:n]))
+                if fz:
+                    found = (n, fz)
+                    break
+            if found:
+                n, (col, score) = found
+                tokens.append(Token("COL", col, " ".join(_orig_words(raw, i, n)), score))
+                i += n
+                continue
+        if matcher is None and (w not in STOPWORDS or len(w) == 1):
+            # no schema: any free word (even "a") may name a column
+            tokens.append(Token("COL", text, text, 0.8))
+        elif w in STOPWORDS and not (text.isupper() and len(text) > 1):
+            # "IT", "ON" in capitals are more likely values than filler
+            tokens.append(Token("STOP", None, text))
+        else:
+            tokens.append(Token("WORD", text, text))
+        i += 1
+    return tokens
+
+
+def _leading_words(raw, i):
+    for k, w in raw[i:i + 5]:
+        if k != "word":
+            return
+        yield w
+
+
+def _orig_words(raw, i, n) -> List[str]:
+    return [w for _, w in raw[i:i + n]]
+
+
+def _match_phrase(words: List[str]) -> Optional[Tuple[int, Tuple[str, Any]]]:
+    for n in range(min(5, len(words)), 1, -1):
+        hit = PHRASES.get(tuple(words[:n]))
+        if hit:
+            return n, hit
+    return None
+
+
+# ---------------------------------------------------------------------------
+# grammar rules: each returns (operation, parameters, used token indexes, slot confidence)
+# ---------------------------------------------------------------------------
+
+def _literal(tok: Token, column: Optional[str], dtypes: Dict[str, str]) -> Optional[str]:
+    if tok.kind == "NUM":
+        return repr(tok.value)
+    if tok.kind == "VAL":
+        return repr(tok.value[1])
+    if tok.kind in ("STR", "DATE", "WORD", "COL"):
+        text = tok.text if tok.kind != "STR" else tok.value
+        return repr(str(text))
+    return None
+
+
+def _value_conditions(tokens: List[Token], used: set) -> List[str]:
+    """
+    Equality filters for known values not already part of a condition
+    ("salary of Ops department"); the column word next to a value is
+    consumed with it. Several values of one column become an `in` list.
+    """
+    by_col: Dict[str, List[str]] = {}
+    for i, t in enumerate(tokens):
+        if t.kind != "VAL" or i in used:
+            continue
+        col, value = t.value
+        used.add(i)
+        for j in (i - 1, i + 1):
+            if 0 <= j < len(tokens) and j not in used and tokens[j].kind == "COL" and tokens[j].value == col:
+                used.add(j)
+        if value not in by_col.setdefault(col, []):
+            by_col[col].append(value)
+    conds = []
+    for col, vals in by_col.items():
+        conds.append(f"{_quote(col)} == {vals[0]!r}" if len(vals) == 1 else f"{_quote(col)} in {vals!r}")
+    return conds
+
+
+def _quote(col: str) -> str:
+    return f"`{col}`"
+
+
+def _conditions(tokens: List[Token], start: int, dtypes: Dict[str, str]) -> Tuple[List[str], set]:
+    """Parse `COL CMP VALUE [and|or ...]` / `COL between A and B` runs from `start`."""
+    parts: List[str] = []
+    used = set()
+    i = start
+    pending_conj = None
+    while i < len(tokens):
+        t = tokens[i]
+        if t.kind == "COL" and i + 1 < len(tokens):
+            nxt = tokens[i + 1]
+            if nxt.kind == "BETWEEN" and i + 4 < len(tokens) and tokens[i + 3].kind == "CONJ":
+                lo = _literal(tokens[i + 2], t.value, dtypes)
+                hi = _literal(tokens[i + 4], t.value, dtypes)
+                if lo and hi:
+                    if parts:
+                        parts.append(pending_conj or "and")
+                    parts.append(f"{_quote(t.value)} >= {lo} and {_quote(t.value)} <= {hi}")
+                    used.update(range(i, i + 5))
+                    pending_conj = None
+                    i += 5
+                    continue
+            if nxt.kind == "CMP" and i + 2 < len(tokens):
+                j = i + 2
+                op = nxt.value
+                # "is not", "is above", "is greater than"
+                if tokens[j].kind == "CMP" and nxt.value == "==":
+                    op = tokens[j].value
+                    used.add(j)
+                    j += 1
+                if j < len(tokens):
+                    lit = _literal(tokens[j], t.value, dtypes)
+                    if lit is not None:
+                        if parts:
+                            parts.append(pending_conj or "and")
+                        parts.append(f"{_quote(t.value)} {op} {lit}")
+                        used.update({i, i + 1, j})
+                        pending_conj = None
+                        i = j + 1
+                        continue
+        if t.kind == "CONJ" and parts:
+            pending_conj = t.value
+            used.add(i)
+        i += 1
+    return parts, used
+
+
+def _first(tokens, kind, start=0) -> Optional[int]:
+    for i in range(start, len(tokens)):
+        if tokens[i].kind == kind:
+            return i
+    return None
+
+
+def _rule_pivot(tokens, columns, dtypes):
+    p = _first(tokens, "PIVOT")
+    if p is None:
+        return None
+    used = {p}
+    agg_i = _first(tokens, "AGG")
+    aggfunc = tokens[agg_i].value if agg_i is not None else "sum"
+    if agg_i is not None:
+        used.add(agg_i)
+    cols = [(i, t) for i, t in enumerate(tokens) if t.kind == "COL"]
+    index, pcols, values = [], [], None
+    if _first(tokens, "ROWS") is not None and _first(tokens, "COLS") is not None:
+        # "... with Department as rows and Country as columns" / "rows by Department, columns by Country"
+        for i, t in cols:
+            role = _pivot_role(tokens, i, used)
+            if role == "ROWS":
+                index.append(t.value)
+            elif role == "COLS":
+                pcols.append(t.value)
+            elif values is None:
+                values = t.value
+            else:
+                continue
+            used.add(i)
+    else:
+        # "pivot Salary by Department and Country"
+        by = _first(tokens, "BY")
+        if by is None or len(cols) < 3:
+            return None
+        before = [t.value for i, t in cols if i < by]
+        after = [t.value for i, t in cols if i > by]
+        if not before or len(after) < 2:
+            return None
+        values, index, pcols = before[0], after[:-1], after[-1:]
+        used.update(i for i, _ in cols)
+        used.add(by)
+    if not (values and index and pcols):
+        return None
+    return "pivot", {"index": index, "columns": pcols, "values": values, "aggfunc": aggfunc}, used, 1.0
+
+
+def _pivot_role(tokens, i, used) -> Optional[str]:
+    """ROWS/COLS role of the column at i: "<col> [as] rows" or "rows [by|of] <col>"."""
+    j = i + 1
+    if j < len(tokens) and tokens[j].kind == "AS":
+        j += 1
+    if j < len(tokens) and tokens[j].kind in ("ROWS", "COLS"):
+        used.update(range(i + 1, j + 1))
+        return tokens[j].kind
+    j = i - 1
+    if j >= 0 and tokens[j].kind in ("BY", "OF"):
+        j -= 1
+    if j >= 0 and tokens[j].kind in ("ROWS", "COLS"):
+        used.update(range(j, i))
+        return tokens[j].kind
+    return None
+
+
+def _is_date(col: str, dtypes: Dict[str, str]) -> bool:
+    dt = dtypes.get(col, "")
+    return dt.startswith("datetime") or (not dt and ("date" in col.lower() or "time" in col.lower()))
+
+
+def _rule_date_extract(tokens, columns, dtypes):
+    parts = [t.value for t in tokens if t.kind == "PART"]
+    if not parts or _first(tokens, "AGG") is not None or _first(tokens, "DIFF") is not None:
+        return None
+    date_cols = [(i, t) for i, t in enumerate(tokens) if t.kind == "COL" and _is_date(t.value, dtypes)]
+    if not date_cols:
+        return None
+    used = {i for i, t in enumerate(tokens) if t.kind in ("PART", "EXTRACT", "FROM", "OF", "CONJ")}
+    used.add(date_cols[0][0])
+    conf = 1.0 if _first(tokens, "EXTRACT") is not None else 0.85
+    ordered = [p for p in DATE_PARTS if p in parts]
+    return "date_extract", {"column": date_cols[0][1].value, "parts": ordered}, used, conf
+
+
+def _rule_date_diff(tokens, columns, dtypes):
+    d = _first(tokens, "DIFF")
+    if d is None:
+        return None
+    cols = [(i, t) for i, t in enumerate(tokens) if t.kind == "COL" and i > d]
+    if len(cols) < 2:
+        return None
+    (i1, a), (i2, b) = cols[:2]
+    used = {d, i1, i2} | {i for i, t in enumerate(tokens) if t.kind == "CONJ"}
+    params = {"start_col": a.value, "end_col": b.value}
+    new = _alias(tokens, used)
+    if new:
+        params["new_col"] = new
+    return "date_diff", params, used, 1.0 if all(_is_date(c.value, dtypes) for c in (a, b)) else 0.7
+
+
+def _alias(tokens, used) -> Optional[str]:
+    a = _first(tokens, "AS")
+    if a is not None and a + 1 < len(tokens) and tokens[a + 1].kind != "NUM":
+        used.update({a, a + 1})
+        return str(tokens[a + 1].value if tokens[a + 1].kind == "STR" else tokens[a + 1].text)
+    return None
+
+
+def _rule_math(tokens, columns, dtypes):
+    m = _first(tokens, "MATH")
+    if m is None:
+        return None
+    op = tokens[m].value
+    used = {m}
+    new_col = _alias(tokens, used)
+    operands = [(i, t) for i, t in enumerate(tokens) if t.kind in ("COL", "NUM") and i not in used]
+    cols = [t for _, t in operands if t.kind == "COL"]
+    nums = [t for _, t in operands if t.kind == "NUM"]
+    if not cols:
+        return None
+    used.update(i for i, _ in operands)
+    used.update(i for i, t in enumerate(tokens) if t.kind in ("CONJ", "FROM", "TO", "BY", "OF"))
+    if _first(tokens, "FROM") is not None and op == "sub" and len(cols) == 2 and m < _first(tokens, "FROM"):
+        # "subtract B from A"
+        cols = [cols[1], cols[0]]
+    if len(cols) >= 2:
+        params = {"math_op": op, "target_cols": [cols[0].value, cols[1].value]}
+    elif nums:
+        params = {"math_op": op, "target_cols": [cols[0].value], "operand": nums[0].value}
+    else:
+        return None
+    if new_col:
+        params["new_col"] = new_col
+    return "math", params, used, 1.0
+
+
+def _rule_aggregate(tokens, columns, dtypes):
+    a = _first(tokens, "AGG")
+    if a is None:
+        return None
+    agg = tokens[a].value
+    used = {a}
+    where = _first(tokens, "WHERE")
+    by = _first(tokens, "BY")
+    end = where if where is not None else len(tokens)
+    group_by, value_col = [], None
+    for i, t in enumerate(tokens[:end]):
+        if t.kind != "COL":
+            continue
+        if by is not None and i > by:
+            group_by.append(t.value)
+            used.add(i)
+        elif value_col is None:
+            value_col = t.value
+            used.add(i)
+    if by is not None:
+        used.add(by)
+        used.update(i for i, t in enumerate(tokens[:end]) if t.kind == "CONJ" and i > by)
+    used.update(i for i, t in enumerate(tokens[:end]) if t.kind == "OF")
+    conf = 1.0
+    if value_col is None:
+        if agg != "count" or not columns:
+            return None
+        value_col = next((c for c in columns if c not in group_by), columns[0])
+        conf = 0.9
+    params: Dict[str, Any] = {"column": value_col, "agg": agg}
+    if group_by:
+        params["group_by"] = group_by
+    filters = []
+    if where is not None or _has_condition(tokens, end):
+        conds, cused = _conditions(tokens, end, dtypes)
+        if conds:
+            filters.append(" ".join(conds))
+            used.update(cused)
+        if where is not None:
+            used.add(where)
+    filters += _value_conditions(tokens, used)
+    if filters:
+        params["filter"] = " and ".join(f"({f})" if " or " in f else f for f in filters)
+    return "aggregate", params, used, conf
+
+
+def _has_condition(tokens, start) -> bool:
+    return any(t.kind == "CMP" for t in tokens[start:])
+
+
+def _rule_filter(tokens, columns, dtypes):
+    conds, used = _conditions(tokens, 0, dtypes)
+    filters = [" ".join(conds)] if conds else []
+    filters += _value_conditions(tokens, used)
+    if not filters:
+        return None
+    used.update(i for i, t in enumerate(tokens) if t.kind == "WHERE")
+    return "filter", {"condition": " and ".join(f"({f})" if " or " in f else f for f in filters)}, used, 1.0
+
+
+RULES = (_rule_pivot, _rule_date_diff, _rule_date_extract, _rule_math, _rule_aggregate, _rule_filter)
+
+# tokens that carry no meaning on their own when left over
+NEUTRAL = {"STOP", "OF", "FROM", "TO", "CONJ", "WHERE", "BY", "AS", "CMP", "ROWS", "COLS"}
+# left over, these name data the plan ignores (a column, a value): alone they
+# take the confidence below MIN_CONFIDENCE so the LLM gets the query
+UNPLACED = {"WORD", "COL", "VAL", "STR", "NUM", "DATE"}
+UNPLACED_PENALTY = 0.3
+
+
+def parse_query(query: str, columns: Optional[Sequence[str]] = None,
+                dtypes: Optional[Dict[str, str]] = None,
+                values: Optional[Dict[str, Sequence[Any]]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Parse a query against a sheet schema. Returns
+      {"operation", "parameters", "confidence", "source": "parser"}
+    for the best-scoring rule, or None when no rule applies.
+    `values` maps category columns to their known values
+    (sheet_catalog.planner_values) so "salary for IT" filters on them.
+    """
+    columns = [str(c) for c in columns] if columns else None
+    dtypes = {str(k): str(v) for k, v in (dtypes or {}).items()}
+    tokens = tokenize(query, columns, values)
+    if not tokens:
+        return None
+    best = None
+    for rule in RULES:
+        hit = rule(tokens, columns, dtypes)
+        if not hit:
+            continue
+        op, params, used, conf = hit
+        col_scores = [t.score for i, t in enumerate(tokens) if i in used and t.kind == "COL"]
+        if col_scores:
+            conf *= min(col_scores)
+        leftovers = [t for i, t in enumerate(tokens) if i not in used and t.kind not in NEUTRAL]
+        # unexplained words, columns and values (intent we don't model) cost more than stray keywords
+        penalty = sum(UNPLACED_PENALTY if t.kind in UNPLACED else 0.15 for t in leftovers)
+        conf *= max(0.0, 1.0 - penalty)
+        conf = round(conf, 3)
+        if best is None or conf > best["confidence"]:
+            best = {"operation": op, "parameters": params, "confidence": conf, "source": "parser"}
+    return best
+
+
+MATH_SYMBOLS = {"add": "+", "sub": "-", "mul": "*", "div": "/"}
+MATH_WORDS = {"add": "plus", "sub": "minus", "mul": "times", "div": "div"}
+
+
+def to_sheet_op(plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Translate a parser plan into the excel_ops.execute_operation_on_sheet schema."""
+    op, p = plan["operation"], plan["parameters"]
+    if op == "aggregate":
+        if p.get("group_by"):
+            return {"type": "aggregation", "method": "groupby_agg", "groupby": p["group_by"], "agg": {p["column"]: p["agg"]}}
+        return {"type": "aggregation", "method": "summary", "columns": [p["column"]], "agg": p["agg"]}
+    if op == "filter":
+        return {"type": "filter", "expr": p["condition"]}
+    if op == "pivot":
+        return {"type": "pivot", "index": p["index"], "columns": p["columns"], "values": p["values"], "aggfunc": p["aggfunc"]}
+    if op == "math" and len(p["target_cols"]) == 2:
+        a, b = p["target_cols"]
+        return {"type": "math", "op": MATH_SYMBOLS[p["math_op"]], "columns": [a, b],
+                "new_column": p.get("new_col") or f"{a}_{MATH_WORDS[p['math_op']]}_{b}"}
+    if op == "date_extract":
+        part = p["parts"][0]
+        return {"type": "date_extract", "column": p["column"], "part": part, "new_column": f"{p['column']}_{part}"}
+    return None
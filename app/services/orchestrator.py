@@ -3,6 +3,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, List, Optional
 import os
+from app.services import profiling, parallel_agg, topk, sheet_index
+from app.services.data_engine import sheet_digest
 
 class ExcelExecutor:
     """
@@ -29,6 +31,24 @@ class ExcelExecutor:
 
     @staticmethod
     def run_command(cmd: Dict[str, Any]) -> Dict[str, Any]:
+        # opt-in profiling via {"profile": "sample"|"cprofile"|true}, gated by EXCEL_AI_PROFILING
+        mode = profiling.mode_from_value(cmd.get("profile"))
+        if mode:
+            with profiling.RequestProfiler(mode) as prof:
+                res = ExcelExecutor._run_command(cmd)
+            res["profile"] = prof.report("run_command")
+            return res
+        return ExcelExecutor._run_command(cmd)
+
+    @staticmethod
+    def _digest(file_path: str, sheet_name: Optional[str]) -> Optional[str]:
+        try:
+            return sheet_digest(file_path, sheet_name)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _run_command(cmd: Dict[str, Any]) -> Dict[str, Any]:
         op = cmd.get("operation")
         file_path = cmd.get("file_path") or cmd.get("path")
         sheet = cmd.get("sheet_name")
@@ -43,7 +63,8 @@ class ExcelExecutor:
         filter_expr = params.get("filter")
         if filter_expr:
             try:
-                df = df.query(filter_expr)
+                # indexes / zone maps (kept per sheet content) avoid scanning rows that cannot match
+                df = sheet_index.query(df, filter_expr, ExcelExecutor._digest(file_path, sheet))
             except Exception as e:
                 # return parse error
                 return {"error": "filter error", "detail": str(e)}
@@ -67,12 +88,17 @@ class ExcelExecutor:
                 # return DataFrame with additional columns (handled elsewhere)
                 return {"error":"nl_text operations handled by llm_agent (not by executor)"}
             if op in ("head","preview","sample"):
-                return {"result": df.head(200).to_dict(orient="records")}
+                return {"result": ExcelExecutor._head(df, params).to_dict(orient="records")}
             # default: return a head
-            return {"result": df.head(200).to_dict(orient="records")}
+            return {"result": ExcelExecutor._head(df, params).to_dict(orient="records")}
         except Exception as e:
             return {"error": "execution_error", "detail": str(e)}
 
+    @staticmethod
+    def _head(df: pd.DataFrame, params: Dict[str, Any], default: Optional[int] = 200) -> pd.DataFrame:
+        # order_by/limit for every operation; top-k selection instead of a full sort
+        return topk.top(df, params.get("order_by"), params.get("limit", default))
+
     @staticmethod
     def _exec_aggregate(df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
         group_by: List[str] = params.get("group_by", [])
@@ -88,14 +114,22 @@ class ExcelExecutor:
             elif an in ("count",): agg_map[c] = "count"
             else:
                 agg_map[c] = an
-        if group_by:
+        keys = [group_by] if isinstance(group_by, str) else list(group_by or [])
+        # ordering by a group key: only rows of the first `limit` keys are aggregated
+        pushed = topk.top_keys(df, params.get("order_by"), keys, params.get("limit") or None)
+        if pushed is not None:
+            df = pushed
+        spec = parallel_agg.spec_for(agg_map)
+        if keys and spec and parallel_agg.use_parallel(df, keys, spec):
+            # large frames: partial aggregates per row partition on worker processes
+            res = parallel_agg.finish(parallel_agg.group_aggregate(df, keys, spec, parallel=True), agg_map).reset_index()
+        elif group_by:
             res = df.groupby(group_by).agg(agg_map).reset_index()
         else:
             # overall aggregate
             res = df.agg(agg_map).to_frame().T.reset_index(drop=True)
-        limit = params.get("limit")
-        if limit:
-            res = res.head(int(limit))
+        # limit 0 has always meant "no limit" here
+        res = topk.top(res, params.get("order_by"), params.get("limit") or None)
         return {"result": res.to_dict(orient="records")}
 
     @staticmethod
@@ -117,12 +151,11 @@ class ExcelExecutor:
         persist = params.get("persist", False)
         if persist and params.get("file_path"):
             df.to_excel(params["file_path"], index=False, sheet_name=params.get("sheet_name", "Sheet1"))
-        return {"result": df.head(200).to_dict(orient="records")}
+        return {"result": ExcelExecutor._head(df, params).to_dict(orient="records")}
 
     @staticmethod
     def _exec_filter(df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
-        limit = params.get("limit", 200)
-        return {"result": df.head(limit).to_dict(orient="records")}
+        return {"result": ExcelExecutor._head(df, params).to_dict(orient="records")}
 
     @staticmethod
     def _exec_join(cmd: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
@@ -142,7 +175,7 @@ class ExcelExecutor:
             if not on:
                 raise ValueError("no join keys found; please supply 'on' param")
         res = left_df.merge(right_df, how=how, on=on)
-        return {"result": res.head(200).to_dict(orient="records")}
+        return {"result": ExcelExecutor._head(res, params).to_dict(orient="records")}
 
     @staticmethod
     def _exec_pivot(df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -152,13 +185,25 @@ class ExcelExecutor:
         aggfunc = params.get("aggfunc", "sum")
         if not values:
             raise ValueError("pivot requires 'values' param")
-        table = pd.pivot_table(df, index=index or None, columns=columns or None, values=values, aggfunc=aggfunc, fill_value=0)
+        idx = [index] if isinstance(index, str) else list(index or [])
+        cols = [columns] if isinstance(columns, str) else list(columns or [])
+        vals = [values] if isinstance(values, str) else list(values)
+        aggs = {v: aggfunc for v in vals} \
+            if isinstance(aggfunc, str) else None
+        spec = parallel_agg.spec_for(aggs) if aggs else None
+        if idx and spec and parallel_agg.use_parallel(df, idx + cols, spec):
+            # one row per cell from the parallel group-by; a "sum" pivot of it lays it out identically
+            cells = parallel_agg.finish(parallel_agg.group_aggregate(df, idx + cols, spec, parallel=True), aggs)
+            cells = cells.reset_index().dropna(subset=vals)
+            table = pd.pivot_table(cells, index=index, columns=columns or None, values=values, aggfunc="sum", fill_value=0)
+        else:
+            table = pd.pivot_table(df, index=index or None, columns=columns or None, values=values, aggfunc=aggfunc, fill_value=0)
         # flatten columns
         if isinstance(table, pd.DataFrame):
             table = table.reset_index()
         else:
             table = pd.DataFrame(table).reset_index()
-        return {"result": table.head(200).to_dict(orient="records")}
+        return {"result": ExcelExecutor._head(table, params).to_dict(orient="records")}
 
     @staticmethod
     def _exec_unpivot(df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -169,7 +214,7 @@ class ExcelExecutor:
         if not value_vars:
             value_vars = [c for c in df.columns if c not in id_vars]
         res = pd.melt(df, id_vars=id_vars or [], value_vars=value_vars, var_name=var_name, value_name=value_name)
-        return {"result": res.head(200).to_dict(orient="records")}
+        return {"result": ExcelExecutor._head(res, params).to_dict(orient="records")}
 
     @staticmethod
     def _exec_date_ops(df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -181,7 +226,7 @@ class ExcelExecutor:
                 out[c + "_year"] = pd.to_datetime(out[c], errors="coerce").dt.year
                 out[c + "_month"] = pd.to_datetime(out[c], errors="coerce").dt.month
                 out[c + "_day"] = pd.to_datetime(out[c], errors="coerce").dt.day
-            return {"result": out.head(200).to_dict(orient="records")}
+            return {"result": ExcelExecutor._head(out, params).to_dict(orient="records")}
         if op == "datediff":
             a = params.get("col_a")
             b = params.get("col_b")
@@ -193,5 +238,5 @@ class ExcelExecutor:
                 df["date_diff_days"] = diff.dt.days
             else:
                 df["date_diff_seconds"] = diff.dt.total_seconds()
-            return {"result": df.head(200).to_dict(orient="records")}
+            return {"result": ExcelExecutor._head(df, params).to_dict(orient="records")}
         raise ValueError("unsupported date operation")
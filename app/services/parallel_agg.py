@@ -0,0 +1,186 @@
+# app/services/parallel_agg.py
+import os
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services import metrics, parallel_ingest
+
+# Group-bys over large frames split into row partitions, each reduced to
+# partial aggregates in a worker process and merged here. Key and value
+# columns reach the workers through shared memory: group keys are factorized
+# into one int64 group id here, so workers only ever see numeric arrays.
+PARALLEL_AGG_MIN_ROWS = int(os.getenv("EXCEL_AI_PARALLEL_AGG_MIN_ROWS", "1000000"))
+AGG_WORKERS = int(os.getenv("EXCEL_AI_AGG_WORKERS", str(parallel_ingest.INGEST_WORKERS)))
+
+PARALLEL_AGG = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_parallel_agg_total", "Group-bys by how they were computed.", ("mode",)))
+
+# how each partial is combined across partitions
+COMBINE = {"sum": "sum", "count": "sum", "size": "sum", "min": "min", "max": "max"}
+SUPPORTED = set(COMBINE) | {"nunique"}
+
+Spec = Dict[str, List[str]]
+
+
+def _numeric(s: pd.Series) -> bool:
+    # plain numpy dtypes only: extension arrays have no flat buffer to share
+    return isinstance(s.dtype, np.dtype) and s.dtype.kind in "iuf"
+
+
+def use_parallel(df: pd.DataFrame, keys: List[str], spec: Spec, workers: int = None) -> bool:
+    workers = AGG_WORKERS if workers is None else workers
+    if workers < 2 or len(df) < PARALLEL_AGG_MIN_ROWS:
+        return False
+    if any(k not in df.columns for k in keys):
+        return False
+    for col, aggs in spec.items():
+        if col not in df.columns or not set(aggs) <= SUPPORTED:
+            return False
+        if set(aggs) - {"nunique"} and not _numeric(df[col]):
+            return False
+    return True
+
+
+def _serial(df: pd.DataFrame, keys: List[str], spec: Spec) -> pd.DataFrame:
+    if keys:
+        return df.groupby(keys).agg(spec)
+    return pd.DataFrame([[getattr(df[c], a)() for c, aggs in spec.items() for a in aggs]],
+                        columns=pd.MultiIndex.from_tuples([(c, a) for c, aggs in spec.items() for a in aggs]))
+
+
+def _share(arrays: Dict[str, np.ndarray]) -> Tuple[List[shared_memory.SharedMemory], Dict[str, tuple]]:
+    blocks, layout = [], {}
+    for name, arr in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)[:] = arr
+        blocks.append(block)
+        layout[name] = (block.name, arr.shape, arr.dtype.str)
+    return blocks, layout
+
+
+def _partition(layout: Dict[str, tuple], start: int, stop: int, spec: Spec):
+    """Worker: partials of rows [start, stop) keyed by group id, plus (gid, code) pairs for nunique."""
+    blocks = {name: shared_memory.SharedMemory(name=shm) for name, (shm, _, _) in layout.items()}
+    try:
+        views = {name: np.ndarray(shape, dtype=np.dtype(dt), buffer=blocks[name].buf)[start:stop]
+                 for name, (_, shape, dt) in layout.items()}
+        gid = views["__gid"]
+        keep = gid >= 0
+        gid = gid[keep]
+        # group sizes make every group with rows appear, even when all its values are missing
+        partials, distinct = {("__gid", "size"): pd.Series(gid).value_counts(sort=False)}, {}
+        for col, aggs in spec.items():
+            plain = [a for a in aggs if a != "nunique"]
+            if plain:
+                grouped = pd.Series(views[col][keep]).groupby(gid)
+                for a in plain:
+                    partials[(col, a)] = getattr(grouped, a)()
+            if "nunique" in aggs:
+                codes = views[f"{col}__codes"][keep]
+                pairs = np.unique(np.stack([gid[codes >= 0], codes[codes >= 0]]), axis=1)
+                distinct[col] = pairs
+        # everything returned is a fresh array, so the shared buffers can be released
+        del views, gid, keep
+        return pd.DataFrame(partials), distinct
+    finally:
+        for block in blocks.values():
+            block.close()
+
+
+def group_aggregate(df: pd.DataFrame, keys: List[str], spec: Spec, parallel: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Same frame as df.groupby(keys).agg(spec) (columns are (column, agg) pairs;
+    a single row when keys is empty) for sum/count/min/max/nunique, computed
+    over row partitions on the process pool when the frame is large enough.
+    """
+    spec = {c: list(a) for c, a in spec.items()}
+    if parallel is None:
+        parallel = use_parallel(df, keys, spec)
+    if not parallel:
+        PARALLEL_AGG.inc(mode="serial")
+        return _serial(df, keys, spec)
+
+    n = len(df)
+    uniques, dims = [], []
+    gid = np.zeros(n, dtype=np.int64)
+    try:
+        for k in keys:
+            codes, u = pd.factorize(df[k], sort=True)
+            uniques.append(u)
+            dims.append(max(len(u), 1))
+            gid = np.where((gid < 0) | (codes < 0), -1, gid * dims[-1] + codes)
+    except TypeError:
+        # keys mixing types that cannot be sorted against each other
+        parallel = False
+    if not parallel or np.prod(dims, dtype=float) >= 2 ** 62:
+        PARALLEL_AGG.inc(mode="serial")
+        return _serial(df, keys, spec)
+
+    arrays = {"__gid": gid}
+    for col, aggs in spec.items():
+        if set(aggs) - {"nunique"}:
+            arrays[col] = df[col].to_numpy()
+        if "nunique" in aggs:
+            arrays[f"{col}__codes"] = pd.factorize(df[col])[0].astype(np.int64)
+    blocks, layout = _share(arrays)
+    try:
+        bounds = np.linspace(0, n, min(AGG_WORKERS, n) * 2 + 1, dtype=np.int64)
+        with parallel_ingest.using() as pool:
+            futures = [pool.submit(_partition, layout, int(a), int(b), spec)
+                       for a, b in zip(bounds, bounds[1:]) if b > a]
+            results = parallel_ingest.gather(futures, pool)
+    except parallel_ingest.POOL_ERRORS:
+        PARALLEL_AGG.inc(mode="serial")
+        return _serial(df, keys, spec)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    PARALLEL_AGG.inc(mode="parallel")
+
+    plain = pd.concat([p for p, _ in results])
+    merged = plain.groupby(level=0).agg({c: COMBINE[c[1]] for c in plain.columns})
+    columns = {}
+    for col, aggs in spec.items():
+        for a in aggs:
+            if a == "nunique":
+                pairs = np.unique(np.concatenate([d[col] for _, d in results], axis=1), axis=1)
+                columns[(col, a)] = pd.Series(pairs[0]).value_counts()
+            else:
+                columns[(col, a)] = merged[(col, a)]
+    out = pd.DataFrame(columns, index=merged.index)
+    for col, aggs in spec.items():
+        if "nunique" in aggs:
+            out[(col, "nunique")] = out[(col, "nunique")].fillna(0).astype(np.int64)
+    if not keys:
+        return out.reset_index(drop=True)
+    codes = np.unravel_index(out.index.to_numpy(), dims)
+    levels = [u.take(c) for u, c in zip(uniques, codes)]
+    out.index = pd.MultiIndex.from_arrays(levels, names=keys) if len(keys) > 1 else pd.Index(levels[0], name=keys[0])
+    return out
+
+
+# partials needed for each user-facing aggregation
+PARTS = {"sum": ["sum"], "count": ["count"], "min": ["min"], "max": ["max"],
+         "mean": ["sum", "count"], "nunique": ["nunique"]}
+
+
+def spec_for(aggs: Dict[str, str]) -> Optional[Spec]:
+    """Partials spec for {column: agg}, or None if some agg cannot be merged from partials."""
+    if not aggs or any(a not in PARTS for a in aggs.values()):
+        return None
+    return {c: PARTS[a] for c, a in aggs.items()}
+
+
+def finish(partials: pd.DataFrame, aggs: Dict[str, str]) -> pd.DataFrame:
+    """One column per {column: agg}, as df.groupby(keys).agg(aggs) would return."""
+    out = {}
+    for c, a in aggs.items():
+        if a == "mean":
+            out[c] = partials[(c, "sum")] / partials[(c, "count")]
+        else:
+            out[c] = partials[(c, a)]
+    return pd.DataFrame(out, index=partials.index)
@@ -0,0 +1,180 @@
+# app/services/parallel_ingest.py
+import os
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.services import deadline
+
+# One task per sheet on a process pool; openpyxl parsing is pure Python, so
+# threads would serialize on the GIL. Small workbooks stay serial because
+# starting and feeding workers costs more than it saves.
+INGEST_WORKERS = int(os.getenv("EXCEL_AI_INGEST_WORKERS", str(min(os.cpu_count() or 1, 8))))
+PARALLEL_MIN_MB = float(os.getenv("EXCEL_AI_PARALLEL_MIN_MB", "2"))
+# spawn avoids forking a process that already runs server threads
+START_METHOD = os.getenv("EXCEL_AI_INGEST_START_METHOD", "spawn")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_users: Dict[ProcessPoolExecutor, int] = {}   # requests with tasks on each pool, counted from before submit
+
+# raised by a pool that broke (a worker died) or was shut down under its users;
+# callers fall back to working serially
+POOL_ERRORS = (BrokenProcessPool, RuntimeError, CancelledError)
+
+
+def _shared() -> ProcessPoolExecutor:
+    # with _pool_lock held
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context(START_METHOD))
+    return _pool
+
+
+def executor() -> ProcessPoolExecutor:
+    """The process pool shared by CPU-bound work (sheet parsing, partitioned aggregation)."""
+    with _pool_lock:
+        return _shared()
+
+
+@contextmanager
+def using() -> Iterator[ProcessPoolExecutor]:
+    """
+    The shared pool, counted as used by the caller for the whole block, so
+    tasks submitted in it are known to gather() of other requests before any
+    result is awaited. When the pool fails under the block (POOL_ERRORS), that
+    pool, not a newer one other requests may be using, is dropped and the
+    error re-raised.
+    """
+    with _pool_lock:
+        pool = _shared()
+        _users[pool] = _users.get(pool, 0) + 1
+    try:
+        yield pool
+    except POOL_ERRORS:
+        _discard(pool)
+        raise
+    finally:
+        with _pool_lock:
+            _users[pool] -= 1
+            if not _users[pool]:
+                del _users[pool]
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _discard(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _kill(pool: Optional[ProcessPoolExecutor]):
+    if pool is None:
+        return
+    # the executor has no public way to stop a running task; its processes do.
+    # _processes (pid -> Process, None once shut down) is a CPython internal of
+    # concurrent.futures.process, present in 3.8 through 3.13
+    for proc in list((getattr(pool, "_processes", None) or {}).values()):
+        proc.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def terminate():
+    """Kill the pool's workers now, losing the tasks they run; the next executor() starts a new pool."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    _kill(pool)
+
+
+def _abandon(pool: ProcessPoolExecutor):
+    # only when no other request has tasks on this pool; otherwise its queued
+    # tasks were cancelled and the running ones finish on their own
+    global _pool
+    with _pool_lock:
+        if _users.get(pool, 0) > 1:
+            return
+        if _pool is pool:
+            _pool = None
+    _kill(pool)
+
+
+def gather(futures, pool: ProcessPoolExecutor) -> List:
+    """
+    Results of futures submitted to `pool` inside using(), in order. If the
+    request is cancelled meanwhile, its queued tasks are dropped and, when it
+    is the pool's only user, the workers are killed so the CPU is free within
+    a poll interval.
+    """
+    return deadline.wait_futures(futures, on_cancel=lambda: _abandon(pool))
+
+
+def parse_sheet(path: str, sheet_name: str) -> pd.DataFrame:
+    return pd.read_excel(path, sheet_name=sheet_name)
+
+
+def use_parallel(path: str, n_sheets: int, workers: int = INGEST_WORKERS) -> bool:
+    return workers > 1 and n_sheets > 1 and os.path.getsize(path) >= PARALLEL_MIN_MB * 1024 * 1024
+
+
+def read_sheets(path: str, sheet_names: List[str], parallel: Optional[bool] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Parse the given sheets of one workbook, in parallel when it is large
+    enough (or when `parallel` forces it). Frames are returned as the workers
+    produced them, keyed in sheet order; nothing is concatenated or copied.
+    Row-range splitting within a sheet is not done: xlsx rows can only be
+    reached by streaming the sheet XML from the start.
+    """
+    if parallel is None:
+        parallel = use_parallel(path, len(sheet_names))
+    if not parallel or len(sheet_names) < 2:
+        if not sheet_names:
+            return {}
+        # one call opens the workbook once for all sheets
+        return pd.read_excel(path, sheet_name=list(sheet_names))
+    try:
+        with using() as pool:
+            futures = {name: pool.submit(parse_sheet, path, name) for name in sheet_names}
+            return dict(zip(futures, gather(futures.values(), pool)))
+    except POOL_ERRORS:
+        # a worker died or the pool was shut down: stay correct serially
+        return pd.read_excel(path, sheet_name=list(sheet_names))
+
+
+def read_pairs(pairs: List[Tuple[str, str]], parallel: Optional[bool] = None) -> Dict[Tuple[str, str], pd.DataFrame]:
+    """
+    Parse (path, sheet) pairs spread over any number of workbooks, one task per
+    pair on the pool when their files are large enough in total.
+    """
+    paths = list(dict.fromkeys(p for p, _ in pairs))
+    if parallel is None:
+        parallel = INGEST_WORKERS > 1 and len(pairs) > 1 and \
+            sum(os.path.getsize(p) for p in paths) >= PARALLEL_MIN_MB * 1024 * 1024
+    if parallel:
+        try:
+            with using() as pool:
+                futures = {pair: pool.submit(parse_sheet, *pair) for pair in pairs}
+                return dict(zip(futures, gather(futures.values(), pool)))
+        except POOL_ERRORS:
+            pass   # read serially below
+    out = {}
+    for path in paths:
+        deadline.check()
+        sheets = [s for p, s in pairs if p == path]
+        for name, df in read_sheets(path, sheets, parallel=False).items():
+            out[(path, name)] = df
+    return out
@@ -0,0 +1,165 @@
+# app/services/profiling.py
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Profiling is opt-in per request, and only honoured when enabled here.
+PROFILING_ENABLED = os.getenv("EXCEL_AI_PROFILING", "0").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("EXCEL_AI_PROFILE_DIR", os.path.join("data", "profiles"))
+DEFAULT_MODE = os.getenv("EXCEL_AI_PROFILE_MODE", "sample")
+TOP_N = int(os.getenv("EXCEL_AI_PROFILE_TOP_N", "20"))
+SAMPLE_INTERVAL = float(os.getenv("EXCEL_AI_PROFILE_INTERVAL", "0.001"))
+
+MODES = ("sample", "cprofile")
+PROFILE_HEADER = "x-profile"
+
+
+def mode_from_value(value: Any) -> Optional[str]:
+    """
+    Map a header/param value to a profiler mode.
+    "1"/"true" -> DEFAULT_MODE, "sample"/"cprofile" -> that mode, anything else -> None.
+    Always None when profiling is disabled in config.
+    """
+    if not PROFILING_ENABLED or value in (None, "", False):
+        return None
+    v = str(value).strip().lower()
+    if v in MODES:
+        return v
+    if v in ("1", "true", "yes", "on"):
+        return DEFAULT_MODE
+    return None
+
+
+def requested_mode(request) -> Optional[str]:
+    """Profiler mode requested by an HTTP request via X-Profile header or ?profile= param."""
+    if not PROFILING_ENABLED:
+        return None
+    return mode_from_value(request.headers.get(PROFILE_HEADER) or request.query_params.get("profile"))
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _Sampler(threading.Thread):
+    """Samples the stack of one thread at a fixed interval and counts folded stacks."""
+
+    def __init__(self, target_ident: int, interval: float):
+        super().__init__(daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            # folded format lists root first
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfiler:
+    """
+    Profile the calling thread for the duration of a `with` block.
+      - mode="sample": wall-clock stack sampling, saved as folded stacks
+        (flamegraph.pl / speedscope compatible)
+      - mode="cprofile": deterministic cProfile, saved as a .prof pstats dump
+        (snakeviz / flameprof compatible)
+    """
+
+    def __init__(self, mode: str = DEFAULT_MODE, top_n: int = TOP_N, interval: float = SAMPLE_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported profile mode: {mode}")
+        self.mode = mode
+        self.top_n = top_n
+        self.interval = interval
+        self.elapsed = 0.0
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_Sampler] = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = _Sampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.elapsed = time.perf_counter() - self._start
+        return False
+
+    def top_functions(self) -> List[Dict[str, Any]]:
+        if self._profile is not None:
+            stats = pstats.Stats(self._profile)
+            rows = []
+            for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+                rows.append({
+                    "function": f"{os.path.basename(filename)}:{line}({func})",
+                    "calls": nc,
+                    "self_s": round(tt, 6),
+                    "cumulative_s": round(ct, 6),
+                })
+            rows.sort(key=lambda r: r["cumulative_s"], reverse=True)
+            return rows[:self.top_n]
+
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        total = sum(self._sampler.stacks.values()) if self._sampler else 0
+        for stack, count in (self._sampler.stacks.items() if self._sampler else []):
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for f in set(frames):
+                inclusive[f] += count
+        rows = [{
+            "function": f,
+            "samples": inclusive[f],
+            "self_samples": own.get(f, 0),
+            "inclusive_pct": round(100.0 * inclusive[f] / total, 1) if total else 0.0,
+        } for f in inclusive]
+        rows.sort(key=lambda r: (r["self_samples"], r["samples"]), reverse=True)
+        return rows[:self.top_n]
+
+    def save(self, label: str) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(PROFILE_DIR, f"{stamp}_{uuid.uuid4().hex[:8]}_{label}")
+        if self._profile is not None:
+            path = base + ".prof"
+            self._profile.dump_stats(path)
+        else:
+            path = base + ".folded"
+            with open(path, "w") as f:
+                for stack, count in self._sampler.stacks.items():
+                    f.write(f"{stack} {count}\n")
+        return path
+
+    def report(self, label: str) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+            "profile_file": self.save(label),
+            "top": self.top_functions(),
+        }
@@ -0,0 +1,171 @@
+# app/services/result_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import pandas as pd
+
+from app.services import metrics
+from app.services.data_engine import sheet_digest
+
+# Structured-operation results keyed by source content, sheet, operation and params.
+RESULT_CACHE_SIZE = int(os.getenv("EXCEL_AI_RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_MB = float(os.getenv("EXCEL_AI_RESULT_CACHE_MB", "256"))
+RESULT_CACHE_TTL = float(os.getenv("EXCEL_AI_RESULT_CACHE_TTL", "3600"))
+
+RESULT_CACHE = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_result_cache_total", "Structured result cache lookups.", ("result",)))
+
+# params naming another workbook (and its sheet) whose content is part of the result
+FILE_PARAMS = (("other_file", "other_sheet"),)
+# params naming another sheet of the same workbook (text_search's join_sheet)
+SHEET_PARAMS = ("join_sheet",)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(file_path: str, sheet_name: Optional[str], operation: str, params: Optional[Dict[str, Any]]) -> str:
+    """
+    Cache key for one structured request. Sources are identified by the
+    content digest of the sheets read, so editing a sheet invalidates its
+    entries without any explicit purge, while results over sheets left
+    unchanged carry over to new versions of the workbook.
+    """
+    params = _normalize(params or {})
+    sources = {"file": sheet_digest(file_path, sheet_name)}
+    for name, sheet_param in FILE_PARAMS:
+        if params.get(name):
+            sources[name] = sheet_digest(params[name], params.get(sheet_param))
+    for name in SHEET_PARAMS:
+        if params.get(name):
+            sources[name] = sheet_digest(file_path, params[name])
+    raw = json.dumps({"sources": sources, "op": operation.lower(), "params": params},
+                     sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _frame_bytes(df: Optional[pd.DataFrame]) -> int:
+    return int(df.memory_usage(deep=True).sum()) if df is not None else 0
+
+
+class _Entry:
+    __slots__ = ("result", "frame", "nbytes", "created")
+
+    def __init__(self, result: Dict[str, Any], frame: Optional[pd.DataFrame]):
+        self.result = result
+        self.frame = frame
+        self.nbytes = _frame_bytes(frame) + len(json.dumps(result, default=str))
+        self.created = time.monotonic()
+
+
+class ResultCache:
+    """
+    LRU of computed results, bounded by entry count, total bytes and age.
+    Each entry keeps the response dict plus the result frame, so a hit can
+    republish the output workbook without recomputing it.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, max_mb: float = RESULT_CACHE_MB,
+                 ttl: float = RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self.nbytes = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self.nbytes -= entry.nbytes
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], Optional[pd.DataFrame]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                RESULT_CACHE.inc(result="miss")
+                return None
+            self._entries.move_to_end(key)
+        RESULT_CACHE.inc(result="hit")
+        return dict(entry.result), entry.frame
+
+    def put(self, key: str, result: Dict[str, Any], frame: Optional[pd.DataFrame] = None):
+        entry = _Entry(dict(result), frame)
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+cache = ResultCache()
+
+
+class DigestLRU:
+    """
+    Small LRU for structures derived from a sheet (samples, sketches, zone
+    maps, indexes), keyed by tuples that start with the sheet digest: a
+    changed source simply gets new keys and its old entries age out.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """The entry for `key`, built (outside the lock) and kept when missing."""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        with self._lock:
+            return list(self._entries.items())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
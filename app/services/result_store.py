@@ -0,0 +1,170 @@
+# app/services/result_store.py
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from app.services import deadline, metrics, scheduler
+
+logger = logging.getLogger(__name__)
+
+# Result frames are answered from memory; their .xlsx is written off the
+# request path and served from /results/{id}.
+#   background: queued for a writer thread as soon as the result exists
+#   lazy:       written on first download
+#   sync:       written before responding (the old behaviour)
+OUTPUT_MODE = os.getenv("EXCEL_AI_OUTPUT_MODE", "background")
+RESULTS_DIR = os.getenv("EXCEL_AI_RESULTS_DIR", os.path.join("data", "results"))
+# results kept; an evicted result's workbook is deleted with it
+RESULTS_KEEP = int(os.getenv("EXCEL_AI_RESULTS_KEEP", "256"))
+
+OUTPUT_WRITES = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_output_writes_total", "Result workbooks written.", ("mode", "outcome")))
+OUTPUT_WRITE_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "excel_ai_output_write_seconds", "Time spent writing result workbooks."))
+
+MODES = ("background", "lazy", "sync")
+PENDING, WRITING, WRITTEN, FAILED = "pending", "writing", "written", "failed"
+
+
+class StoredResult:
+    def __init__(self, result_id: str, frame: pd.DataFrame, path: str):
+        self.id = result_id
+        self.frame = frame
+        self.path = path
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.evicted = False
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"result_id": self.id, "status": self.status, "output_file": self.path,
+                "download": f"/results/{self.id}", "error": self.error}
+
+
+_results: "OrderedDict[str, StoredResult]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def output_path(result_id: str) -> str:
+    return os.path.join(RESULTS_DIR, f"{result_id}.xlsx")
+
+
+def _write(entry: StoredResult, mode: str):
+    with entry.lock:
+        if entry.status == WRITTEN:
+            return
+        if entry.evicted:
+            # its file would be left behind with nothing referring to it
+            entry.status, entry.error = FAILED, f"result {entry.id} was evicted"
+            entry.done.set()
+            return
+        entry.status = WRITING
+        t0 = time.perf_counter()
+        try:
+            os.makedirs(os.path.dirname(entry.path) or ".", exist_ok=True)
+            # write aside and rename, so downloads never see a half-written file
+            tmp = entry.path[:-len(".xlsx")] + ".part.xlsx"
+            with pd.ExcelWriter(tmp, engine="openpyxl", mode="w") as writer:
+                entry.frame.to_excel(writer, sheet_name="Result", index=False)
+            os.replace(tmp, entry.path)
+            entry.status = WRITTEN
+            OUTPUT_WRITES.inc(mode=mode, outcome="ok")
+        except Exception as e:
+            entry.status, entry.error = FAILED, str(e)
+            OUTPUT_WRITES.inc(mode=mode, outcome="error")
+            logger.exception("writing result %s failed", entry.id)
+        finally:
+            OUTPUT_WRITE_SECONDS.observe(time.perf_counter() - t0)
+            entry.done.set()
+
+
+def _remove(entry: StoredResult):
+    # waits for a write in flight; after this no write of the entry starts
+    with entry.lock:
+        with _lock:
+            if entry.id in _results:
+                return   # published again since; the new entry owns the file
+        for path in (entry.path, entry.path[:-len(".xlsx")] + ".part.xlsx"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def publish(frame: pd.DataFrame, result_id: Optional[str] = None, mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Register a result frame and schedule its workbook according to `mode`.
+    Returns the fields merged into the query response. Publishing an id that
+    is already known (e.g. a result cache hit) reuses the existing entry.
+    """
+    mode = mode or OUTPUT_MODE
+    result_id = result_id or uuid.uuid4().hex
+    evicted = []
+    with _lock:
+        entry = _results.get(result_id)
+        if entry is None:
+            entry = StoredResult(result_id, frame, output_path(result_id))
+            if os.path.exists(entry.path):
+                entry.status = WRITTEN
+                entry.done.set()
+            _results[result_id] = entry
+            while len(_results) > RESULTS_KEEP:
+                _, old = _results.popitem(last=False)
+                old.evicted = True
+                evicted.append(old)
+        else:
+            _results.move_to_end(result_id)
+            if entry.status == WRITTEN and not os.path.exists(entry.path):
+                # deleted from disk since; write it again from the frame we still hold
+                entry.status = PENDING
+                entry.done.clear()
+    if evicted:
+        with deadline.scope(None):
+            for old in evicted:
+                # on the writer pool, so removal waits for (or follows) a queued write
+                scheduler.pool("io").submit(_remove, old, admit=False)
+    if entry.status in (PENDING, FAILED):
+        if mode == "sync":
+            with metrics.stage("write"):
+                _write(entry, mode)
+        elif mode == "background" and entry.status == PENDING:
+            # the scheduler's io pool (EXCEL_AI_OUTPUT_WORKERS writers), shared fairly between clients;
+            # the write outlives the request, so it does not carry the request's deadline
+            with deadline.scope(None):
+                scheduler.pool("io").submit(_write, entry, mode, cost=max(len(frame), 1), admit=False)
+    return {"result_id": entry.id, "output_file": entry.path, "output_status": entry.status,
+            "download": f"/results/{entry.id}"}
+
+
+def get(result_id: str) -> Optional[StoredResult]:
+    with _lock:
+        return _results.get(result_id)
+
+
+def materialize(result_id: str, timeout: Optional[float] = None) -> Optional[str]:
+    """Path of the written workbook, writing it now if nobody has yet. None if unknown."""
+    entry = get(result_id)
+    if entry is None:
+        # evicted from memory, but may still be on disk from an earlier write
+        path = output_path(result_id)
+        return path if os.path.exists(path) else None
+    if entry.status != WRITTEN:
+        # lazy results are written here; queued ones are written here too if the queue is slow
+        _write(entry, "lazy")
+    entry.done.wait(timeout)
+    if entry.status != WRITTEN:
+        raise RuntimeError(entry.error or f"result {result_id} is {entry.status}")
+    return entry.path
+
+
+def flush():
+    """Wait for queued background writes (used on shutdown)."""
+    scheduler.pool("io").drain()
@@ -0,0 +1,231 @@
+# app/services/scheduler.py
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from app.services import deadline, metrics
+
+# Request work runs on one of three pools, each with its own queue and
+# threads, so a slow kind of work cannot take the workers of another:
+#   cpu: structured pandas operations (and NL queries the parser answers),
+#        and parsing sheets for /batch, /index and uploads
+#   llm: text_analyze and NL queries that need the model
+#   io:  result workbook writes
+# Within a pool, clients (API key, else address) share the workers by weight:
+# the next job is the one that would finish first in weighted virtual time
+# (weighted fair queuing), so one client's backlog does not delay another's
+# single query. Jobs carry an estimated cost (rows x operation weight); a pool
+# refuses new work once the cost already queued would exceed its budget.
+WORKERS = {
+    "cpu": int(os.getenv("EXCEL_AI_CPU_WORKERS", "4")),
+    "llm": int(os.getenv("EXCEL_AI_LLM_WORKERS", os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))),
+    "io": int(os.getenv("EXCEL_AI_OUTPUT_WORKERS", "1")),
+}
+QUEUE_BUDGET = {
+    "cpu": float(os.getenv("EXCEL_AI_CPU_QUEUE_COST", "50000000")),
+    "llm": float(os.getenv("EXCEL_AI_LLM_QUEUE_COST", "5000000")),
+    "io": float("inf"),   # writes of results already computed are never refused
+}
+# e.g. "team-a=4,batch-bot=1"; unlisted clients weigh 1
+CLIENT_WEIGHTS = {k.strip(): float(v) for k, _, v in
+                  (item.partition("=") for item in os.getenv("EXCEL_AI_CLIENT_WEIGHTS", "").split(",") if "=" in item)}
+
+# cost per row, relative to a filter; text_analyze makes an LLM call per row
+OP_COST = {"describe": 0, "read": 1, "filter": 1, "aggregate": 1, "math": 1, "date_extract": 1, "date_diff": 1,
+           "text_search": 1, "unpivot": 2, "pivot": 2, "join": 3, "text_analyze": 1000}
+# one model call, in rows of cheap work
+LLM_CALL_COST = float(os.getenv("EXCEL_AI_LLM_CALL_COST", "100000"))
+UNKNOWN_ROWS = 100000
+
+SCHED_QUEUED = metrics.REGISTRY.register(metrics.Gauge(
+    "excel_ai_sched_queue_depth", "Jobs waiting for a worker.", ("pool",)))
+SCHED_RUNNING = metrics.REGISTRY.register(metrics.Gauge(
+    "excel_ai_sched_running", "Jobs running on a worker.", ("pool",)))
+SCHED_JOBS = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_sched_jobs_total", "Jobs submitted, by admission outcome.", ("pool", "outcome")))
+SCHED_WAIT = metrics.REGISTRY.register(metrics.Histogram(
+    "excel_ai_sched_wait_seconds", "Time jobs spent queued before a worker took them.", ("pool",)))
+
+_client: contextvars.ContextVar = contextvars.ContextVar("excel_ai_client", default="anonymous")
+
+
+class Overloaded(RuntimeError):
+    """The pool's queued cost is at its budget; the caller should retry later."""
+
+    def __init__(self, pool: str, retry_after: float):
+        super().__init__(f"the {pool} queue is full, retry in {retry_after:.0f}s")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+def estimate(operation: str, rows: Optional[int], llm: bool = False) -> float:
+    """Estimated cost of an operation over `rows` rows (plus one model call when `llm`)."""
+    rows = UNKNOWN_ROWS if rows is None else rows
+    return max(rows * OP_COST.get(operation, 1), 1) + (LLM_CALL_COST if llm else 0)
+
+
+def current_client() -> str:
+    return _client.get()
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "ctx", "client", "cost", "future", "queued", "start", "finish")
+
+    def __init__(self, fn, args, kwargs, ctx, client, cost):
+        self.fn, self.args, self.kwargs, self.ctx = fn, args, kwargs, ctx
+        self.client, self.cost = client, cost
+        self.future: Future = Future()
+        self.queued = time.perf_counter()
+
+
+class Pool:
+    def __init__(self, name: str, workers: int, budget: float = float("inf")):
+        self.name = name
+        self.workers = max(int(workers), 1)
+        self.budget = budget
+        self._queues: Dict[str, deque] = {}
+        self._finish: Dict[str, float] = {}   # virtual finish time of each client's last queued job
+        self._clock = 0.0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+        self.queued = 0
+        self.queued_cost = 0.0
+        self.running = 0
+        self._run_seconds = 0.0
+        self._done = 0
+
+    def submit(self, fn: Callable, *args, client: Optional[str] = None, cost: float = 1.0,
+               admit: bool = True, **kwargs) -> Future:
+        """
+        Queue fn(*args, **kwargs) to run in a copy of the caller's context.
+        Raises Overloaded when `admit` and the queued cost would exceed the budget
+        (an idle queue always takes the job, however large).
+        """
+        client = client or _client.get()
+        ctx = contextvars.copy_context()
+        job = _Job(fn, args, kwargs, ctx, client, float(cost))
+        with self._cond:
+            if admit and self.queued and self.queued_cost + job.cost > self.budget:
+                SCHED_JOBS.inc(pool=self.name, outcome="rejected")
+                raise Overloaded(self.name, self._retry_after())
+            # virtual start/finish: after the client's previous job, never before "now"
+            job.start = max(self._clock, self._finish.get(client, 0.0))
+            job.finish = self._finish[client] = job.start + job.cost / self._weight(client)
+            self._queues.setdefault(client, deque()).append(job)
+            self.queued += 1
+            self.queued_cost += job.cost
+            SCHED_JOBS.inc(pool=self.name, outcome="admitted")
+            SCHED_QUEUED.set(self.queued, pool=self.name)
+            if len(self._threads) < self.workers and self.running + self.queued > len(self._threads):
+                t = threading.Thread(target=self._work, name=f"excel-ai-{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+        return job.future
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """submit() and wait for the result."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """submit() and await the result without holding the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _retry_after(self) -> float:
+        # queued jobs drained at the recent average job time
+        per_job = self._run_seconds / self._done if self._done else 1.0
+        return max(1.0, per_job * self.queued / self.workers)
+
+    def _weight(self, client: str) -> float:
+        return max(CLIENT_WEIGHTS.get(client, 1.0), 1e-6)
+
+    def _next(self) -> _Job:
+        best = min(self._queues, key=lambda c: self._queues[c][0].finish)
+        queue = self._queues[best]
+        job = queue.popleft()
+        if not queue:
+            del self._queues[best]
+        self._clock = max(self._clock, job.start)
+        if not self._queues:
+            # idle: nobody carries credit or debt into the next busy period
+            self._finish.clear()
+            self._clock = 0.0
+        self.queued -= 1
+        self.queued_cost -= job.cost
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self.queued and not self._closed:
+                    self._cond.wait()
+                if not self.queued:
+                    return
+                job = self._next()
+                self.running += 1
+                SCHED_QUEUED.set(self.queued, pool=self.name)
+                SCHED_RUNNING.set(self.running, pool=self.name)
+            SCHED_WAIT.observe(time.perf_counter() - job.queued, pool=self.name)
+            t0 = time.perf_counter()
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.ctx.run(self._call, job))
+                    except BaseException as e:
+                        job.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self.running -= 1
+                    self._run_seconds = self._run_seconds * 0.9 + (time.perf_counter() - t0)
+                    self._done = self._done * 0.9 + 1
+                    SCHED_RUNNING.set(self.running, pool=self.name)
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _call(job: _Job):
+        # a job whose request was abandoned or timed out while it queued never starts
+        deadline.check()
+        _client.set(job.client)
+        return job.fn(*job.args, **job.kwargs)
+
+    def drain(self):
+        """Run what is queued, then stop the workers (used on shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        for t in threads:
+            t.join()
+        with self._cond:
+            self._threads.clear()
+            self._closed = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"workers": self.workers, "queued": self.queued, "queued_cost": self.queued_cost,
+                    "running": self.running, "clients": {c: len(q) for c, q in self._queues.items()}}
+
+
+_pools: Dict[str, Pool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool(name: str) -> Pool:
+    with _pools_lock:
+        p = _pools.get(name)
+        if p is None:
+            p = _pools[name] = Pool(name, WORKERS[name], QUEUE_BUDGET[name])
+        return p
+
+
+def shutdown():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for p in pools:
+        p.drain()
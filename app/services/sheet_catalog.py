@@ -0,0 +1,239 @@
+# app/services/sheet_catalog.py
+import os
+import re
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Per-sheet metadata recorded whenever a sheet is parsed, so later requests
+# can decide things (e.g. whether a file can match a range) without opening it.
+#   <CATALOG_DIR>/files.json       path -> mtime_ns, size, {sheet: digest}
+#   <CATALOG_DIR>/<digest>.json    column stats of one sheet's content
+CATALOG_DIR = os.getenv("EXCEL_AI_CATALOG_DIR", os.path.join("data", "catalog"))
+FILES_INDEX = "files.json"
+# bumped when the stats layout changes; older records are recomputed
+CATALOG_VERSION = 2
+TOP_VALUES = int(os.getenv("EXCEL_AI_CATALOG_TOP_VALUES", "5"))
+# above this many rows distinct counts come from a HyperLogLog sketch
+EXACT_DISTINCT_ROWS = 100_000
+CATEGORY_MAX = 20
+
+MONEY_NAMES = re.compile(r"price|amount|revenue|sales|cost|salary|total|income|profit|fee|pay|spend|budget|usd|eur|gbp|\$", re.I)
+ID_NAMES = re.compile(r"(^|[_\s])(id|key|code|no|number|uuid)$|^id[_\s]", re.I)
+
+_lock = threading.Lock()
+_files: Optional[Dict[str, Dict[str, Any]]] = None
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _files_path() -> str:
+    return os.path.join(CATALOG_DIR, FILES_INDEX)
+
+
+def _load_files() -> Dict[str, Dict[str, Any]]:
+    global _files
+    if _files is None:
+        try:
+            with open(_files_path()) as f:
+                _files = json.load(f)
+        except (OSError, ValueError):
+            _files = {}
+    return _files
+
+
+def _dump(path: str, data: Any):
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+
+def _kind(s: pd.Series) -> Optional[str]:
+    if pd.api.types.is_bool_dtype(s):
+        return None
+    if pd.api.types.is_numeric_dtype(s):
+        return "number"
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return "datetime"
+    if pd.api.types.is_string_dtype(s) or s.dtype == object:
+        return "string"
+    return None
+
+
+def _scalar(v: Any, kind: str) -> Any:
+    if v is None or pd.isna(v):
+        return None
+    if kind == "datetime":
+        return pd.Timestamp(v).isoformat()
+    if kind == "number":
+        return v.item() if hasattr(v, "item") else v
+    return str(v)
+
+
+def _distinct(s: pd.Series) -> Tuple[int, bool]:
+    if len(s) <= EXACT_DISTINCT_ROWS:
+        return int(s.nunique()), False
+    from app.services.approx import distinct_estimate
+    return distinct_estimate(s), True
+
+
+def _looks_like_dates(s: pd.Series) -> bool:
+    sample = s.dropna().astype(str).head(50)
+    if sample.empty or pd.to_numeric(sample, errors="coerce").notna().mean() >= 0.5:
+        return False
+    return pd.to_datetime(sample, errors="coerce", format="mixed").notna().mean() >= 0.9
+
+
+def _semantic(name: str, s: pd.Series, kind: Optional[str], distinct: int, present: int) -> str:
+    """date, boolean, money, id, category, number or text."""
+    if kind == "datetime":
+        return "date"
+    if pd.api.types.is_bool_dtype(s):
+        return "boolean"
+    unique = present > 0 and distinct >= 0.95 * present
+    if kind == "number":
+        if MONEY_NAMES.search(name):
+            return "money"
+        if pd.api.types.is_integer_dtype(s) and (ID_NAMES.search(name) or (unique and present > CATEGORY_MAX)):
+            return "id"
+        return "number"
+    if kind == "string":
+        if ID_NAMES.search(name) and unique:
+            return "id"
+        if _looks_like_dates(s):
+            return "date"
+        if distinct <= max(CATEGORY_MAX, 0.05 * present) and not unique:
+            return "category"
+    return "text"
+
+
+def column_stats(df: pd.DataFrame) -> Dict[str, Any]:
+    """Per-column dtype, nulls, distinct count, min/max, top values and semantic type."""
+    cols = {}
+    for name in df.columns:
+        s = df[name]
+        nulls = int(s.isna().sum())
+        distinct, estimated = _distinct(s)
+        entry: Dict[str, Any] = {"dtype": str(s.dtype), "nulls": nulls, "distinct": distinct}
+        if estimated:
+            entry["distinct_estimated"] = True
+        kind = _kind(s)
+        if kind:
+            try:
+                lo, hi = s.min(), s.max()
+            except TypeError:
+                # mixed types in an object column have no order
+                lo = hi = None
+            entry.update(kind=kind, min=_scalar(lo, kind), max=_scalar(hi, kind))
+        semantic = _semantic(str(name), s, kind, distinct, len(s) - nulls)
+        entry["semantic"] = semantic
+        if semantic in ("category", "boolean"):
+            entry["top"] = [[_scalar(v, kind or "string"), int(c)] for v, c in s.value_counts().head(TOP_VALUES).items()]
+        cols[str(name)] = entry
+    return {"version": CATALOG_VERSION, "rows": int(len(df)), "columns": cols}
+
+
+def record_stats(digest: str, df: pd.DataFrame):
+    """Store column stats for a freshly parsed sheet, keyed by its content digest."""
+    stats = column_stats(df)
+    with _lock:
+        _stats[digest] = stats
+        _dump(os.path.join(CATALOG_DIR, f"{digest}.json"), stats)
+
+
+def register_file(path: str, digests: Dict[str, str]):
+    """Remember which sheet digests `path` holds at its current mtime/size."""
+    st = os.stat(path)
+    with _lock:
+        files = _load_files()
+        entry = files.get(path)
+        if entry is not None and (entry["mtime_ns"], entry["size"]) == (st.st_mtime_ns, st.st_size):
+            return
+        files[path] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sheets": dict(digests)}
+        _dump(_files_path(), files)
+
+
+def stats_for(digest: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        stats = _stats.get(digest)
+    if stats is None:
+        try:
+            with open(os.path.join(CATALOG_DIR, f"{digest}.json")) as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stats.get("version") != CATALOG_VERSION:
+            return None
+        with _lock:
+            _stats[digest] = stats
+    return stats
+
+
+def _short(v: Any) -> str:
+    text = f"{v:.6g}" if isinstance(v, float) else str(v)
+    if text.endswith("T00:00:00"):
+        text = text[:-9]
+    return text if len(text) <= 24 else text[:21] + "..."
+
+
+def prompt_schema(stats: Dict[str, Any]) -> str:
+    """One compact line per column for LLM prompts, e.g. `Region: category [N, S, E] 3 distinct`."""
+    lines = []
+    rows = stats.get("rows") or 0
+    for name, col in stats["columns"].items():
+        parts = [f"{name}: {col.get('semantic', col['dtype'])}"]
+        if col.get("top"):
+            parts.append("[" + ", ".join(_short(v) for v, _ in col["top"]) + "]")
+        elif col.get("min") is not None and col.get("semantic") not in ("id", "text"):
+            parts.append(f"{_short(col['min'])}..{_short(col['max'])}")
+        parts.append(f"{col['distinct']} distinct")
+        if rows and col.get("nulls"):
+            parts.append(f"{100 * col['nulls'] / rows:.0f}% empty")
+        lines.append(" ".join(parts))
+    return "\n".join(lines)
+
+
+def planner_dtypes(stats: Dict[str, Any]) -> Dict[str, str]:
+    """dtypes for the rule-based planner; text columns holding dates are reported as datetimes."""
+    return {name: "datetime64[ns]" if col.get("semantic") == "date" else col["dtype"]
+            for name, col in stats["columns"].items()}
+
+
+def planner_values(stats: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """Top values of category columns, so the rule-based planner recognises them in queries."""
+    return {name: [v for v, _ in col["top"]] for name, col in stats["columns"].items() if col.get("top")}
+
+
+def file_sheets(path: str) -> Optional[Dict[str, str]]:
+    """Sheet name -> digest recorded for `path`, if the file is unchanged since (no file is opened)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _lock:
+        entry = _load_files().get(path)
+    if entry is None or (entry["mtime_ns"], entry["size"]) != (st.st_mtime_ns, st.st_size):
+        return None
+    return dict(entry["sheets"])
+
+
+def may_overlap(stats: Optional[Dict[str, Any]], column: str, lo: Any = None, hi: Any = None) -> bool:
+    """False only when recorded min/max prove no value of `column` lies in [lo, hi]."""
+    col = (stats or {}).get("columns", {}).get(column)
+    if not col or col.get("min") is None or col.get("max") is None:
+        return True
+    conv = {"number": float, "datetime": pd.Timestamp, "string": str}.get(col.get("kind"))
+    if conv is None:
+        return True
+    try:
+        cmin, cmax = conv(col["min"]), conv(col["max"])
+        if lo is not None and cmax < conv(lo):
+            return False
+        if hi is not None and cmin > conv(hi):
+            return False
+    except (TypeError, ValueError):
+        return True
+    return True
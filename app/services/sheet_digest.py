@@ -0,0 +1,82 @@
+# app/services/sheet_digest.py
+import re
+import hashlib
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from typing import Dict
+
+# Per-sheet content digests for .xlsx workbooks, computed from the zip parts
+# without parsing cells. Two sheets with the same digest parse to the same
+# DataFrame, whichever workbook (or workbook version) they live in.
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# shared-string cell: <c r="A1" t="s"><v>12</v></c>
+_SST_REF = re.compile(rb'<c\b[^>]*\bt="s"[^>]*>\s*<v>(\d+)</v>')
+_SST_CELL = re.compile(rb'\bt="s"')
+_SI_END = re.compile(rb"</si>")
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _sheet_parts(zf: zipfile.ZipFile) -> Dict[str, str]:
+    """Sheet name -> zip member of its worksheet XML, in workbook order."""
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels.iter(f"{_NS_PKG}Relationship"):
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    return {s.get("name"): targets[s.get(f"{_NS_REL}id")] for s in wb.iter(f"{_NS_MAIN}sheet")}
+
+
+def _sst_prefix_digest(sst: bytes, sheet_xml: bytes) -> str:
+    """
+    Digest of the shared strings a sheet can reference: entries 0..max index.
+    Strings appended for other sheets then leave this sheet's digest alone.
+    """
+    refs = _SST_REF.findall(sheet_xml)
+    if len(refs) != len(_SST_CELL.findall(sheet_xml)):
+        # unusual cell layout; depend on the whole table to stay safe
+        return _sha(sst)
+    if not refs:
+        return ""
+    last = max(int(r) for r in refs)
+    end = None
+    for i, m in enumerate(_SI_END.finditer(sst)):
+        if i == last:
+            end = m.end()
+            break
+    return _sha(sst if end is None else sst[:end])
+
+
+def xlsx_sheet_digests(path: str) -> Dict[str, str]:
+    """
+    Sheet name -> digest of everything that determines its parsed values:
+    the worksheet XML, the shared-string prefix it references, styles
+    (number formats decide dates) and the workbook's 1900/1904 date system.
+    """
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        sst = zf.read("xl/sharedStrings.xml") if "xl/sharedStrings.xml" in names else b""
+        styles = _sha(zf.read("xl/styles.xml")) if "xl/styles.xml" in names else ""
+        wb = zf.read("xl/workbook.xml")
+        date1904 = b'date1904="1"' in wb or b'date1904="true"' in wb
+        digests = {}
+        for sheet, part in _sheet_parts(zf).items():
+            xml = zf.read(part)
+            h = hashlib.sha256(xml)
+            h.update(_sst_prefix_digest(sst, xml).encode())
+            h.update(styles.encode())
+            h.update(b"1904" if date1904 else b"1900")
+            digests[sheet] = h.hexdigest()
+    return digests
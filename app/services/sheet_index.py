@@ -0,0 +1,171 @@
+# app/services/sheet_index.py
+import os
+import ast
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services import metrics, zone_maps
+from app.services.result_cache import DigestLRU
+
+# Secondary indexes over cached sheets, one per (sheet digest, column). A
+# sorted index answers ==, in [...] and ranges by binary search; columns whose
+# values cannot be ordered get a hash index (== and in only). Indexes are built on request, or once a column
+# has appeared in INDEX_AUTO_AFTER filters on the same sheet. Lookups only
+# pick candidate rows: the full condition is still applied to them.
+INDEX_MIN_ROWS = int(os.getenv("EXCEL_AI_INDEX_MIN_ROWS", "20000"))
+INDEX_AUTO_AFTER = int(os.getenv("EXCEL_AI_INDEX_AUTO_AFTER", "3"))
+INDEX_MAX = int(os.getenv("EXCEL_AI_INDEX_MAX", "32"))
+
+INDEX_LOOKUPS = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_index_lookups_total", "Filters by how their rows were found.", ("result",)))
+
+
+class SortedIndex:
+    kind = "sorted"
+
+    def __init__(self, s: pd.Series):
+        present = s.notna().to_numpy()
+        self.rows = len(s)
+        self.datetime = pd.api.types.is_datetime64_any_dtype(s)
+        values = s[present].to_numpy()
+        if self.datetime:
+            values = s[present].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        order = np.argsort(values, kind="stable")
+        self.values = values[order]
+        self.positions = np.flatnonzero(present)[order]
+
+    def _key(self, v: Any) -> Any:
+        # keys of another kind than the column are left to df.query to compare
+        if self.datetime:
+            if not isinstance(v, (str, pd.Timestamp, np.datetime64)):
+                raise TypeError(f"not a date: {v!r}")
+            return pd.Timestamp(v).as_unit("ns").value
+        if self.values.dtype.kind in "iufb" and not isinstance(v, (int, float, np.number)):
+            raise TypeError(f"not a number: {v!r}")
+        if self.values.dtype.kind == "O" and not isinstance(v, str):
+            raise TypeError(f"not a string: {v!r}")
+        return v
+
+    def equal(self, values: List[Any]) -> np.ndarray:
+        keys = [self._key(v) for v in values]
+        lo = np.searchsorted(self.values, keys, side="left")
+        hi = np.searchsorted(self.values, keys, side="right")
+        return np.concatenate([self.positions[a:b] for a, b in zip(lo, hi)] or [np.array([], dtype=np.int64)])
+
+    def between(self, lo: Any, lo_inc: bool, hi: Any, hi_inc: bool) -> np.ndarray:
+        a = 0 if lo is None else np.searchsorted(self.values, self._key(lo), side="left" if lo_inc else "right")
+        b = len(self.values) if hi is None else np.searchsorted(self.values, self._key(hi), side="right" if hi_inc else "left")
+        return self.positions[a:max(a, b)]
+
+
+class HashIndex:
+    kind = "hash"
+
+    def __init__(self, s: pd.Series):
+        self.rows = len(s)
+        self.groups = s.groupby(s, sort=False).indices
+
+    def equal(self, values: List[Any]) -> np.ndarray:
+        return np.concatenate([self.groups.get(v, np.array([], dtype=np.int64)) for v in values]
+                              or [np.array([], dtype=np.int64)])
+
+    def between(self, lo, lo_inc, hi, hi_inc):
+        raise TypeError("hash indexes answer equality only")
+
+
+_indexes = DigestLRU(INDEX_MAX)
+# (digest, column) -> filters seen without an index; bounded too, so counts of
+# replaced sheet versions age out like their indexes
+_usage = DigestLRU(INDEX_MAX * 4)
+_lock = threading.Lock()
+
+
+def clear():
+    _indexes.clear()
+    _usage.clear()
+
+
+def build(df: pd.DataFrame, digest: str, column: str):
+    """Index `column` of the sheet with this digest (no-op when it already is)."""
+    return _indexes.get_or_build((digest, column), lambda: _build(df[column]))
+
+
+def _build(s: pd.Series):
+    try:
+        return SortedIndex(s)
+    except TypeError:
+        # values of mixed types have no order
+        return HashIndex(s)
+
+
+def indexed(digest: str) -> Dict[str, str]:
+    return {col: idx.kind for (d, col), idx in _indexes.items() if d == digest}
+
+
+def in_lists(condition: str) -> Dict[str, List[Any]]:
+    """column -> values for the AND-ed `col in [...]` / `col == x` terms of a condition."""
+    terms, names = zone_maps.conjuncts(condition)
+    out = {}
+    for node in terms:
+        if not (isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.left, ast.Name)):
+            continue
+        try:
+            value = ast.literal_eval(node.comparators[0])
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            continue
+        if isinstance(node.ops[0], ast.In) and isinstance(value, (list, tuple, set)):
+            values = list(value)
+        elif isinstance(node.ops[0], ast.Eq) and not isinstance(value, (list, tuple, set, dict)):
+            values = [value]
+        else:
+            continue
+        # isin matches missing values for None/NaN; indexes leave them out
+        if any(v is None or (isinstance(v, float) and np.isnan(v)) for v in values):
+            continue
+        out[names.get(node.left.id, node.left.id)] = values
+    return out
+
+
+def _candidates(df: pd.DataFrame, condition: str, digest: str) -> Optional[np.ndarray]:
+    lists = in_lists(condition)
+    ranges = {c: r for c, r in zone_maps.ranges_of(condition).items() if c not in lists}
+    best = None
+    for col in [c for c in list(lists) + list(ranges) if c in df.columns]:
+        key = (digest, col)
+        idx = _indexes.get(key)
+        if idx is None:
+            with _lock:
+                seen = (_usage.get(key) or 0) + 1
+                _usage.put(key, seen)
+            auto = seen >= INDEX_AUTO_AFTER
+        if idx is None and auto:
+            idx = build(df, digest, col)
+        if idx is None or idx.rows != len(df):
+            continue
+        try:
+            rows = idx.equal(lists[col]) if col in lists else idx.between(*ranges[col])
+        except (TypeError, ValueError):
+            # literal of another type than the column (e.g. a string for a number)
+            continue
+        if best is None or len(rows) < len(best):
+            best = rows
+    return best
+
+
+def query(df: pd.DataFrame, condition: str, digest: Optional[str] = None) -> pd.DataFrame:
+    """
+    df.query(condition) answered from an index when one covers a term of the
+    condition; otherwise through the zone maps (which fall back to a scan).
+    """
+    whole = isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1
+    if not digest or len(df) < INDEX_MIN_ROWS or not whole:
+        return zone_maps.query(df, condition, digest)
+    rows = _candidates(df, condition, digest)
+    if rows is None:
+        INDEX_LOOKUPS.inc(result="scan")
+        return zone_maps.query(df, condition, digest)
+    INDEX_LOOKUPS.inc(result="index")
+    return df.take(np.sort(rows)).query(condition)
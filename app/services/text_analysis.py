@@ -1,7 +1,8 @@
 # Placeholder text analysis utilities. Install textblob for basic sentiment.
-from textblob import TextBlob
 
 def sentiment(text: str) -> dict:
+    # imported lazily: textblob (and nltk) are slow to import
+    from textblob import TextBlob
     t = TextBlob(str(text))
     return {'polarity': t.sentiment.polarity, 'subjectivity': t.sentiment.subjectivity}
 
@@ -0,0 +1,169 @@
+# app/services/text_index.py
+import os
+import re
+import math
+from itertools import chain
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services import metrics
+from app.services.result_cache import DigestLRU
+
+# Inverted indexes over free-text columns, built once per (sheet digest,
+# column). Text is lower-cased and split into word tokens; each token keeps
+# its (row, position) postings, sorted by row, so a term is one slice and a
+# phrase is a positional intersection. Hyphenated words ("over-budget") are
+# searched as phrases of their parts.
+TEXT_INDEX_MAX = int(os.getenv("EXCEL_AI_TEXT_INDEX_MAX", "16"))
+
+TEXT_SEARCHES = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_text_searches_total", "text_search requests by index reuse.", ("index",)))
+
+TOKEN = re.compile(r"\w+")
+# positions are packed with the row into one int64 key
+_POS_BITS = 20
+
+
+def _runs(sorted_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct values of a sorted array and how often each occurs (np.unique without the sort)."""
+    if not len(sorted_values):
+        return sorted_values, np.array([], dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    return sorted_values[starts], np.diff(np.r_[starts, len(sorted_values)])
+
+
+def _within(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """Mask of `values` present in `sorted_values`."""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    at = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[at] == values
+
+
+class TextIndex:
+    def __init__(self, s: pd.Series):
+        self.rows = len(s)
+        # cells repeat a lot in practice (comment templates, tags): tokenize each distinct text once
+        text_ids, texts = pd.factorize(s.fillna("").astype(str), sort=False)
+        tokens = [TOKEN.findall(t.lower()) for t in texts]
+        lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+        codes, vocab = pd.factorize(pd.Series(list(chain.from_iterable(tokens)), dtype=object))
+        text_of = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        pos = np.arange(len(text_of), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        pos = np.minimum(pos, (1 << _POS_BITS) - 1)
+
+        # expand each (text, position) token to every row holding that text
+        by_text = np.argsort(text_ids, kind="stable")
+        counts = np.bincount(text_ids[text_ids >= 0], minlength=len(texts))
+        first = np.cumsum(counts) - counts
+        per_token = counts[text_of]
+        total = int(per_token.sum())
+        gather = np.repeat(first[text_of] - (np.cumsum(per_token) - per_token), per_token) + np.arange(total)
+        rows = by_text[gather]
+        keys = (rows << _POS_BITS) | np.repeat(pos, per_token)
+        terms = np.repeat(codes, per_token)
+
+        # postings grouped by term, ascending (row, position) within each term
+        order = np.argsort(keys, kind="stable")
+        order = order[np.argsort(terms[order], kind="stable")]
+        self.keys = keys[order]
+        self.offsets = np.searchsorted(terms[order], np.arange(len(vocab) + 1))
+        self.vocab = {t: i for i, t in enumerate(vocab)}
+
+    def _postings(self, term: str) -> np.ndarray:
+        i = self.vocab.get(term)
+        if i is None:
+            return np.array([], dtype=np.int64)
+        return self.keys[self.offsets[i]:self.offsets[i + 1]]
+
+    def match(self, words: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, occurrences) of the consecutive words, rows ascending."""
+        keys = self._postings(words[0])
+        for k, word in enumerate(words[1:], start=1):
+            keys = keys[_within(keys + k, self._postings(word))]
+        return _runs(keys >> _POS_BITS)
+
+
+_indexes = DigestLRU(TEXT_INDEX_MAX)
+
+
+def clear():
+    _indexes.clear()
+
+
+def index_for(df: pd.DataFrame, column: str, digest: Optional[str] = None) -> TextIndex:
+    """The index of `column`, reused across requests for the sheet with this digest."""
+    key = (digest, column)
+    idx = _indexes.get(key) if digest else None
+    if idx is not None and idx.rows == len(df):
+        TEXT_SEARCHES.inc(index="hit")
+        return idx
+    TEXT_SEARCHES.inc(index="built")
+    idx = TextIndex(df[column])
+    if digest:
+        _indexes.put(key, idx)
+    return idx
+
+
+def parse(query: str) -> List[List[List[str]]]:
+    """
+    OR-groups of AND-ed clauses, each clause a list of consecutive words:
+    `late "over budget" OR delayed` -> [[["late"], ["over", "budget"]], [["delayed"]]].
+    Terms are AND-ed by default; OR (or |) separates alternatives.
+    """
+    groups, clauses = [], []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if word in ("OR", "|"):
+            groups.append(clauses)
+            clauses = []
+            continue
+        if word in ("AND", "&"):
+            continue
+        words = TOKEN.findall((phrase or word).lower())
+        if words:
+            clauses.append(words)
+    groups.append(clauses)
+    return [g for g in groups if g]
+
+
+def search(df: pd.DataFrame, columns, query: str, digest: Optional[str] = None) -> pd.DataFrame:
+    """
+    Rows of df matching `query` in any of the text `columns`, best first, with
+    a `search_score` column: the summed tf-idf of the matched clauses.
+    """
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"text columns not found: {missing}")
+    groups = parse(query)
+    if not groups:
+        raise ValueError("text_search query has no terms")
+    n = max(len(df), 1)
+    scores = np.zeros(len(df))
+    hit = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        idx = index_for(df, col, digest)
+        for clauses in groups:
+            rows, score = None, None
+            for words in clauses:
+                r, tf = idx.match(words)
+                weighted = tf * math.log(1 + n / max(len(r), 1))
+                if rows is None:
+                    rows, score = r, weighted
+                    continue
+                # both row lists are ascending, so the rows kept on each side line up
+                seen = np.zeros(len(df), dtype=bool)
+                seen[r] = True
+                keep = seen[rows]
+                seen[:] = False
+                seen[rows] = True
+                rows, score = rows[keep], score[keep] + weighted[seen[r]]
+            hit[rows] = True
+            scores[rows] += score
+    order = np.flatnonzero(hit)
+    order = order[np.argsort(-scores[order], kind="stable")]
+    out = df.take(order).copy()
+    out["search_score"] = np.round(scores[order], 4)
+    return out
@@ -0,0 +1,117 @@
+# app/services/topk.py
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# order_by + limit without sorting everything: the primary sort key is reduced
+# to a float rank, np.partition finds the limit-th value in linear time, and
+# only rows up to it (ties included) are sorted. Results match
+# sort_values(kind="stable", na_position="last").head(limit) exactly.
+
+Order = List[Tuple[str, bool]]
+
+
+def parse_order(order_by: Any) -> Order:
+    """
+    [(column, ascending)] from "col", "-col", "col desc", {"column": "col", "desc": true}
+    or a list of those.
+    """
+    if order_by is None or order_by == "" or order_by == []:
+        return []
+    items = order_by if isinstance(order_by, list) else [order_by]
+    order = []
+    for item in items:
+        if isinstance(item, dict):
+            col = item.get("column") or item.get("col")
+            if not col:
+                raise ValueError(f"order_by entry needs a column: {item}")
+            desc = bool(item.get("desc")) or str(item.get("direction", "")).lower() == "desc"
+            order.append((col, not desc))
+            continue
+        text = str(item).strip()
+        if text.startswith("-"):
+            order.append((text[1:], False))
+            continue
+        head, _, tail = text.rpartition(" ")
+        if head and tail.lower() in ("asc", "desc"):
+            order.append((head.strip(), tail.lower() == "asc"))
+        else:
+            order.append((text, True))
+    return order
+
+
+def _rank(s: pd.Series, ascending: bool) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        v = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        codes, _ = pd.factorize(s, sort=True)
+        v = codes.astype(np.float64)
+        v[codes < 0] = np.nan
+    if not ascending:
+        v = -v
+    # missing values sort last in either direction
+    return np.where(np.isnan(v), np.inf, v)
+
+
+def _sort(df: pd.DataFrame, order: Order) -> pd.DataFrame:
+    return df.sort_values([c for c, _ in order], ascending=[a for _, a in order], kind="stable", na_position="last")
+
+
+def top(df: pd.DataFrame, order_by: Any = None, limit: Optional[int] = None) -> pd.DataFrame:
+    """df ordered by `order_by` and cut to `limit` rows; with a limit, only candidate rows are sorted."""
+    order = parse_order(order_by)
+    limit = None if limit is None else int(limit)
+    if limit is not None and limit < 0:
+        raise ValueError("limit must be >= 0")
+    missing = [c for c, _ in order if c not in df.columns]
+    if missing:
+        raise ValueError(f"order_by columns not found: {missing}")
+    if not order:
+        return df if limit is None else df.head(limit)
+    if limit is None or limit >= len(df):
+        return _sort(df, order).head(limit) if limit is not None else _sort(df, order)
+    if limit == 0:
+        return df.iloc[:0]
+    try:
+        rank = _rank(df[order[0][0]], order[0][1])
+    except TypeError:
+        # values that cannot be ordered against each other: let pandas report it
+        return _sort(df, order).head(limit)
+    kth = np.partition(rank, limit - 1)[limit - 1]
+    return _sort(df[rank <= kth], order).head(limit)
+
+
+def top_keys(df: pd.DataFrame, order_by: Any, group_by: Any, limit: Optional[int],
+             condition: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Push a limit below a group-by: when the first order_by column is a group
+    key, the first `limit` groups can only come from rows whose key is among
+    the `limit` first distinct values, so the rest need not be aggregated.
+    `condition` filters rows first. None when that does not apply.
+    """
+    order = parse_order(order_by)
+    keys = [group_by] if isinstance(group_by, str) else list(group_by or [])
+    if limit is None or not order or order[0][0] not in keys:
+        return None
+    col, ascending = order[0]
+    if condition:
+        df = df.query(condition)
+    values = df[col].drop_duplicates()
+    if int(limit) >= len(values):
+        return None
+    chosen = top(values.to_frame(), {"column": col, "desc": not ascending}, limit)[col]
+    return df[df[col].isin(chosen)]
+
+
+def top_mapping(result: dict, keys: List[str], value_name: str, order_by: Any, limit: Optional[int]) -> dict:
+    """order_by/limit over a {group: value} aggregate result; order by a key name, the value name or "value"."""
+    if not result:
+        return result
+    order = [{"column": value_name if c == "value" else c, "desc": not a} for c, a in parse_order(order_by)]
+    s = pd.Series(result)
+    s.index.names = keys
+    ordered = top(s.rename(value_name).reset_index(), order, limit)
+    if len(keys) == 1:
+        return dict(zip(ordered[keys[0]], ordered[value_name]))
+    return dict(zip(ordered[keys].itertuples(index=False, name=None), ordered[value_name]))
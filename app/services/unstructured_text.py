@@ -1,10 +1,8 @@
 # app/services/unstructured_text.py
-import requests
 import pandas as pd
 import os, json
-
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL = "llama3"
+from app.llm_agent.client import get_client
+from app.services import deadline
 
 def sentiment_simple(text: str) -> str:
     pos = ["good","great","excellent","happy","love","satisfied","positive","awesome","recommend"]
@@ -22,10 +20,11 @@ def sentiment_simple(text: str) -> str:
 def summarize_with_ollama(text: str, timeout=120):
     prompt = f"Summarize in one sentence:\n\n{text}\n\nOne-sentence summary:"
     try:
-        r = requests.post(OLLAMA_URL, json={"model": MODEL, "prompt": prompt, "stream": False}, timeout=timeout)
-        r.raise_for_status()
-        return r.json().get("response","").strip()
+        return get_client().generate(prompt, source="summarize", timeout=timeout)
+    except deadline.Cancelled:
+        raise
     except Exception:
+        # includes LLMUnavailable: an open breaker falls back instantly instead of per-row timeouts
         return text[:200]
 
 def analyze_text_column(df, text_col: str, add_summary: bool = True, add_sentiment: bool = True):
@@ -34,5 +33,9 @@ def analyze_text_column(df, text_col: str, add_summary: bool = True, add_sentime
         res[f"{text_col}_sentiment"] = res[text_col].astype(str).apply(sentiment_simple)
     if add_summary:
         # Keep summaries short to avoid long LLM calls; do best-effort
-        res[f"{text_col}_summary"] = res[text_col].astype(str).apply(lambda t: summarize_with_ollama(t[:150]) if t and len(t)>10 else "")
+        # one model call per row: stop between rows once the request is cancelled
+        def summarize(t):
+            deadline.check()
+            return summarize_with_ollama(t[:150]) if t and len(t)>10 else ""
+        res[f"{text_col}_summary"] = res[text_col].astype(str).apply(summarize)
     return res
@@ -0,0 +1,200 @@
+# app/services/upload_store.py
+import os
+import sys
+import json
+import asyncio
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Uploads are stored once per content hash: <STORE_DIR>/<sha256><ext>.
+# Handles ("xl_" + hash prefix) name them in queries instead of paths.
+STORE_DIR = os.getenv("EXCEL_AI_UPLOAD_DIR", os.path.join("data", "objects"))
+INDEX_FILE = "index.json"
+HANDLE_PREFIX = "xl_"
+HANDLE_LEN = 16
+CHUNK_SIZE = 1 << 20
+
+_lock = threading.Lock()
+
+
+def _index_path(store_dir: str) -> str:
+    return os.path.join(store_dir, INDEX_FILE)
+
+
+def _dir(store_dir: Optional[str]) -> str:
+    return store_dir or STORE_DIR
+
+
+def load_index(store_dir: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    store_dir = _dir(store_dir)
+    try:
+        with open(_index_path(store_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index: Dict[str, Dict[str, Any]], store_dir: str):
+    tmp = _index_path(store_dir) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp, _index_path(store_dir))
+
+
+def handle_for(digest: str) -> str:
+    return HANDLE_PREFIX + digest[:HANDLE_LEN]
+
+
+def is_handle(value: str) -> bool:
+    return isinstance(value, str) and value.startswith(HANDLE_PREFIX) and os.sep not in value and "/" not in value
+
+
+def resolve(handle: str, store_dir: Optional[str] = None) -> Optional[str]:
+    """Stored path for a handle, or None if it is unknown."""
+    store_dir = _dir(store_dir)
+    entry = load_index(store_dir).get(handle)
+    if entry is None:
+        return None
+    path = os.path.join(store_dir, entry["sha256"] + entry["ext"])
+    return path if os.path.exists(path) else None
+
+
+def _register(digest: str, ext: str, size: int, filename: str, store_dir: str) -> Tuple[str, Dict[str, Any]]:
+    handle = handle_for(digest)
+    with _lock:
+        index = load_index(store_dir)
+        entry = index.setdefault(handle, {"sha256": digest, "ext": ext, "size": size, "names": [],
+                                          "created": time.time()})
+        if filename and filename not in entry["names"]:
+            entry["names"].append(filename)
+        entry["last_upload"] = time.time()
+        _save_index(index, store_dir)
+    return handle, entry
+
+
+async def store_upload(upload, store_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stream an UploadFile to disk while hashing it. Identical content is kept
+    once: a re-upload discards the temp copy and returns the existing path,
+    whose parsed sheets and cached results stay valid. Hashing and disk writes
+    run on a worker thread, off the event loop.
+    """
+    store_dir = _dir(store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    ext = os.path.splitext(upload.filename)[1].lower()
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=store_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await asyncio.to_thread(_append, out, h, chunk)
+                size += len(chunk)
+        return await asyncio.to_thread(_commit, tmp, h.hexdigest(), ext, size, upload.filename, store_dir)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _append(out, h, chunk: bytes):
+    h.update(chunk)
+    out.write(chunk)
+
+
+def _commit(tmp: str, digest: str, ext: str, size: int, filename: str, store_dir: str) -> Dict[str, Any]:
+    dest = os.path.join(store_dir, digest + ext)
+    deduplicated = os.path.exists(dest)
+    if not deduplicated:
+        # never rewrite an existing blob: its mtime keys the frame and result caches
+        os.replace(tmp, dest)
+    handle, entry = _register(digest, ext, size, filename, store_dir)
+    return {"handle": handle, "file_path": dest, "sha256": digest, "size": size,
+            "names": entry["names"], "deduplicated": deduplicated}
+
+
+def upload_times(store_dir: Optional[str] = None) -> Dict[str, float]:
+    """Stored path -> time of its latest upload (re-uploads of the same content count; the blob is not touched)."""
+    store_dir = _dir(store_dir)
+    return {os.path.join(store_dir, e["sha256"] + e["ext"]): e.get("last_upload", e["created"])
+            for e in load_index(store_dir).values()}
+
+
+def previous_version(handle: str, filename: str, store_dir: Optional[str] = None) -> Optional[str]:
+    """Most recently uploaded other content stored under the same file name, if any."""
+    candidates = [(e.get("last_upload", e["created"]), h) for h, e in load_index(store_dir).items()
+                  if h != handle and filename in e["names"]]
+    return max(candidates)[1] if candidates else None
+
+
+def lineage(path: str, store_dir: Optional[str] = None) -> str:
+    """
+    What all versions of one workbook have in common: the first file name a
+    stored blob was uploaded under (a new upload under that name is its next
+    version), else the absolute path of a file edited in place.
+    """
+    store_dir = _dir(store_dir)
+    path = os.path.abspath(path)
+    if os.path.dirname(path) == os.path.abspath(store_dir):
+        digest = os.path.splitext(os.path.basename(path))[0]
+        entry = load_index(store_dir).get(handle_for(digest))
+        if entry and entry["names"]:
+            return "upload:" + entry["names"][0]
+    return path
+
+
+def discard(handle: str, store_dir: Optional[str] = None):
+    """Remove a stored upload and its index entry (e.g. content that failed to parse)."""
+    store_dir = _dir(store_dir)
+    with _lock:
+        index = load_index(store_dir)
+        entry = index.pop(handle, None)
+        if entry is None:
+            return
+        _save_index(index, store_dir)
+    path = os.path.join(store_dir, entry["sha256"] + entry["ext"])
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def adopt(path: str, store_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Copy an existing workbook into the store (used to consolidate old uuid-prefixed uploads)."""
+    store_dir = _dir(store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    ext = os.path.splitext(path)[1].lower()
+    fd, tmp = tempfile.mkstemp(dir=store_dir, suffix=".part")
+    os.close(fd)
+    try:
+        if not os.path.exists(os.path.join(store_dir, digest + ext)):
+            shutil.copyfile(path, tmp)
+        return _commit(tmp, digest, ext, os.path.getsize(path), _original_name(path), store_dir)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _original_name(path: str) -> str:
+    """Strip the stacked `<uuid hex>_` prefixes the old upload route added."""
+    name = os.path.basename(path)
+    while len(name) > 33 and name[32] == "_" and all(c in "0123456789abcdef" for c in name[:32]):
+        name = name[33:]
+    return name
+
+
+if __name__ == "__main__":
+    # python -m app.services.upload_store data/*.xlsx  -> adopt files and print their handles
+    for p in sys.argv[1:]:
+        if os.path.isfile(p) and not p.endswith("_out.xlsx"):
+            r = adopt(p)
+            print(f"{r['handle']}  {'dup ' if r['deduplicated'] else 'new '} {p}")
@@ -0,0 +1,202 @@
+# app/services/zone_maps.py
+import os
+import re
+import ast
+import io
+import tokenize
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services import metrics
+from app.services.result_cache import DigestLRU
+
+# Per-block min/max ("zone maps") of numeric and date columns of a sheet.
+# A filter's conjunctive range predicates (col > x, a <= col < b,
+# col == x) rule out blocks whose range cannot match; the query then runs only
+# on the remaining blocks. Sheets live in memory as parsed frames, so blocks
+# are fixed row ranges of the cached frame rather than separately stored chunks.
+ZONE_BLOCK_ROWS = int(os.getenv("EXCEL_AI_ZONE_BLOCK_ROWS", "8192"))
+ZONE_MAPS = int(os.getenv("EXCEL_AI_ZONE_MAPS", "64"))
+# below this many rows a plain scan is as fast as consulting the maps
+ZONE_MIN_ROWS = int(os.getenv("EXCEL_AI_ZONE_MIN_ROWS", "50000"))
+
+ZONE_BLOCKS = metrics.REGISTRY.register(metrics.Counter(
+    "excel_ai_zone_blocks_total", "Row blocks considered by filters.", ("result",)))
+
+_maps = DigestLRU(ZONE_MAPS)   # (digest, column) -> (rows, block minima, block maxima)
+
+Range = Tuple[Any, bool, Any, bool]   # (low, low inclusive, high, high inclusive)
+
+_FLIP = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE, ast.Eq: ast.Eq}
+
+
+def clear():
+    _maps.clear()
+
+
+def _literal(node: ast.AST) -> Tuple[bool, Any]:
+    try:
+        return True, ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return False, None
+
+
+def _conjuncts(node: ast.AST) -> List[ast.AST]:
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return [c for v in node.values for c in _conjuncts(v)]
+    return [node]
+
+
+def _tighten(ranges: Dict[str, Range], col: str, op: type, value: Any):
+    lo, lo_inc, hi, hi_inc = ranges.get(col, (None, True, None, True))
+    if op in (ast.Gt, ast.GtE, ast.Eq):
+        inc = op is not ast.Gt
+        try:
+            if lo is None or value > lo or (value == lo and not inc):
+                lo, lo_inc = value, inc
+        except TypeError:
+            return
+    if op in (ast.Lt, ast.LtE, ast.Eq):
+        inc = op is not ast.Lt
+        try:
+            if hi is None or value < hi or (value == hi and not inc):
+                hi, hi_inc = value, inc
+        except TypeError:
+            return
+    ranges[col] = (lo, lo_inc, hi, hi_inc)
+
+
+def conjuncts(condition: str) -> Tuple[List[ast.AST], Dict[str, str]]:
+    """
+    The AND-ed terms of a df.query condition as Python AST nodes, plus the
+    placeholder -> column name map for `backticked` names. ([], {}) when the
+    condition is not plain Python syntax (e.g. uses @variables).
+    """
+    names = {}
+
+    def _name(m):
+        names[f"__col{len(names)}__"] = m.group(1)
+        return f"__col{len(names) - 1}__"
+    try:
+        text = re.sub(r"`([^`]*)`", _name, condition)
+        # like pandas, & and | bind as loosely as `and` / `or`
+        toks = [{"&": "and", "|": "or"}.get(t.string, t.string) if t.type == tokenize.OP else t.string
+                for t in tokenize.generate_tokens(io.StringIO(text).readline)]
+        tree = ast.parse(" ".join(toks).strip(), mode="eval")
+    except (SyntaxError, tokenize.TokenError):
+        return [], {}
+    return _conjuncts(tree.body), names
+
+
+def ranges_of(condition: str) -> Dict[str, Range]:
+    """
+    Column ranges implied by the AND-ed comparisons of a df.query condition.
+    Anything else (or, functions, column vs column) adds no range, which only
+    means fewer blocks are skipped; the full condition is always applied after.
+    """
+    terms, names = conjuncts(condition)
+    ranges: Dict[str, Range] = {}
+    for node in terms:
+        if not isinstance(node, ast.Compare):
+            continue
+        operands = [node.left] + list(node.comparators)
+        for left, op, right in zip(operands, node.ops, operands[1:]):
+            if type(op) not in _FLIP:
+                continue
+            if isinstance(left, ast.Name):
+                ok, value = _literal(right)
+                col, kind = left.id, type(op)
+            elif isinstance(right, ast.Name):
+                ok, value = _literal(left)
+                col, kind = right.id, _FLIP[type(op)]
+            else:
+                continue
+            if ok and value is not None:
+                _tighten(ranges, names.get(col, col), kind, value)
+    return ranges
+
+
+def _values(s: pd.Series) -> Optional[np.ndarray]:
+    if pd.api.types.is_bool_dtype(s):
+        return None
+    if pd.api.types.is_numeric_dtype(s):
+        return s.to_numpy(dtype=np.float64, na_value=np.nan)
+    if pd.api.types.is_datetime64_any_dtype(s) and getattr(s.dt, "tz", None) is None:
+        v = s.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+        v[s.isna().to_numpy()] = np.nan
+        return v
+    return None
+
+
+def _zone_map(df: pd.DataFrame, digest: str, col: str) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+    key = (digest, col)
+    zm = _maps.get(key)
+    if zm is not None:
+        return zm
+    v = _values(df[col])
+    if v is None:
+        return None
+    blocks = pd.Series(v).groupby(np.arange(len(v)) // ZONE_BLOCK_ROWS)
+    zm = (len(v), blocks.min().to_numpy(), blocks.max().to_numpy())
+    _maps.put(key, zm)
+    return zm
+
+
+def _bound(value: Any, s: pd.Series) -> Optional[float]:
+    try:
+        if pd.api.types.is_datetime64_any_dtype(s):
+            return float(pd.Timestamp(value).as_unit("ns").value)
+        if isinstance(value, (bool, str)):
+            return None
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def candidate_blocks(df: pd.DataFrame, condition: str, digest: str) -> Optional[np.ndarray]:
+    """Boolean mask of blocks that may hold matching rows, or None when nothing can be ruled out."""
+    keep = None
+    for col, (lo, lo_inc, hi, hi_inc) in ranges_of(condition).items():
+        if col not in df.columns:
+            continue
+        zm = _zone_map(df, digest, col)
+        if zm is None:
+            continue
+        rows, mins, maxs = zm
+        if rows != len(df):
+            # not the frame the maps were built from
+            return None
+        ok = ~np.isnan(mins)   # all-missing blocks match no comparison
+        b = _bound(lo, df[col]) if lo is not None else None
+        if b is not None:
+            ok &= (maxs >= b) if lo_inc else (maxs > b)
+        b = _bound(hi, df[col]) if hi is not None else None
+        if b is not None:
+            ok &= (mins <= b) if hi_inc else (mins < b)
+        keep = ok if keep is None else keep & ok
+    return keep
+
+
+def query(df: pd.DataFrame, condition: str, digest: Optional[str] = None) -> pd.DataFrame:
+    """
+    df.query(condition), evaluated only on row blocks the zone maps cannot
+    rule out. `digest` identifies the unmodified sheet df was read as; frames
+    that are not whole sheets (e.g. already filtered) are scanned normally.
+    """
+    n = len(df)
+    whole = isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1
+    if not digest or n < ZONE_MIN_ROWS or not whole:
+        return df.query(condition)
+    keep = candidate_blocks(df, condition, digest)
+    if keep is None:
+        return df.query(condition)
+    ZONE_BLOCKS.inc(int(keep.sum()), result="scanned")
+    ZONE_BLOCKS.inc(int((~keep).sum()), result="skipped")
+    if keep.all():
+        return df.query(condition)
+    starts = np.flatnonzero(keep) * ZONE_BLOCK_ROWS
+    rows = np.concatenate([np.arange(s, min(s + ZONE_BLOCK_ROWS, n)) for s in starts]) if len(starts) else \
+        np.array([], dtype=np.int64)
+    return df.take(rows).query(condition)
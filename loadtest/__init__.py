@@ -0,0 +1,2 @@
+# loadtest/__init__.py
+# End-to-end load testing with a mock Ollama: python -m loadtest --help
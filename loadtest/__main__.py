@@ -0,0 +1,4 @@
+# loadtest/__main__.py
+from loadtest.run import main
+
+main()
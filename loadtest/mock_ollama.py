@@ -0,0 +1,152 @@
+# loadtest/mock_ollama.py
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Stand-in for Ollama's /api/generate: answers after a configurable latency
+# (+/- jitter), fails a configurable share of calls with 503, and returns
+# canned plans for JSON-format prompts, picked by regex on the user query.
+# Streaming requests get NDJSON chunks like the real server.
+DEFAULT_PLANS = Path(__file__).with_name("plans.json")
+FALLBACK_PLAN = {"operation": "describe", "parameters": {}}
+
+
+def load_plans(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    with open(path or DEFAULT_PLANS) as f:
+        return json.load(f)
+
+
+class MockOllama:
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, failure_rate: float = 0.0,
+                 plans: Optional[List[Dict[str, Any]]] = None, seed: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.plans = [(re.compile(p["match"], re.I), p["plan"]) for p in (load_plans() if plans is None else plans)]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def start(self) -> "MockOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "failures": self.failures, "latency": self.latency,
+                "jitter": self.jitter, "failure_rate": self.failure_rate}
+
+    def plan_for(self, prompt: str) -> Dict[str, Any]:
+        m = re.search(r"User Query:\s*(.*)", prompt)
+        query = m.group(1) if m else prompt
+        for pattern, plan in self.plans:
+            if pattern.search(query):
+                return plan
+        return FALLBACK_PLAN
+
+    def _draw(self):
+        """(delay, fail) for one call."""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        return delay, fail
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if self.path != "/api/generate":
+                    return self._send(404, b'{"error": "not found"}')
+                delay, fail = mock._draw()
+                time.sleep(delay)
+                if fail:
+                    return self._send(503, b'{"error": "mock failure"}')
+                prompt = payload.get("prompt", "")
+                if payload.get("format"):
+                    text = json.dumps(mock.plan_for(prompt))
+                else:
+                    text = "Mock summary: " + " ".join(prompt.split()[-12:])
+                if not payload.get("stream"):
+                    return self._send(200, json.dumps({"model": payload.get("model"), "response": text,
+                                                       "done": True}).encode())
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                step = max(1, len(text) // 4)
+                pieces = [text[i:i + step] for i in range(0, len(text), step)]
+                try:
+                    for i, piece in enumerate(pieces + [""]):
+                        line = json.dumps({"response": piece, "done": i == len(pieces)}).encode() + b"\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client stops reading once it has a complete plan, as it does with Ollama
+                    self.close_connection = True
+
+        return Handler
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve a mock Ollama /api/generate endpoint.")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds per call")
+    ap.add_argument("--jitter", type=float, default=0.05, help="+/- seconds around --latency")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="share of calls answered with 503")
+    ap.add_argument("--plans", help="JSON list of {match, plan}; defaults to loadtest/plans.json")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args(argv)
+    mock = MockOllama(args.latency, args.jitter, args.failure_rate, load_plans(args.plans), args.seed,
+                      port=args.port).start()
+    print(f"mock Ollama on {mock.url}")
+    try:
+        mock._thread.join()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
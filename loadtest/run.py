@@ -0,0 +1,323 @@
+# loadtest/run.py
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from loadtest.mock_ollama import MockOllama, load_plans
+
+# Replays a mixed workload against the API at a fixed arrival rate (open
+# loop: requests are sent on schedule whether or not earlier ones finished),
+# with the model server replaced by MockOllama. Latency is measured from each
+# request's scheduled send time, so a backed-up client or server shows up in
+# the percentiles instead of silently lowering the rate.
+
+Request = Tuple[str, str, Dict[str, Any]]   # method, path, requests kwargs
+
+STRUCTURED = "Structured"
+UNSTRUCTURED = "Unstructured"
+
+
+def _aggregate(ctx, rnd):
+    return "POST", "/query/run", {"json": {
+        "file_path": ctx["workbook"], "sheet_name": STRUCTURED, "operation": "aggregate", "output": "lazy",
+        "params": {"column": "Salary", "agg": rnd.choice(["sum", "mean", "max"]),
+                   "group_by": [rnd.choice(["Department", "Country"])],
+                   "filter": f"Age >= {rnd.randint(20, 60)}"}}}
+
+
+def _filter(ctx, rnd):
+    return "POST", "/query/run", {"json": {
+        "file_path": ctx["workbook"], "sheet_name": STRUCTURED, "operation": "filter", "output": "lazy",
+        "params": {"condition": f"Salary > {rnd.randint(20000, 200000)}", "order_by": "-Salary", "limit": 50}}}
+
+
+def _pivot(ctx, rnd):
+    return "POST", "/query/run", {"json": {
+        "file_path": ctx["workbook"], "sheet_name": STRUCTURED, "operation": "pivot", "output": "lazy",
+        "params": {"index": "Department", "columns": "Country", "values": "Salary",
+                   "aggfunc": rnd.choice(["sum", "mean"])}}}
+
+
+def _text_search(ctx, rnd):
+    return "POST", "/query/run", {"json": {
+        "file_path": ctx["workbook"], "sheet_name": UNSTRUCTURED, "operation": "text_search", "output": "lazy",
+        "params": {"query": rnd.choice(["over-budget delayed", "stable OR on-time", '"exceeded expectations"']),
+                   "text_col": "Notes"}}}
+
+
+def _nl_parsed(ctx, rnd):
+    # answered by the rule-based parser, no model call
+    return "POST", "/query/run", {"json": {
+        "file_path": ctx["workbook"], "sheet_name": STRUCTURED,
+        "query": rnd.choice(["average Salary by Department", "total Projects by Country",
+                             f"rows where Age > {rnd.randint(20, 60)}"])}}
+
+
+def _nl_llm(ctx, rnd):
+    # needs the model: answered with a canned plan by the mock. The team number
+    # keeps prompts distinct, so they are not all answered by the prompt cache.
+    question = rnd.choice(["who seems unhappy in their role", "show me the top earners",
+                           "headcount per office", "give me an overview"])
+    return "POST", "/query/run", {"json": {
+        "file_path": ctx["workbook"], "sheet_name": STRUCTURED,
+        "query": f"{question} for team {rnd.randint(1, 10000)}"}}
+
+
+def _upload(ctx, rnd):
+    # same bytes every time: exercises hashing and dedup, not reparsing
+    return "POST", "/upload/file", {"files": {"file": ("loadtest.xlsx", ctx["workbook_bytes"])}}
+
+
+# name -> (default weight, request builder)
+OPERATIONS: Dict[str, Tuple[float, Callable]] = {
+    "aggregate": (25, _aggregate),
+    "filter": (20, _filter),
+    "pivot": (10, _pivot),
+    "text_search": (10, _text_search),
+    "nl_parsed": (15, _nl_parsed),
+    "nl_llm": (15, _nl_llm),
+    "upload": (5, _upload),
+}
+
+
+def make_workbook(path: str, rows: int = 1000, seed: int = 42):
+    """Structured + Unstructured sheets shaped like generate_data.py's, at any size."""
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    structured = pd.DataFrame({
+        "ID": np.arange(1, rows + 1),
+        "Age": rng.integers(20, 65, rows),
+        "Salary": rng.integers(20000, 200000, rows),
+        "Department": rng.choice(["HR", "IT", "Finance", "Sales", "Ops"], rows),
+        "JoinDate": pd.Timestamp("2017-01-01") + pd.to_timedelta(rng.integers(0, 365 * 6, rows), unit="D"),
+        "PerformanceScore": rng.integers(1, 11, rows),
+        "Country": rng.choice(["India", "USA", "UK", "Germany", "France"], rows),
+        "Projects": rng.integers(0, 10, rows),
+    })
+    words = np.array(["stable", "delayed", "on-time", "over-budget", "exceeded expectations"])
+    unstructured = pd.DataFrame({
+        "ID": np.arange(1, rows + 1),
+        "Notes": [" ".join(w) for w in words[rng.integers(0, len(words), (rows, 5))]],
+    })
+    with pd.ExcelWriter(path, engine="openpyxl") as w:
+        structured.to_excel(w, sheet_name=STRUCTURED, index=False)
+        unstructured.to_excel(w, sheet_name=UNSTRUCTURED, index=False)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, env: Dict[str, str], timeout: float = 60) -> subprocess.Popen:
+    """uvicorn running app.main:app in a child process, returned once /ready passes."""
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--log-level", "warning"], env={**os.environ, **env})
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app exited with status {proc.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                return proc
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("app did not become ready in time")
+
+
+def warm_up(base_url: str, ctx: Dict[str, Any], seed: int = 0, timeout: float = 120):
+    """One request of each operation, not measured: first parses and index builds happen here."""
+    rnd = random.Random(seed)
+    with requests.Session() as session:
+        for _, build in OPERATIONS.values():
+            method, path, kwargs = build(ctx, rnd)
+            try:
+                session.request(method, base_url + path, timeout=timeout, **kwargs)
+            except requests.RequestException:
+                pass
+
+
+def summarize(samples: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    """Per-operation and overall count, errors, throughput and latency percentiles (ms)."""
+    def block(rows):
+        lat = np.array([r["latency"] for r in rows]) * 1000
+        status: Dict[str, int] = {}
+        for r in rows:
+            status[str(r["status"])] = status.get(str(r["status"]), 0) + 1
+        return {"count": len(rows), "errors": sum(1 for r in rows if not 200 <= r["status"] < 300),
+                "status": status, "throughput_rps": round(len(rows) / duration, 2) if duration else None,
+                "latency_ms": {"p50": round(float(np.percentile(lat, 50)), 1),
+                               "p95": round(float(np.percentile(lat, 95)), 1),
+                               "p99": round(float(np.percentile(lat, 99)), 1),
+                               "mean": round(float(lat.mean()), 1), "max": round(float(lat.max()), 1)}}
+    ops = sorted({s["operation"] for s in samples})
+    return {"operations": {op: block([s for s in samples if s["operation"] == op]) for op in ops},
+            "overall": block(samples) if samples else {"count": 0}}
+
+
+def run(base_url: str, ctx: Dict[str, Any], rate: float, duration: float, weights: Dict[str, float],
+        concurrency: int = 64, seed: int = 0, poisson: bool = False, timeout: float = 60) -> Dict[str, Any]:
+    rnd = random.Random(seed)
+    names = [n for n in weights if weights[n] > 0]
+    schedule, t = [], 0.0
+    while t < duration:
+        name = rnd.choices(names, weights=[weights[n] for n in names])[0]
+        schedule.append((t, name, OPERATIONS[name][1](ctx, rnd)))
+        # offsets are computed, not summed, so float error cannot add a request
+        t = t + rnd.expovariate(rate) if poisson else len(schedule) / rate
+
+    local = threading.local()
+    samples: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def send(due: float, name: str, req: Request):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        method, path, kwargs = req
+        try:
+            status = local.session.request(method, base_url + path, timeout=timeout, **kwargs).status_code
+        except requests.RequestException:
+            status = 0
+        with lock:
+            samples.append({"operation": name, "status": status, "latency": time.perf_counter() - due})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadtest") as pool:
+        for offset, name, req in schedule:
+            due = start + offset
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(send, due, name, req)
+    elapsed = time.perf_counter() - start
+    return {**summarize(samples, elapsed), "elapsed_s": round(elapsed, 2), "sent": len(schedule)}
+
+
+def _git_version() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> str:
+    """Text table of latency percentiles and throughput against an earlier results file."""
+    lines = [f"{'operation':<14}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'rps':>16}"]
+    old_ops = previous.get("results", {}).get("operations", {})
+    for op, cur in current["results"]["operations"].items():
+        old = old_ops.get(op)
+        cells = []
+        for p in ("p50", "p95", "p99"):
+            new = cur["latency_ms"][p]
+            cells.append(f"{new:>8} ({new - old['latency_ms'][p]:+.1f})" if old else f"{new:>8}      (new)")
+        rps = cur["throughput_rps"]
+        cells.append(f"{rps:>7} ({rps - old['throughput_rps']:+.1f})" if old else f"{rps:>7}")
+        lines.append(f"{op:<14}" + "".join(f"{c:>18}" for c in cells))
+    return "\n".join(lines)
+
+
+def parse_weights(text: Optional[str]) -> Dict[str, float]:
+    weights = {name: w for name, (w, _) in OPERATIONS.items()}
+    for item in filter(None, (text or "").split(",")):
+        name, _, value = item.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"unknown operation {name!r}; choose from {sorted(OPERATIONS)}")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m loadtest",
+                                 description="Load-test the API with a mock Ollama; writes results as JSON.")
+    ap.add_argument("--rate", type=float, default=10, help="requests per second")
+    ap.add_argument("--duration", type=float, default=30, help="seconds of load")
+    ap.add_argument("--concurrency", type=int, default=64, help="most requests in flight")
+    ap.add_argument("--poisson", action="store_true", help="exponential gaps instead of a fixed interval")
+    ap.add_argument("--mix", help="operation weights, e.g. aggregate=5,nl_llm=0 (defaults: %s)"
+                    % ",".join(f"{n}={w:g}" for n, (w, _) in OPERATIONS.items()))
+    ap.add_argument("--rows", type=int, default=10000, help="rows of the generated workbook")
+    ap.add_argument("--workbook", help="use this workbook (Structured/Unstructured sheets) instead")
+    ap.add_argument("--url", help="test an already running API instead of starting one")
+    ap.add_argument("--llm-latency", type=float, default=0.5)
+    ap.add_argument("--llm-jitter", type=float, default=0.2)
+    ap.add_argument("--llm-failure-rate", type=float, default=0.0)
+    ap.add_argument("--plans", help="canned plans for the mock (JSON list of {match, plan})")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=os.path.join("data", "loadtest", f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    ap.add_argument("--compare", help="earlier results file to print deltas against")
+    args = ap.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="excel-ai-loadtest-")
+    workbook = os.path.abspath(args.workbook) if args.workbook else os.path.join(work, "loadtest.xlsx")
+    if not args.workbook:
+        make_workbook(workbook, args.rows, args.seed)
+    with open(workbook, "rb") as f:
+        ctx = {"workbook": workbook, "workbook_bytes": f.read()}
+
+    mock = MockOllama(args.llm_latency, args.llm_jitter, args.llm_failure_rate, load_plans(args.plans), args.seed)
+    proc = None
+    with mock:
+        base_url = args.url
+        if not base_url:
+            port = free_port()
+            # state of the run stays out of the working tree
+            proc = start_app(port, {"OLLAMA_URL": mock.url,
+                                    "EXCEL_AI_UPLOAD_DIR": os.path.join(work, "uploads"),
+                                    "EXCEL_AI_RESULTS_DIR": os.path.join(work, "results"),
+                                    "EXCEL_AI_CATALOG_DIR": os.path.join(work, "catalog")})
+            base_url = f"http://127.0.0.1:{port}"
+        try:
+            warm_up(base_url, ctx, args.seed)
+            results = run(base_url, ctx, args.rate, args.duration, parse_weights(args.mix), args.concurrency,
+                          args.seed, args.poisson)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(30)
+        llm = mock.stats()
+
+    report = {
+        "version": _git_version(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {"rate": args.rate, "duration": args.duration, "concurrency": args.concurrency,
+                   "poisson": args.poisson, "mix": parse_weights(args.mix), "rows": None if args.workbook else args.rows,
+                   "workbook": args.workbook, "url": args.url, "seed": args.seed},
+        "llm_mock": llm,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    overall = results["overall"]
+    print(f"{results['sent']} requests in {results['elapsed_s']}s, {overall.get('errors', 0)} errors -> {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)))
+    else:
+        for op, r in results["operations"].items():
+            lat = r["latency_ms"]
+            print(f"  {op:<12} n={r['count']:<5} err={r['errors']:<3} p50={lat['p50']}ms p95={lat['p95']}ms "
+                  f"p99={lat['p99']}ms")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# keep generated catalogs, uploads and result workbooks out of data/
+_scratch = tempfile.mkdtemp(prefix="excel-ai-tests-")
+for var, sub in (("EXCEL_AI_CATALOG_DIR", "catalog"), ("EXCEL_AI_RESULTS_DIR", "results"),
+                 ("EXCEL_AI_UPLOAD_DIR", "objects")):
+    os.environ.setdefault(var, os.path.join(_scratch, sub))
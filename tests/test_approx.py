@@ -0,0 +1,39 @@
+# tests/test_approx.py
+import numpy as np
+import pandas as pd
+from app.services import approx
+from app.services.math_operations import aggregate
+
+def _frame(n=60000):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({"region": rng.choice(["N", "S", "E"], n), "sales": rng.exponential(50, n),
+                         "customer": rng.integers(0, 5000, n)})
+
+def _inside(bounds, value, est=None):
+    lo, hi = bounds
+    if est is not None:
+        # twice the 95% margin: a fixed sample may miss the plain interval by chance
+        lo, hi = est - 2 * (est - lo), est + 2 * (hi - est)
+    return (lo is None or lo <= value) and (hi is None or value <= hi)
+
+def test_sample_estimates_bound_the_exact_answer(monkeypatch):
+    monkeypatch.setattr(approx, "APPROX_SAMPLE_ROWS", 5000)
+    approx.clear()
+    df = _frame()
+    assert approx.worthwhile(df)
+    for agg in ("sum", "mean", "median", "p90", "count"):
+        est = approx.aggregate(df, "sales", agg, ["region"], digest="t")
+        exact = aggregate(df, "sales", agg, ["region"])
+        assert est["approximate"] and est["rows_used"] < len(df)
+        assert all(_inside(est["bounds"][k], v, est["result"][k]) for k, v in exact.items()), agg
+
+def test_distinct_count_from_hyperloglog():
+    approx.clear()
+    df = _frame()
+    est = approx.aggregate(df, "customer", "nunique", digest="t")
+    assert est["method"] == "hyperloglog"
+    assert _inside(est["bounds"], aggregate(df, "customer", "nunique"))
+    assert abs(est["result"] - 5000) / 5000 < 0.05
+
+def test_small_frames_stay_exact():
+    assert not approx.worthwhile(_frame(1000))
@@ -0,0 +1,51 @@
+# tests/test_batch.py
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import result_store
+
+def test_batch_reads_once_and_isolates_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "RESULTS_DIR", str(tmp_path / "results"))
+    path = tmp_path / "b.xlsx"
+    pd.DataFrame({"Region": ["N", "S", "N"], "Sales": [1, 2, 3]}).to_excel(path, index=False)
+    body = {"file_path": str(path), "queries": [
+        {"operation": "aggregate", "params": {"column": "Sales", "agg": "sum", "group_by": ["Region"]}},
+        {"operation": "filter", "params": {"condition": "Sales > 1"}, "output": "lazy"},
+        {"operation": "aggregate", "params": {"column": "Missing", "agg": "sum"}},
+        {"query": "total Sales by Region"},
+        {"params": {}},
+    ]}
+    resp = TestClient(app).post("/query/batch", json=body)
+    assert resp.status_code == 200
+    out = resp.json()
+    assert [r["status"] for r in out["results"]] == [200, 200, 500, 200, 400]
+    assert out["errors"] == 2
+    assert out["results"][0]["result"] == {"N": 4, "S": 2}
+    assert out["results"][1]["rows"] == 2
+    assert out["results"][3]["result"] == {"N": 4, "S": 2}
+    assert resp.headers["Server-Timing"].count("read;") == 1
+
+def test_batch_parses_nl_items_once_and_reads_on_cpu_pool(tmp_path, monkeypatch):
+    import threading
+    from app import orchestrator
+    from app.routes import query
+    path = tmp_path / "b.xlsx"
+    pd.DataFrame({"Region": ["N", "S", "N"], "Sales": [1, 2, 3]}).to_excel(path, index=False)
+    parses, readers = [], []
+    real_parse, real_read = query.parse_query, query.read_sheet
+
+    def counting_parse(*args, **kwargs):
+        parses.append(args[0])
+        return real_parse(*args, **kwargs)
+
+    def recording_read(*args, **kwargs):
+        readers.append(threading.current_thread().name)
+        return real_read(*args, **kwargs)
+    monkeypatch.setattr(query, "parse_query", counting_parse)
+    monkeypatch.setattr(orchestrator, "parse_query", counting_parse)
+    monkeypatch.setattr(query, "read_sheet", recording_read)
+    body = {"file_path": str(path), "queries": [{"query": "total Sales by Region"}]}
+    resp = TestClient(app).post("/query/batch", json=body)
+    assert resp.json()["results"][0]["result"] == {"N": 4, "S": 2}
+    assert parses == ["total Sales by Region"]
+    assert readers and readers[0].startswith("excel-ai-cpu")
@@ -0,0 +1,107 @@
+# tests/test_deadline.py
+import time
+import threading
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.llm_agent.client import LLMClient
+from app.services import deadline, parallel_ingest, scheduler, unstructured_text
+from loadtest.mock_ollama import MockOllama
+
+def test_deadline_from_header_and_config(monkeypatch):
+    monkeypatch.setattr(deadline, "DEFAULT_DEADLINE", 10.0)
+    assert 4 < deadline.from_headers({"x-request-deadline": "5"}).remaining() <= 5
+    # a client cannot ask for more time than the server allows
+    assert deadline.from_headers({"x-request-deadline": "60"}).remaining() <= 10
+    monkeypatch.setattr(deadline, "DEFAULT_DEADLINE", 0.0)
+    assert deadline.from_headers({}).remaining() is None
+
+def test_sleep_and_timeouts_end_at_deadline():
+    deadline.check()   # no request: nothing to check
+    with deadline.scope(deadline.Deadline(0.3)):
+        assert deadline.timeout(120) <= 0.3
+        t0 = time.monotonic()
+        with pytest.raises(deadline.Cancelled) as e:
+            deadline.sleep(5)
+        assert time.monotonic() - t0 < 1
+        assert e.value.reason == deadline.DEADLINE_EXCEEDED
+
+def test_queued_job_of_cancelled_request_never_runs():
+    pool = scheduler.Pool("t", 1)
+    gate = threading.Event()
+    pool.submit(gate.wait, 5)
+    ran = []
+    d = deadline.Deadline()
+    with deadline.scope(d):
+        future = pool.submit(ran.append, 1)
+    d.cancel(deadline.DISCONNECTED)
+    gate.set()
+    with pytest.raises(deadline.Cancelled):
+        future.result(5)
+    assert ran == []
+    pool.drain()
+
+def test_text_analyze_stops_at_deadline(tmp_path, monkeypatch):
+    calls = []
+    def slow_summary(text, timeout=120):
+        calls.append(text)
+        time.sleep(0.1)
+        return text
+    monkeypatch.setattr(unstructured_text, "summarize_with_ollama", slow_summary)
+    path = tmp_path / "notes.xlsx"
+    pd.DataFrame({"Notes": [f"note number {i} about the customer" for i in range(60)]}).to_excel(path, index=False)
+    body = {"file_path": str(path), "operation": "text_analyze", "use_cache": False, "params": {"text_col": "Notes"}}
+    t0 = time.monotonic()
+    resp = TestClient(app).post("/query/run", json=body, headers={"X-Request-Deadline": "0.5"})
+    assert resp.status_code == 504
+    assert time.monotonic() - t0 < 2
+    time.sleep(0.3)
+    stopped = len(calls)
+    time.sleep(0.3)
+    assert len(calls) == stopped < 60
+
+def test_llm_call_cancelled_without_tripping_breaker():
+    with MockOllama(latency=3, jitter=0) as mock:
+        client = LLMClient(url=mock.url, max_retries=0)
+        t0 = time.monotonic()
+        with deadline.scope(deadline.Deadline(0.3)), pytest.raises(deadline.Cancelled):
+            client.generate("Summarize in one sentence: slow")
+        assert time.monotonic() - t0 < 1.5
+        assert client.breaker.state == "closed" and client.failures == 0
+
+def test_pool_workers_killed_when_request_cancelled():
+    with deadline.scope(deadline.Deadline(0.5)), parallel_ingest.using() as pool:
+        futures = [pool.submit(time.sleep, 30) for _ in range(2)]
+        procs = list(pool._processes.values())
+        t0 = time.monotonic()
+        with pytest.raises(deadline.Cancelled):
+            parallel_ingest.gather(futures, pool)
+    assert time.monotonic() - t0 < 2
+    for proc in procs:
+        proc.join(2)
+        assert not proc.is_alive()
+    # the next caller gets a fresh pool
+    assert parallel_ingest.executor() is not pool
+    parallel_ingest.shutdown()
+
+def test_cancel_spares_pool_another_request_submitted_to():
+    with parallel_ingest.using() as pool:
+        # another request's task, submitted before it waits on anything
+        other = pool.submit(time.sleep, 1)
+        with deadline.scope(deadline.Deadline(0.3)), parallel_ingest.using() as same:
+            with pytest.raises(deadline.Cancelled):
+                parallel_ingest.gather([same.submit(time.sleep, 1)], same)
+        assert other.result(10) is None
+    assert parallel_ingest.executor() is pool
+    parallel_ingest.shutdown()
+
+def test_failed_pool_dropped_without_touching_newer_one():
+    from concurrent.futures.process import BrokenProcessPool
+    with pytest.raises(BrokenProcessPool), parallel_ingest.using():
+        parallel_ingest.terminate()
+        newer = parallel_ingest.executor()
+        raise BrokenProcessPool("a worker died")
+    assert parallel_ingest.executor() is newer
+    assert newer.submit(abs, -2).result(10) == 2
+    parallel_ingest.shutdown()
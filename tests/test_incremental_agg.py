@@ -0,0 +1,53 @@
+# tests/test_incremental_agg.py
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import incremental_agg
+from app.services.math_operations import aggregate
+from app.services.pivot_engine import create_pivot
+
+def _log(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"Region": rng.choice(["N", "S", "E"], n), "Kind": rng.choice(["a", "b"], n),
+                         "Sales": rng.integers(0, 100, n)})
+
+@pytest.mark.parametrize("agg", ["sum", "count", "min", "max", "mean"])
+def test_append_matches_full_recompute(agg):
+    incremental_agg.clear()
+    old = _log(500, 1)
+    new = pd.concat([old, _log(50, 2)], ignore_index=True)
+    incremental_agg.aggregate(old, "Sales", agg, ["Region"], condition="Sales > 10", sheet="log")
+    before = incremental_agg.INCREMENTAL_AGG._values.get(("delta",), 0)
+    got = incremental_agg.aggregate(new, "Sales", agg, ["Region"], condition="Sales > 10", sheet="log")
+    assert incremental_agg.INCREMENTAL_AGG._values.get(("delta",), 0) == before + 1
+    assert got == pytest.approx(aggregate(new.query("Sales > 10"), "Sales", agg, ["Region"]))
+    assert incremental_agg.aggregate(new, "Sales", agg, sheet="log") == pytest.approx(aggregate(new, "Sales", agg))
+
+def test_edited_history_falls_back_to_full():
+    incremental_agg.clear()
+    old = _log(100, 3)
+    incremental_agg.aggregate(old, "Sales", "sum", ["Region"])
+    edited = old.copy()
+    edited.loc[0, "Sales"] += 1
+    before = incremental_agg.INCREMENTAL_AGG._values.get(("full",), 0)
+    assert incremental_agg.aggregate(edited, "Sales", "sum", ["Region"]) == aggregate(edited, "Sales", "sum", ["Region"])
+    assert incremental_agg.INCREMENTAL_AGG._values.get(("full",), 0) == before + 1
+
+def test_pivot_append_matches_create_pivot():
+    incremental_agg.clear()
+    old = _log(300, 4)
+    new = pd.concat([old, _log(30, 5)], ignore_index=True)
+    incremental_agg.pivot(old, ["Region"], ["Kind"], "Sales", "sum")
+    got = incremental_agg.pivot(new, ["Region"], ["Kind"], "Sales", "sum")
+    pd.testing.assert_frame_equal(got, create_pivot(new, ["Region"], ["Kind"], "Sales", "sum"))
+
+def test_workbooks_with_same_sheet_name_keep_their_own_states():
+    incremental_agg.clear()
+    a, b = _log(200, 6), _log(200, 7)
+    incremental_agg.aggregate(a, "Sales", "sum", ["Region"], sheet="Sheet1", source="a.xlsx")
+    incremental_agg.aggregate(b, "Sales", "sum", ["Region"], sheet="Sheet1", source="b.xlsx")
+    before = incremental_agg.INCREMENTAL_AGG._values.get(("delta",), 0)
+    grown = pd.concat([a, _log(20, 8)], ignore_index=True)
+    got = incremental_agg.aggregate(grown, "Sales", "sum", ["Region"], sheet="Sheet1", source="a.xlsx")
+    assert incremental_agg.INCREMENTAL_AGG._values.get(("delta",), 0) == before + 1
+    assert got == aggregate(grown, "Sales", "sum", ["Region"])
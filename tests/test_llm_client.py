@@ -0,0 +1,102 @@
+# tests/test_llm_client.py
+import pytest
+from app.llm_agent import client as llm_client
+from app.llm_agent.client import CircuitBreaker, LLMClient, LLMError, LLMUnavailable
+
+class FakeResponse:
+    def __init__(self, status, body=None):
+        self.status_code = status
+        self._body = body or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._body
+
+    def close(self):
+        pass
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None, stream=False):
+        self.calls += 1
+        return self.responses.pop(0)
+
+def make_client(responses, **kwargs):
+    c = LLMClient(**kwargs)
+    c._session = FakeSession(responses)
+    return c
+
+def test_retries_then_succeeds(monkeypatch):
+    monkeypatch.setattr(llm_client, "BACKOFF_BASE", 0)
+    c = make_client([FakeResponse(503), FakeResponse(200, {"response": " ok "})], max_retries=2)
+    assert c.generate("hi") == "ok"
+    assert c._session.calls == 2
+    assert c.stats()["calls"] == 1
+
+def test_breaker_opens_and_fails_fast(monkeypatch):
+    monkeypatch.setattr(llm_client, "BACKOFF_BASE", 0)
+    c = make_client([FakeResponse(500)] * 4, max_retries=0, breaker=CircuitBreaker(threshold=2, cooldown=60))
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            c.generate("hi")
+    with pytest.raises(LLMUnavailable):
+        c.generate("hi")
+    assert c._session.calls == 2
+    assert c.breaker.state == "open"
+
+class SlowSession(FakeSession):
+    def __init__(self, status, body=None):
+        super().__init__([])
+        self.status, self.body = status, body
+        import threading
+        self.release = threading.Event()
+
+    def post(self, url, json=None, timeout=None, stream=False):
+        self.calls += 1
+        self.release.wait(5)
+        return FakeResponse(self.status, self.body)
+
+def _run_concurrently(c, n):
+    import threading, time
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(c.generate("same prompt"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    c._session.release.set()
+    for t in threads:
+        t.join()
+    return results, errors
+
+def test_identical_prompts_share_one_call():
+    c = LLMClient(max_concurrency=10)
+    c._session = SlowSession(200, {"response": "plan"})
+    results, errors = _run_concurrently(c, 10)
+    assert results == ["plan"] * 10 and not errors
+    assert c._session.calls == 1
+    assert c.stats()["coalesced"] == 9
+
+def test_coalesced_waiters_get_the_error():
+    c = LLMClient(max_concurrency=10, max_retries=0)
+    c._session = SlowSession(400)
+    results, errors = _run_concurrently(c, 5)
+    assert not results and len(errors) == 5
+    assert all(isinstance(e, LLMError) for e in errors)
+    assert c._session.calls == 1
+    # one leader error; every waiter raises its own copy chained to it
+    assert len({id(e) for e in errors}) == 5
+    leader = next(e for e in errors if not isinstance(e.__cause__, LLMError))
+    assert all(e.__cause__ is leader for e in errors if e is not leader)
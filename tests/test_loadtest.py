@@ -0,0 +1,41 @@
+# tests/test_loadtest.py
+import pytest
+from app.llm_agent import client as llm_client
+from app.llm_agent.client import LLMClient, LLMError
+from loadtest import run as loadtest
+from loadtest.mock_ollama import MockOllama
+
+PLANS = [{"match": "unhappy", "plan": {"operation": "filter", "parameters": {"condition": "Score < 3"}}}]
+
+def test_mock_serves_canned_plans_and_failures(monkeypatch):
+    monkeypatch.setattr(llm_client, "BACKOFF_BASE", 0)
+    with MockOllama(latency=0, jitter=0, plans=PLANS) as mock:
+        c = LLMClient(url=mock.url, max_retries=0)
+        plan = c.generate_json("...\nUser Query: who is unhappy\n", schema={"type": "object"})
+        assert plan == PLANS[0]["plan"]
+        assert c.generate_json("User Query: something else") == {"operation": "describe", "parameters": {}}
+        assert c.generate("Summarize in one sentence: fine").startswith("Mock summary")
+    with MockOllama(latency=0, jitter=0, failure_rate=1.0, plans=PLANS) as mock:
+        with pytest.raises(LLMError):
+            LLMClient(url=mock.url, max_retries=1).generate("hi")
+        assert mock.stats()["failures"] == 2
+
+def test_summary_percentiles():
+    samples = [{"operation": "a", "status": 200, "latency": i / 1000} for i in range(1, 101)]
+    samples.append({"operation": "b", "status": 500, "latency": 0.5})
+    out = loadtest.summarize(samples, duration=10)
+    assert out["operations"]["a"]["latency_ms"]["p50"] == 50.5
+    assert out["operations"]["a"]["latency_ms"]["p99"] == 99.0
+    assert out["operations"]["b"]["errors"] == 1
+    assert out["overall"]["count"] == 101 and out["overall"]["throughput_rps"] == 10.1
+
+def test_end_to_end_run(tmp_path):
+    workbook = str(tmp_path / "w.xlsx")
+    loadtest.make_workbook(workbook, rows=200)
+    report = loadtest.main(["--workbook", workbook, "--rate", "10", "--duration", "1", "--llm-latency", "0.05",
+                            "--llm-jitter", "0", "--out", str(tmp_path / "r.json")])
+    results = report["results"]
+    assert results["sent"] == 10
+    assert results["overall"]["count"] == 10
+    assert results["overall"]["errors"] == 0
+    assert (tmp_path / "r.json").exists()
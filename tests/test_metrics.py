@@ -0,0 +1,24 @@
+# tests/test_metrics.py
+from app.services import metrics
+
+def test_stage_timer_and_server_timing():
+    timer, token = metrics.start_request()
+    metrics.set_operation("aggregate")
+    with metrics.stage("read"):
+        pass
+    with metrics.stage("read"):
+        pass
+    header = timer.server_timing()
+    metrics.end_request(token)
+    assert header.startswith("read;dur=")
+    assert "total;dur=" in header
+    assert metrics.current_timer() is None
+
+def test_histogram_render_is_cumulative():
+    h = metrics.Histogram("t_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    h.observe(0.05, op="x")
+    h.observe(0.5, op="x")
+    lines = h.render()
+    assert 't_seconds_bucket{op="x",le="0.1"} 1.0' in lines
+    assert 't_seconds_bucket{op="x",le="1.0"} 2.0' in lines
+    assert 't_seconds_count{op="x"} 2.0' in lines
@@ -0,0 +1,34 @@
+# tests/test_multi_query.py
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import multi_query
+from app.services.data_engine import read_sheet
+
+def _exports(tmp_path):
+    for month, rows in (("01", [1, 2]), ("02", [3, 4]), ("03", [5, 6])):
+        pd.DataFrame({"Month": [int(month)] * 2, "Region": ["N", "S"], "Sales": rows}).to_excel(
+            tmp_path / f"sales_{month}.xlsx", index=False)
+    return str(tmp_path / "sales_*.xlsx")
+
+def test_aggregate_across_files_with_source_file(tmp_path):
+    body = {"pattern": _exports(tmp_path), "operation": "aggregate",
+            "params": {"column": "Sales", "agg": "sum", "group_by": ["source_file"]}}
+    out = TestClient(app).post("/query/multi", json=body).json()
+    assert out["scanned"] == 3
+    assert out["result"] == {"sales_01.xlsx": 3, "sales_02.xlsx": 7, "sales_03.xlsx": 11}
+
+def test_recorded_min_max_prunes_files(tmp_path):
+    pattern = _exports(tmp_path)
+    for p, _ in multi_query.expand(pattern):
+        read_sheet(p)  # records catalog stats
+    body = {"pattern": pattern, "operation": "filter", "params": {"condition": "Sales > 0"},
+            "range": {"column": "Month", "min": 2, "max": 2}, "output": "lazy"}
+    out = TestClient(app).post("/query/multi", json=body).json()
+    assert (out["scanned"], out["pruned"], out["files"]) == (1, 2, ["sales_02.xlsx"])
+    assert out["rows"] == 2 and "source_file" in out["summary"]["columns"]
+
+def test_pivot_merges_partials(tmp_path):
+    frames = multi_query.load(multi_query.expand(_exports(tmp_path)))
+    got = multi_query.pivot(frames, ["Region"], ["Month"], "Sales", "mean")
+    assert got.set_index("Region").loc["S"].tolist() == [2.0, 4.0, 6.0]
@@ -0,0 +1,82 @@
+# tests/test_nl_parser.py
+import pytest
+from app.services.nl_parser import parse_query, to_sheet_op, tokenize
+
+COLS = ["ID", "Age", "Salary", "Department", "JoinDate", "Country"]
+DTYPES = {"JoinDate": "datetime64[ns]"}
+# the catalog's top values of the Structured sheet's category columns
+VALUES = {"Department": ["HR", "IT", "Finance", "Sales", "Ops"], "Country": ["India", "USA", "UK", "Germany", "France"]}
+
+def test_aggregate_with_group_by_and_filter():
+    plan = parse_query("average salary per department where country is India", COLS, DTYPES)
+    assert plan["operation"] == "aggregate"
+    assert plan["parameters"] == {"column": "Salary", "agg": "mean", "group_by": ["Department"],
+                                  "filter": "`Country` == 'India'"}
+    assert plan["confidence"] == 1.0
+
+def test_filter_comparisons_and_fuzzy_columns():
+    plan = parse_query("salry greater than 150k and age under 30", COLS, DTYPES)
+    assert plan["parameters"]["condition"] == "`Salary` > 150000 and `Age` < 30"
+    assert 0.75 < plan["confidence"] < 1.0
+
+def test_pivot_math_and_dates():
+    assert parse_query("pivot salary by department and country", COLS)["parameters"] == {
+        "index": ["Department"], "columns": ["Country"], "values": "Salary", "aggfunc": "sum"}
+    assert parse_query("subtract age from salary as net", COLS)["parameters"] == {
+        "math_op": "sub", "target_cols": ["Salary", "Age"], "new_col": "net"}
+    assert parse_query("extract year and month from join date", COLS, DTYPES)["parameters"] == {
+        "column": "JoinDate", "parts": ["year", "month"]}
+
+def test_ambiguous_queries_have_low_confidence():
+    assert parse_query("tell me a joke", COLS) is None
+    plan = parse_query("average salary for employees in India", COLS)
+    assert plan["confidence"] < 0.75
+
+@pytest.mark.parametrize("query", ["sum salary for IT", "average age of employees in Sales department",
+                                   "total salary of Ops department"])
+def test_values_are_not_dropped_without_a_catalog(query):
+    # the filter value is left over (or unmodelled), so the LLM must be asked
+    plan = parse_query(query, COLS, DTYPES)
+    assert plan is None or plan["confidence"] < 0.75
+
+@pytest.mark.parametrize("query, flt", [
+    ("sum salary for IT", "`Department` == 'IT'"),
+    ("average age of employees in Sales department", "`Department` == 'Sales'"),
+    ("total salary of Ops department", "`Department` == 'Ops'"),
+    ("average salary in IT or HR by country", "`Department` in ['IT', 'HR']"),
+])
+def test_catalog_values_become_filters(query, flt):
+    plan = parse_query(query, COLS, DTYPES, VALUES)
+    assert plan["parameters"]["filter"] == flt
+    assert plan["confidence"] >= 0.75
+
+def test_fuzzy_column_match_covers_the_whole_phrase():
+    # "Sales department" is not a misspelling of Department
+    assert [t.kind for t in tokenize("Sales department", COLS)] == ["WORD", "COL"]
+    assert [t.value for t in tokenize("join dat", COLS)] == ["JoinDate"]
+
+def test_leftover_column_or_value_is_below_threshold():
+    assert parse_query("sum salary age", COLS)["confidence"] < 0.75
+    assert parse_query("sum salary by country excluding UK", COLS, DTYPES, VALUES)["confidence"] < 0.75
+    # "it" in lower case stays a stopword
+    assert parse_query("sum salary, is it", COLS, DTYPES, VALUES)["parameters"] == {"column": "Salary", "agg": "sum"}
+
+def test_to_sheet_op():
+    plan = parse_query("sum of salary by country", COLS)
+    assert to_sheet_op(plan) == {"type": "aggregation", "method": "groupby_agg",
+                                 "groupby": ["Country"], "agg": {"Salary": "sum"}}
+
+def test_llm_failure_does_not_run_a_rejected_parser_plan():
+    from app.orchestrator import ExcelAIOrchestrator
+    from app.llm_agent.client import LLMUnavailable
+
+    class DownClient:
+        def generate_json(self, *args, **kwargs):
+            raise LLMUnavailable("LLM circuit breaker is open")
+
+    orch = ExcelAIOrchestrator(fast_mode=True)
+    orch.client = DownClient()
+    plan = orch.interpret_query("sum salary by country excluding UK", COLS, DTYPES, values=VALUES)
+    assert plan["operation"] == "unknown" and "breaker" in plan["parameters"]["error"]
+    # a confident parse still answers without the model
+    assert orch.interpret_query("sum salary for IT", COLS, DTYPES, values=VALUES)["operation"] == "aggregate"
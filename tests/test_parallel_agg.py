@@ -0,0 +1,38 @@
+# tests/test_parallel_agg.py
+import numpy as np
+import pandas as pd
+from app.services import parallel_agg, parallel_ingest
+from app.services.orchestrator import ExcelExecutor
+
+def _frame(n=5000):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"region": rng.choice(["N", "S", "E", None], n), "year": rng.integers(2020, 2023, n),
+                       "sales": rng.normal(100, 10, n), "qty": rng.integers(0, 50, n)})
+    df.loc[df.region == "E", "sales"] = np.nan
+    return df
+
+def test_partitioned_groupby_matches_pandas():
+    df = _frame()
+    spec = {"sales": ["sum", "count", "min", "max"], "qty": ["sum", "nunique"]}
+    try:
+        for keys in (["region", "year"], ["region"], []):
+            pd.testing.assert_frame_equal(parallel_agg.group_aggregate(df, keys, spec, parallel=True),
+                                          parallel_agg.group_aggregate(df, keys, spec, parallel=False))
+    finally:
+        parallel_ingest.shutdown()
+
+def test_executor_uses_parallel_path_above_threshold(monkeypatch):
+    df = _frame()
+    params = {"group_by": ["region"], "aggregations": {"sales": "avg", "qty": "nunique"}}
+    pivot = {"index": "region", "columns": "year", "values": "qty", "aggfunc": "mean"}
+    serial = ExcelExecutor._exec_aggregate(df, params), ExcelExecutor._exec_pivot(df, pivot)
+    monkeypatch.setattr(parallel_agg, "AGG_WORKERS", 2)
+    monkeypatch.setattr(parallel_agg, "PARALLEL_AGG_MIN_ROWS", 100)
+    before = parallel_agg.PARALLEL_AGG._values.get(("parallel",), 0)
+    try:
+        parallel = ExcelExecutor._exec_aggregate(df, params), ExcelExecutor._exec_pivot(df, pivot)
+    finally:
+        parallel_ingest.shutdown()
+    assert parallel_agg.PARALLEL_AGG._values.get(("parallel",), 0) == before + 2
+    for s, p in zip(serial, parallel):
+        pd.testing.assert_frame_equal(pd.DataFrame(p["result"]), pd.DataFrame(s["result"]))
@@ -0,0 +1,25 @@
+# tests/test_parallel_ingest.py
+import pandas as pd
+from app.services import parallel_ingest
+
+def _book(path):
+    with pd.ExcelWriter(path) as w:
+        for i in range(3):
+            pd.DataFrame({"a": [i, i + 1], "b": ["x", "y"]}).to_excel(w, sheet_name=f"S{i}", index=False)
+    return str(path)
+
+def test_parallel_matches_serial(tmp_path):
+    path = _book(tmp_path / "m.xlsx")
+    names = ["S0", "S1", "S2"]
+    serial = parallel_ingest.read_sheets(path, names, parallel=False)
+    try:
+        parallel = parallel_ingest.read_sheets(path, names, parallel=True)
+    finally:
+        parallel_ingest.shutdown()
+    assert list(parallel) == names
+    for n in names:
+        pd.testing.assert_frame_equal(parallel[n], serial[n])
+
+def test_small_files_stay_serial(tmp_path):
+    path = _book(tmp_path / "m.xlsx")
+    assert not parallel_ingest.use_parallel(path, 3, workers=8)
@@ -0,0 +1,20 @@
+# tests/test_profiling.py
+import os
+from app.services import profiling
+
+def test_mode_gated_by_config(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    assert profiling.mode_from_value("cprofile") is None
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    assert profiling.mode_from_value("cprofile") == "cprofile"
+    assert profiling.mode_from_value("1") == profiling.DEFAULT_MODE
+    assert profiling.mode_from_value("bogus") is None
+
+def test_cprofile_report_saves_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    with profiling.RequestProfiler("cprofile", top_n=5) as prof:
+        sum(i * i for i in range(10000))
+    report = prof.report("unit")
+    assert report["profile_file"].endswith(".prof")
+    assert os.path.exists(report["profile_file"])
+    assert 0 < len(report["top"]) <= 5
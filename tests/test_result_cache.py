@@ -0,0 +1,54 @@
+# tests/test_result_cache.py
+import os
+import pandas as pd
+from app.routes.query import QueryPayload, handle_structured
+from app.services import result_cache, result_store
+
+def _book(path, values):
+    pd.DataFrame({"Region": ["N", "S", "N"], "Sales": values}).to_excel(path, index=False)
+    return str(path)
+
+def test_hit_then_invalidated_by_content_change(tmp_path):
+    result_cache.cache.clear()
+    path = _book(tmp_path / "r.xlsx", [1, 2, 3])
+    p = dict(file_path=path, operation="aggregate", params={"column": "Sales", "agg": "sum", "group_by": None})
+    assert handle_structured(QueryPayload(**p))["cache"] == "miss"
+    again = handle_structured(QueryPayload(**p))
+    assert again["cache"] == "hit" and again["result"] == 6
+    _book(path, [10, 20, 30])
+    changed = handle_structured(QueryPayload(**p))
+    assert changed["cache"] == "miss" and changed["result"] == 60
+
+def test_results_get_their_own_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "RESULTS_DIR", str(tmp_path / "results"))
+    result_cache.cache.clear()
+    path = _book(tmp_path / "r.xlsx", [1, 2, 3])
+    filt = QueryPayload(file_path=path, operation="filter", params={"condition": "Sales > 1"}, output="sync")
+    first = handle_structured(filt)
+    other = handle_structured(QueryPayload(file_path=path, operation="filter", params={"condition": "Sales > 2"},
+                                           output="sync"))
+    assert other["output_file"] != first["output_file"]
+    hit = handle_structured(filt)
+    assert hit["cache"] == "hit" and hit["result_id"] == first["result_id"]
+    assert len(pd.read_excel(hit["output_file"])) == 2
+
+def test_evicts_least_recently_used():
+    c = result_cache.ResultCache(max_entries=2, max_mb=1, ttl=60)
+    for k in "abc":
+        c.put(k, {"operation": "aggregate", "result": k})
+    assert len(c) == 2 and c.get("a") is None
+    assert c.get("c") == ({"operation": "aggregate", "result": "c"}, None)
+
+def test_digest_lru_builds_once_and_evicts_oldest():
+    lru = result_cache.DigestLRU(2)
+    built = []
+    build = lambda k: lambda: built.append(k) or k.upper()
+    assert lru.get_or_build(("d1", "a"), build("a")) == "A"
+    assert lru.get_or_build(("d1", "a"), build("a")) == "A"
+    lru.get_or_build(("d1", "b"), build("b"))
+    lru.get(("d1", "a"))
+    lru.get_or_build(("d2", "c"), build("c"))
+    assert built == ["a", "b", "c"]
+    assert [k for k, _ in lru.items()] == [("d1", "a"), ("d2", "c")]
+    lru.clear()
+    assert len(lru) == 0
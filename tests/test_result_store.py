@@ -0,0 +1,36 @@
+# tests/test_result_store.py
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import result_store
+
+def test_lazy_result_written_on_download(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "RESULTS_DIR", str(tmp_path))
+    out = result_store.publish(pd.DataFrame({"a": [1, 2]}), mode="lazy")
+    assert out["output_status"] == "pending"
+    client = TestClient(app)
+    assert client.get(f"/results/{out['result_id']}/status").json()["status"] == "pending"
+    resp = client.get(out["download"])
+    assert resp.status_code == 200
+    assert result_store.get(out["result_id"]).status == "written"
+    assert list(pd.read_excel(out["output_file"])["a"]) == [1, 2]
+
+def test_background_result_is_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "RESULTS_DIR", str(tmp_path))
+    out = result_store.publish(pd.DataFrame({"a": [1]}), mode="background")
+    entry = result_store.get(out["result_id"])
+    assert entry.done.wait(10) and entry.status == "written"
+
+def test_unknown_result_is_404():
+    assert TestClient(app).get("/results/nope").status_code == 404
+
+def test_evicted_results_are_deleted_from_disk(tmp_path, monkeypatch):
+    import os
+    monkeypatch.setattr(result_store, "RESULTS_DIR", str(tmp_path))
+    monkeypatch.setattr(result_store, "RESULTS_KEEP", 3)
+    outs = [result_store.publish(pd.DataFrame({"a": [i]}), mode=mode)
+            for i, mode in enumerate(["sync", "background", "lazy"] * 3)]
+    result_store.flush()
+    assert len(os.listdir(tmp_path)) <= 3
+    assert result_store.get(outs[0]["result_id"]) is None and not os.path.exists(outs[0]["output_file"])
+    assert os.path.exists(result_store.materialize(outs[-1]["result_id"], timeout=10))
@@ -0,0 +1,80 @@
+# tests/test_scheduler.py
+import threading
+import contextvars
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import scheduler
+
+def _blocked(pool):
+    gate = threading.Event()
+    started = threading.Event()
+    pool.submit(lambda: (started.set(), gate.wait(5)), client="other")
+    assert started.wait(5)
+    return gate
+
+def _run_order(pool, jobs):
+    gate = _blocked(pool)
+    order = []
+    futures = [pool.submit(order.append, client, client=client) for client in jobs]
+    gate.set()
+    for f in futures:
+        f.result(5)
+    return order
+
+def test_clients_share_fairly_by_weight(monkeypatch):
+    monkeypatch.setattr(scheduler, "CLIENT_WEIGHTS", {"vip": 3.0})
+    pool = scheduler.Pool("t", 1)
+    # one waiting query is not stuck behind another client's backlog
+    assert _run_order(pool, ["bulk"] * 6 + ["light"]).index("light") <= 1
+    # a weight-3 client gets three turns per turn of a weight-1 client
+    order = _run_order(pool, ["bulk"] * 8 + ["vip"] * 8)
+    assert order[:8].count("vip") == 6
+    pool.drain()
+
+def test_admission_by_queued_cost():
+    pool = scheduler.Pool("t", 1, budget=10)
+    gate = _blocked(pool)
+    first = pool.submit(lambda: 1, cost=8)
+    with pytest.raises(scheduler.Overloaded):
+        pool.submit(lambda: 2, cost=5)
+    # writes and other work submitted with admit=False are never refused
+    second = pool.submit(lambda: 3, cost=5, admit=False)
+    gate.set()
+    assert (first.result(5), second.result(5)) == (1, 3)
+    # an idle pool takes any job, however large
+    assert pool.submit(lambda: 4, cost=1e12).result(5) == 4
+    pool.drain()
+
+def test_jobs_run_in_callers_context():
+    var = contextvars.ContextVar("v", default=None)
+    var.set("request")
+    pool = scheduler.Pool("t", 2)
+    assert pool.call(lambda: (var.get(), scheduler.current_client()), client="k1") == ("request", "k1")
+    pool.drain()
+
+def test_structured_queries_not_blocked_by_llm_work(tmp_path):
+    path = tmp_path / "s.xlsx"
+    pd.DataFrame({"Region": ["N", "S", "N"], "Sales": [1, 2, 3]}).to_excel(path, index=False)
+    llm = scheduler.pool("llm")
+    gate = threading.Event()
+    busy = [llm.submit(gate.wait, 10, client="bulk") for _ in range(llm.workers + 3)]
+    try:
+        body = {"file_path": str(path), "operation": "aggregate", "use_cache": False,
+                "params": {"column": "Sales", "agg": "sum", "group_by": ["Region"]}}
+        resp = TestClient(app).post("/query/run", json=body)
+        assert resp.status_code == 200
+        assert resp.json()["result"] == {"N": 4, "S": 2}
+        assert llm.snapshot()["queued"] == 3
+    finally:
+        gate.set()
+        for f in busy:
+            f.result(10)
+
+def test_work_class():
+    from app.routes.query import work_class
+    assert work_class("text_analyze", None, None, None, 10) == ("llm", 10000)
+    assert work_class("aggregate", None, None, None, 500) == ("cpu", 500)
+    assert work_class(None, "total Sales by Region", ["Region", "Sales"], {"Sales": "int64"}, 500)[0] == "cpu"
+    assert work_class(None, "write me a poem", ["Region", "Sales"], {}, 500)[0] == "llm"
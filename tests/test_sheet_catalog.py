@@ -0,0 +1,31 @@
+# tests/test_sheet_catalog.py
+import numpy as np
+import pandas as pd
+from app.services import sheet_catalog
+from app.services.data_engine import sheet_stats
+
+def _frame(n=200):
+    rng = np.random.default_rng(5)
+    return pd.DataFrame({"order_id": range(n), "Region": rng.choice(["N", "S", "E"], n),
+                         "Revenue": rng.random(n) * 100, "Shipped": [f"2024-02-{i % 28 + 1:02d}" for i in range(n)],
+                         "Note": [f"call back {i}" for i in range(n)], "Qty": rng.integers(0, 9, n).astype(float)})
+
+def test_column_stats_infer_semantic_types():
+    df = _frame()
+    df.loc[:9, "Qty"] = np.nan
+    cols = sheet_catalog.column_stats(df)["columns"]
+    assert {c: v["semantic"] for c, v in cols.items()} == {
+        "order_id": "id", "Region": "category", "Revenue": "money", "Shipped": "date", "Note": "text", "Qty": "number"}
+    assert cols["Qty"]["nulls"] == 10 and cols["Region"]["distinct"] == 3
+    assert sorted(v for v, _ in cols["Region"]["top"]) == ["E", "N", "S"]
+    schema = sheet_catalog.prompt_schema(sheet_catalog.column_stats(df))
+    assert "Region: category [" in schema and "Qty: number 0..8 9 distinct 5% empty" in schema
+    assert sheet_catalog.planner_dtypes(sheet_catalog.column_stats(df))["Shipped"].startswith("datetime")
+
+def test_sheet_stats_come_from_the_catalog(tmp_path, monkeypatch):
+    path = str(tmp_path / "c.xlsx")
+    _frame().to_excel(path, index=False)
+    first = sheet_stats(path)
+    # a second lookup must not parse the workbook again
+    monkeypatch.setattr(pd, "read_excel", lambda *a, **k: (_ for _ in ()).throw(AssertionError("parsed")))
+    assert sheet_stats(path) == first and first["rows"] == 200
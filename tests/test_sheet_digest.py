@@ -0,0 +1,30 @@
+# tests/test_sheet_digest.py
+import pandas as pd
+from app.services import data_engine
+from app.services.sheet_digest import xlsx_sheet_digests
+
+def _book(path, jan, feb):
+    with pd.ExcelWriter(path) as w:
+        pd.DataFrame(jan).to_excel(w, sheet_name="Jan", index=False)
+        pd.DataFrame(feb).to_excel(w, sheet_name="Feb", index=False)
+    return str(path)
+
+JAN = {"k": ["a", "b"], "v": [1, 2]}
+
+def test_only_the_edited_sheet_changes(tmp_path):
+    v1 = _book(tmp_path / "v1.xlsx", JAN, {"k": ["c"], "v": [3]})
+    v2 = _book(tmp_path / "v2.xlsx", JAN, {"k": ["c", "new"], "v": [3, 4]})
+    assert data_engine.changed_sheets(v1, v2) == {"changed": ["Feb"], "added": [], "removed": [], "unchanged": ["Jan"]}
+
+def test_shared_string_edit_changes_digest(tmp_path):
+    # identical sheet XML (same string indices), different string values
+    v1 = _book(tmp_path / "v1.xlsx", JAN, {"v": [3]})
+    v2 = _book(tmp_path / "v2.xlsx", {"k": ["a", "x"], "v": [1, 2]}, {"v": [3]})
+    assert xlsx_sheet_digests(v1)["Jan"] != xlsx_sheet_digests(v2)["Jan"]
+
+def test_unchanged_sheet_frame_carries_over(tmp_path):
+    v1 = _book(tmp_path / "v1.xlsx", JAN, {"k": ["c"], "v": [3]})
+    v2 = _book(tmp_path / "v2.xlsx", JAN, {"k": ["d"], "v": [3]})
+    data_engine.read_sheet(v1, "Jan")
+    key = (data_engine.sheet_digest(v2, "Jan"),)
+    assert key in data_engine._frame_cache
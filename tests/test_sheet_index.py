@@ -0,0 +1,51 @@
+# tests/test_sheet_index.py
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import sheet_index
+
+def _sheet(n=30000):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"ID": rng.permutation(n), "Salary": rng.integers(0, 200000, n).astype(float),
+                       "Country": rng.choice(["India", "UK", "US"], n),
+                       "JoinDate": pd.date_range("2010-01-01", periods=n, freq="h")})
+    df.loc[::101, "Salary"] = np.nan
+    df.loc[::103, "Country"] = None
+    return df
+
+def test_in_lists():
+    assert sheet_index.in_lists("ID == 5 and `Home Country` in ['UK', 'US'] and (x == 1 or y == 2)") == \
+        {"ID": [5], "Home Country": ["UK", "US"]}
+    # `in [None]` matches missing values, which indexes leave out
+    assert sheet_index.in_lists("Country in ['UK', None]") == {}
+
+@pytest.mark.parametrize("condition", ["ID == 4321", "Country in ['India', 'UK'] and Salary > 190000",
+                                       "Salary >= 100 and Salary < 5000", "ID in [1, 2, 3] or Salary < 10",
+                                       "JoinDate >= '2011-01-01' and JoinDate < '2011-01-03'",
+                                       "ID == 'abc'", "Country == 5"])
+def test_indexed_matches_full_scan(condition):
+    sheet_index.clear()
+    df = _sheet()
+    for col in df.columns:
+        sheet_index.build(df, "t", col)
+    pd.testing.assert_frame_equal(sheet_index.query(df, condition, digest="t"), df.query(condition))
+
+def test_built_after_repeated_filters():
+    sheet_index.clear()
+    df = _sheet()
+    for _ in range(sheet_index.INDEX_AUTO_AFTER):
+        sheet_index.query(df, "ID == 7", digest="t")
+    assert sheet_index.indexed("t") == {"ID": "sorted"}
+    before = sheet_index.INDEX_LOOKUPS._values.get(("index",), 0)
+    assert len(sheet_index.query(df, "ID == 7", digest="t")) == 1
+    assert sheet_index.INDEX_LOOKUPS._values.get(("index",), 0) == before + 1
+    # a filtered frame is not the sheet the index was built on
+    part = df[df.Country == "UK"]
+    pd.testing.assert_frame_equal(sheet_index.query(part, "ID == 7", digest="t"), part.query("ID == 7"))
+
+def test_filter_counts_stay_bounded_across_sheet_versions():
+    sheet_index.clear()
+    df = _sheet()
+    for version in range(sheet_index.INDEX_MAX * 10):
+        sheet_index.query(df, "ID == 7", digest=f"v{version}")
+    assert len(sheet_index._usage) <= sheet_index.INDEX_MAX * 4
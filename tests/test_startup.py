@@ -0,0 +1,32 @@
+# tests/test_startup.py
+import os
+import subprocess
+import sys
+from app.services import startup
+
+def test_app_import_skips_optional_deps():
+    code = ("import sys, app.main; "
+            "print(','.join(m for m in ('openai', 'textblob', 'requests') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+def test_recent_workbooks_newest_first(tmp_path):
+    for i, name in enumerate(["a.xlsx", "b.xlsx", "b_out.xlsx"]):
+        p = tmp_path / name
+        p.write_bytes(b"")
+        os.utime(p, (1000 + i, 1000 + i))
+    assert startup.recent_workbooks(5, str(tmp_path), str(tmp_path / "objects")) == [str(tmp_path / "b.xlsx"), str(tmp_path / "a.xlsx")]
+
+def test_recent_workbooks_follow_last_upload(tmp_path):
+    from app.services import upload_store
+    store = tmp_path / "objects"
+    store.mkdir()
+    for name in ["old.xlsx", "new.xlsx"]:
+        src = tmp_path / name
+        src.write_bytes(name.encode())
+        upload_store.adopt(str(src), str(store))
+    # re-uploading identical content keeps the blob (and its mtime) but counts as use
+    first = upload_store.adopt(str(tmp_path / "old.xlsx"), str(store))
+    assert first["deduplicated"]
+    os.utime(first["file_path"], (1000, 1000))
+    assert startup.recent_workbooks(1, str(tmp_path / "none"), str(store)) == [first["file_path"]]
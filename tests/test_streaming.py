@@ -0,0 +1,60 @@
+# tests/test_streaming.py
+import json
+import pytest
+from app.llm_agent.client import LLMClient, LLMBadOutput
+from app.llm_agent.streaming import JSONObjectScanner, matches_schema
+from app.orchestrator import PLAN_SCHEMA
+
+def test_scanner_skips_chatter_and_string_braces():
+    s = JSONObjectScanner()
+    assert s.feed('Sure! {"a": "x}{", "b": {"c"') == []
+    assert s.feed(': 1}} trailing {"d": 2}') == ['{"a": "x}{", "b": {"c": 1}}', '{"d": 2}']
+
+def test_matches_schema():
+    assert matches_schema({"operation": "pivot", "parameters": {}}, PLAN_SCHEMA)
+    assert not matches_schema({"operation": "explode", "parameters": {}}, PLAN_SCHEMA)
+    assert not matches_schema({"operation": "pivot"}, PLAN_SCHEMA)
+    assert not matches_schema({"n": True}, {"properties": {"n": {"type": "integer"}}})
+
+class StreamResponse:
+    status_code = 200
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.sent = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        for i, p in enumerate(self.pieces):
+            self.sent += 1
+            yield json.dumps({"response": p, "done": i == len(self.pieces) - 1}).encode()
+
+    def close(self):
+        self.closed = True
+
+class StreamSession:
+    def __init__(self, resp):
+        self.resp = resp
+
+    def post(self, url, json=None, timeout=None, stream=False):
+        assert stream and json["format"] == PLAN_SCHEMA
+        return self.resp
+
+def test_generate_json_stops_at_first_valid_object():
+    pieces = ['{"operation": "nope", "parameters": {}}', ' {"operation": "pivot",', ' "parameters": {}}', " and more", " text"]
+    c = LLMClient()
+    c._session = StreamSession(StreamResponse(pieces))
+    assert c.generate_json("q", schema=PLAN_SCHEMA) == {"operation": "pivot", "parameters": {}}
+    assert c._session.resp.sent == 3
+    assert c._session.resp.closed
+
+def test_generate_json_without_valid_object_keeps_breaker_closed():
+    c = LLMClient()
+    c._session = StreamSession(StreamResponse(["no json here"]))
+    with pytest.raises(LLMBadOutput) as e:
+        c.generate_json("q", schema=PLAN_SCHEMA)
+    assert e.value.raw == "no json here"
+    assert c.breaker.state == "closed"
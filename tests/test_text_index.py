@@ -0,0 +1,70 @@
+# tests/test_text_index.py
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import text_index
+
+NOTES = ["stable delayed over-budget", "on-time stable", "delayed delayed", None, "Over budget, then delayed",
+         "exceeded expectations", "over the budget"]
+
+def _notes(repeat=50):
+    return pd.DataFrame({"ID": range(1, len(NOTES) * repeat + 1), "Notes": NOTES * repeat})
+
+def test_parse():
+    assert text_index.parse('late "over budget" OR delayed AND on-time') == \
+        [[["late"], ["over", "budget"]], [["delayed"], ["on", "time"]]]
+
+def _brute(df, test):
+    text = df["Notes"].fillna("").str.lower().str.replace(r"\W+", " ", regex=True).map(lambda t: f" {t} ")
+    return set(df.index[text.map(test)])
+
+def test_matches_brute_force():
+    text_index.clear()
+    df = _notes()
+    cases = {"over-budget": lambda t: " over budget " in t,
+             "delayed stable": lambda t: " delayed " in t and " stable " in t,
+             '"over budget" OR exceeded': lambda t: " over budget " in t or " exceeded " in t,
+             "budget missing": lambda t: False}
+    for query, test in cases.items():
+        assert set(text_index.search(df, "Notes", query, digest="t").index) == _brute(df, test), query
+
+def test_ranked_by_term_frequency():
+    text_index.clear()
+    df = _notes(repeat=1)
+    out = text_index.search(df, "Notes", "delayed", digest="t")
+    assert out["ID"].tolist()[0] == 3
+    assert out["search_score"].is_monotonic_decreasing
+    before = text_index.TEXT_SEARCHES._values.get(("hit",), 0)
+    text_index.search(df, "Notes", "stable", digest="t")
+    assert text_index.TEXT_SEARCHES._values.get(("hit",), 0) == before + 1
+
+def test_text_search_joins_structured_rows(tmp_path):
+    path = tmp_path / "t.xlsx"
+    with pd.ExcelWriter(path) as w:
+        _notes(repeat=1).to_excel(w, sheet_name="Unstructured", index=False)
+        pd.DataFrame({"ID": range(1, 8), "Salary": np.arange(7) * 1000}).to_excel(w, sheet_name="Structured", index=False)
+    body = {"file_path": str(path), "sheet_name": "Unstructured", "operation": "text_search", "output": "sync",
+            "params": {"query": "over-budget delayed", "text_col": "Notes", "join_sheet": "Structured"}}
+    resp = TestClient(app).post("/query/run", json=body)
+    assert resp.status_code == 200
+    out = resp.json()
+    assert out["rows"] == 2
+    assert {"ID", "Notes", "search_score", "Salary"} <= set(out["summary"]["columns"])
+
+def test_join_sheet_edit_invalidates_cached_result(tmp_path):
+    path = tmp_path / "t.xlsx"
+
+    def write(salary):
+        with pd.ExcelWriter(path) as w:
+            _notes(repeat=1).to_excel(w, sheet_name="Unstructured", index=False)
+            pd.DataFrame({"ID": [3], "Salary": [salary]}).to_excel(w, sheet_name="S", index=False)
+    body = {"file_path": str(path), "sheet_name": "Unstructured", "operation": "text_search", "output": "sync",
+            "params": {"query": "delayed delayed", "text_col": "Notes", "join_sheet": "S"}}
+    client = TestClient(app)
+    write(100)
+    client.post("/query/run", json=body)
+    write(999)
+    out = client.post("/query/run", json=body).json()
+    assert out["cache"] == "miss"
+    assert pd.read_excel(out["output_file"])["Salary"].dropna().tolist() == [999]
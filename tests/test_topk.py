@@ -0,0 +1,37 @@
+# tests/test_topk.py
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import topk
+from app.services.orchestrator import ExcelExecutor
+
+def _frame(n=2000):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"dept": rng.choice(list("abcdefghij"), n), "salary": rng.integers(0, 50, n).astype(float),
+                       "name": rng.choice(["x", "y", "z", None], n)})
+    df.loc[::17, "salary"] = np.nan
+    return df
+
+@pytest.mark.parametrize("order_by", ["salary", "-salary", "name desc", ["dept", {"column": "salary", "desc": True}]])
+@pytest.mark.parametrize("limit", [0, 1, 25, 5000])
+def test_top_matches_full_sort(order_by, limit):
+    df = _frame()
+    order = topk.parse_order(order_by)
+    full = df.sort_values([c for c, _ in order], ascending=[a for _, a in order], kind="stable",
+                          na_position="last").head(limit)
+    pd.testing.assert_frame_equal(topk.top(df, order_by, limit), full)
+
+def test_limit_pushed_below_group_by():
+    df = _frame()
+    pushed = topk.top_keys(df, "-dept", ["dept"], 3, condition="salary > 10")
+    assert sorted(pushed["dept"].unique()) == ["h", "i", "j"] and (pushed["salary"] > 10).all()
+    assert topk.top_keys(df, "salary", ["dept"], 3) is None
+
+def test_executor_orders_grouped_result():
+    df = _frame()
+    params = {"group_by": ["dept"], "aggregations": {"salary": "sum"}}
+    full = ExcelExecutor._exec_aggregate(df, params)["result"]
+    best = ExcelExecutor._exec_aggregate(df, {**params, "order_by": "-salary", "limit": 3})["result"]
+    assert best == sorted(full, key=lambda r: -r["salary"])[:3]
+    first = ExcelExecutor._exec_aggregate(df, {**params, "order_by": "dept", "limit": 2})["result"]
+    assert first == full[:2]
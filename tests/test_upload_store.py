@@ -0,0 +1,76 @@
+# tests/test_upload_store.py
+import asyncio
+import io
+import os
+import pandas as pd
+from app.services import upload_store
+from app.services.data_engine import read_sheet
+
+class FakeUpload:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self._buf = io.BytesIO(data)
+
+    async def read(self, n=-1):
+        return self._buf.read(n)
+
+def _xlsx_bytes():
+    buf = io.BytesIO()
+    pd.DataFrame({"a": [1, 2]}).to_excel(buf, index=False)
+    return buf.getvalue()
+
+def test_reupload_is_deduplicated(tmp_path):
+    data = _xlsx_bytes()
+    first = asyncio.run(upload_store.store_upload(FakeUpload("Sales.XLSX", data), str(tmp_path)))
+    again = asyncio.run(upload_store.store_upload(FakeUpload("copy.xlsx", data), str(tmp_path)))
+    assert not first["deduplicated"] and again["deduplicated"]
+    assert again["handle"] == first["handle"] and again["file_path"] == first["file_path"]
+    assert again["names"] == ["Sales.XLSX", "copy.xlsx"]
+    assert sorted(os.listdir(tmp_path)) == sorted([upload_store.INDEX_FILE, os.path.basename(first["file_path"])])
+    assert upload_store.resolve(first["handle"], str(tmp_path)) == first["file_path"]
+
+def test_handles_resolve_in_readers(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "STORE_DIR", str(tmp_path))
+    stored = asyncio.run(upload_store.store_upload(FakeUpload("t.xlsx", _xlsx_bytes())))
+    assert list(read_sheet(stored["handle"])["a"]) == [1, 2]
+    upload_store.discard(stored["handle"])
+    assert upload_store.resolve(stored["handle"]) is None
+
+def test_original_name_strips_stacked_uuid_prefixes():
+    name = "2315523a360c4dfaba3307b5dde0b438_fa1177f8f0e443dc9c3856000b2c59d0_synthetic_data.xlsx"
+    assert upload_store._original_name(name) == "synthetic_data.xlsx"
+
+def test_upload_parsing_does_not_block_other_requests(tmp_path, monkeypatch):
+    import threading, time
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routes import upload
+    monkeypatch.setattr(upload_store, "STORE_DIR", str(tmp_path))
+    started = threading.Event()
+
+    def slow_warm(path):
+        started.set()
+        time.sleep(1.0)
+        return ["Sheet1"]
+    monkeypatch.setattr(upload, "warm_cache", slow_warm)
+    monkeypatch.setattr(upload, "_schema", lambda path, sheets: {})
+    with TestClient(app) as client:
+        t = threading.Thread(target=client.post, args=("/upload/file",),
+                             kwargs={"files": {"file": ("t.xlsx", _xlsx_bytes())}})
+        t.start()
+        assert started.wait(5)
+        t0 = time.monotonic()
+        assert client.get("/health").status_code == 200
+        assert time.monotonic() - t0 < 0.5
+        t.join()
+
+def test_versions_of_an_upload_share_a_lineage(tmp_path):
+    def upload(name, values):
+        buf = io.BytesIO()
+        pd.DataFrame({"a": values}).to_excel(buf, index=False)
+        return asyncio.run(upload_store.store_upload(FakeUpload(name, buf.getvalue()), str(tmp_path)))["file_path"]
+    v1, v2, other = upload("log.xlsx", [1]), upload("log.xlsx", [1, 2]), upload("other.xlsx", [3])
+    assert upload_store.lineage(v1, str(tmp_path)) == upload_store.lineage(v2, str(tmp_path))
+    assert upload_store.lineage(other, str(tmp_path)) != upload_store.lineage(v1, str(tmp_path))
+    outside = str(tmp_path / "elsewhere.xlsx")
+    assert upload_store.lineage(outside, str(tmp_path)) == outside
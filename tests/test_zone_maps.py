@@ -0,0 +1,37 @@
+# tests/test_zone_maps.py
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import zone_maps
+
+def _sheet(n=60000):
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({"Salary": np.sort(rng.integers(0, 200000, n)).astype(float),
+                       "JoinDate": pd.date_range("2010-01-01", periods=n, freq="h"),
+                       "Dept": rng.choice(["a", "b"], n), "x": rng.normal(size=n)})
+    df.loc[::997, "Salary"] = np.nan
+    return df
+
+def test_ranges_from_conjuncts():
+    r = zone_maps.ranges_of("Salary > 10 and 5 <= x < 9 & `Join Date` == '2020-01-01' and (y > 1 or y < 0)")
+    assert r == {"Salary": (10, False, None, True), "x": (5, True, 9, False),
+                 "Join Date": ("2020-01-01", True, "2020-01-01", True)}
+
+@pytest.mark.parametrize("condition", ["Salary > 150000", "150000 < Salary <= 150500 and Dept == 'a'",
+                                       "JoinDate >= '2013-01-01' and JoinDate < '2013-02-01'",
+                                       "Salary > 1e9", "x > 2", "Salary > 150000 or x > 2"])
+def test_skipping_matches_full_scan(condition):
+    zone_maps.clear()
+    df = _sheet()
+    pd.testing.assert_frame_equal(zone_maps.query(df, condition, digest="t"), df.query(condition))
+
+def test_selective_filter_skips_blocks():
+    zone_maps.clear()
+    df = _sheet()
+    before = zone_maps.ZONE_BLOCKS._values.get(("skipped",), 0)
+    zone_maps.query(df, "Salary == 100000", digest="t")
+    skipped = zone_maps.ZONE_BLOCKS._values.get(("skipped",), 0) - before
+    assert skipped >= len(df) // zone_maps.ZONE_BLOCK_ROWS - 1
+    # a filtered frame is not the sheet the maps describe
+    part = df[df.Dept == "a"]
+    pd.testing.assert_frame_equal(zone_maps.query(part, "Salary > 5", digest="t"), part.query("Salary > 5"))